@@ -1,12 +1,26 @@
+import click
 from flask import Flask
+from flask.cli import with_appcontext
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
 from werkzeug.security import generate_password_hash
+from .decode_engine import DecodeEngine
+from .utils.decode_cache import DecodeCache
+from .utils.storage_queue import StorageQueue
+from .utils.rollups import ScanRollups
+from .utils.export_jobs import ExportJobs
+from .utils.barcode_index import BarcodeIndex
 
 db = SQLAlchemy()
 migrate = Migrate()
 login_manager = LoginManager()
+decode_engine = DecodeEngine()
+decode_cache = DecodeCache()
+storage_queue = StorageQueue()
+scan_rollups = ScanRollups()
+export_jobs = ExportJobs()
+barcode_index = BarcodeIndex()
 
 def create_app():
     app = Flask(__name__)
@@ -15,6 +29,12 @@ def create_app():
     db.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
+    decode_engine.init_app(app)
+    decode_cache.init_app(app)
+    storage_queue.init_app(app)
+    scan_rollups.init_app(app)
+    export_jobs.init_app(app)
+    barcode_index.init_app(app)
 
     from .models import User,BarcodeEntry,Location,Warehouse,ScanLine,ScanLineStatus,ScanRecord
 
@@ -26,25 +46,77 @@ def create_app():
     login_manager.login_message = "Please log in to access this page."
 
     # Register blueprints
-    from .routes import auth, manager, team_leader, counter, api
+    from .routes import auth, manager, team_leader, counter, api, storage
     app.register_blueprint(api.bp)
     app.register_blueprint(auth.bp)
     app.register_blueprint(manager.bp)
     app.register_blueprint(team_leader.bp)
     app.register_blueprint(counter.bp)
+    app.register_blueprint(storage.bp)
 
-    # ✅ Flask 3.1 fix: run initialization code right after app creation
-    with app.app_context():
-        db.create_all()
-        if not User.query.first():
-            default_manager = User(
-                username="Admin_manager",
-                password_hash=generate_password_hash("admin123"),
-                role="Manager",
-                is_active=True
-            )
-            db.session.add(default_manager)
-            db.session.commit()
-            print("✅ Default Manager user created: Admin_manager / admin123")
-
-    return app
\ No newline at end of file
+    # Schema changes: `flask db upgrade` (the Procfile's release phase), or `flask init-db`
+    # for a fresh database; never on every boot
+    app.cli.add_command(init_db_command)
+
+    # Background work is started by whatever serves requests (start_workers),
+    # not here: CLI commands, scripts and tests get a bare app
+    return app
+
+
+def start_workers(app, wait=False):
+    """
+    Start this process's background work: queues, duplicate index, decode pool.
+    Called by what serves requests: run.py, gunicorn's post_fork (each worker)
+    and the ASGI lifespan startup. The decoders warm up in the background
+    unless `wait` (post_fork, so a worker only takes requests once they're built).
+    """
+    # Push any uploads/deletes still spooled from before the restart
+    if app.config.get("STORAGE_WORKER_ENABLED"):
+        storage_queue.start()
+
+    # Pick up exports queued before the restart
+    if app.config.get("EXPORT_WORKER_ENABLED"):
+        export_jobs.start()
+
+    # Load the duplicate index; scans check the database directly until it's ready
+    barcode_index.start()
+
+    # Build the barcode decoders now so the first scan after a deploy isn't the slowest
+    if app.config.get("DECODE_WARMUP"):
+        decode_engine.warm_up(wait=wait)
+
+
+def init_db():
+    """
+    Build a fresh database: every table, stamped at the latest migration so
+    `flask db upgrade` carries on from there, and the default manager
+    (returned). A database that already has tables is left untouched:
+    existing schemas are only changed by `flask db upgrade`.
+    """
+    from flask_migrate import stamp
+    from sqlalchemy import inspect
+    from .models import User
+
+    if inspect(db.engine).get_table_names():
+        return None
+    db.create_all()
+    stamp()
+    default_manager = User(
+        username="Admin_manager",
+        password_hash=generate_password_hash("admin123"),
+        role="Manager",
+        is_active=True
+    )
+    db.session.add(default_manager)
+    db.session.commit()
+    return default_manager
+
+
+@click.command("init-db")
+@with_appcontext
+def init_db_command():
+    """Build a fresh (e.g. local) database; deploys run `flask db upgrade`."""
+    if init_db():
+        click.echo("✅ Default Manager user created: Admin_manager / admin123")
+    else:
+        click.echo("Database already has tables; run `flask db upgrade` to bring it up to date.")
@@ -1,6 +1,7 @@
 import io
+import time
 import base64
-from PIL import Image
+import logging
 import cv2
 import numpy as np
 # ✅ Safe import guard for pyzbar
@@ -9,82 +10,402 @@ try:
 except ImportError:
     decode = None  #
 
-def process_barcode_image(image_data):
+
+class DecoderRegistry:
     """
-    Optimized, sorted (top→bottom), and version-safe barcode processor
+    Holds the per-process decoder objects so they are built once and reused.
+
+    cv2.barcode_BarcodeDetector loads its model on construction and pyzbar's
+    first call pays one-off zbar set-up — neither belongs on the per-image path.
     """
-    try:
-        # Decode input image once
-        if isinstance(image_data, str):
-            image_bytes = base64.b64decode(image_data)
-            pil_img = Image.open(io.BytesIO(image_bytes))
+
+    def __init__(self):
+        self._opencv = None
+        self._pyzbar_ready = False
+
+    def opencv(self):
+        if self._opencv is None:
+            self._opencv = cv2.barcode_BarcodeDetector()
+        return self._opencv
+
+    def pyzbar(self):
+        """Return pyzbar's decode function (None if pyzbar is unavailable)."""
+        if decode is not None and not self._pyzbar_ready:
+            decode(np.zeros((8, 8), dtype=np.uint8))
+            self._pyzbar_ready = True
+        return decode
+
+    def warm_up(self):
+        """Build every decoder and push a blank frame through it."""
+        blank = np.full((64, 64), 255, dtype=np.uint8)
+        try:
+            self.opencv().detectMulti(blank)
+        except Exception as e:
+            logging.warning(f"OpenCV barcode detector warm-up failed: {e}")
+        try:
+            self.pyzbar()
+        except Exception as e:
+            logging.warning(f"pyzbar warm-up failed: {e}")
+
+    def reset(self):
+        self._opencv = None
+        self._pyzbar_ready = False
+
+
+registry = DecoderRegistry()
+
+
+def get_detector():
+    """Return this process's OpenCV barcode detector, building it on first use."""
+    return registry.opencv()
+
+
+def warm_up():
+    """Warm-up hook: build the decoders for this process ahead of the first scan."""
+    registry.warm_up()
+
+
+# ============================
+# STAGED DECODE PIPELINE
+# ============================
+MAX_DIMENSION = 1280      # working resolution for the cheap passes
+EXPECTED_CODES = 3        # a label carries up to 3 barcodes (MST/Factory, EAN, S/N)
+ROI_PADDING = 0.15        # extra margin around a detected candidate, as a fraction of its size
+
+# name → default time budget (ms). Stages run in this order unless configured otherwise.
+DEFAULT_STAGES = [
+    ("opencv", 400),      # OpenCV detector on the downscaled, contrast-boosted frame
+    ("zbar", 300),        # pyzbar on the same frame
+    ("roi", 300),         # pyzbar on full-resolution crops around OpenCV candidates
+    ("enhance", 400),     # CLAHE, then adaptive threshold
+    ("rotate", 800),      # 90° and ±45° rotations (only when nothing decoded yet)
+    ("fullres", 1500),    # everything again at full resolution (only when nothing decoded yet)
+]
+
+# Expensive fallbacks: skipped as soon as any code has been found
+ONLY_WHEN_EMPTY = {"rotate", "fullres"}
+
+
+def parse_stages(spec):
+    """
+    Parse a DECODE_STAGES spec such as "opencv,zbar,roi:500,rotate" into
+    [(name, budget_ms), ...]. Missing budgets fall back to the defaults.
+    """
+    if not spec:
+        return list(DEFAULT_STAGES)
+
+    defaults = dict(DEFAULT_STAGES)
+    stages = []
+    for item in spec.split(","):
+        name, _, budget = item.strip().partition(":")
+        if name not in STAGE_FUNCTIONS:
+            raise ValueError(f"Unknown decode stage: {name}")
+        stages.append((name, int(budget) if budget else defaults[name]))
+    return stages
+
+
+class DecodeContext:
+    """Frames shared between stages plus the codes collected so far."""
+
+    def __init__(self, image, expected):
+        self.image = image                # GrayImage; full resolution decoded on demand
+        self.scale, self.small = image.working(MAX_DIMENSION)
+
+        # Same preprocessing the processor has always used for the first pass
+        boosted = cv2.convertScaleAbs(self.small, alpha=1.5, beta=0)
+        self.gray = cv2.GaussianBlur(boosted, (3, 3), 0)
+
+        self.expected = expected
+        self.candidates = None            # OpenCV candidate boxes (downscaled coords)
+        self.results = []                 # [{'code', 'y'}] — y in downscaled coords
+        self.deadline = None
+
+    @property
+    def original(self):
+        """Full-resolution grayscale (decoded on first use: only the roi/fullres stages need it)."""
+        return self.image.full()
+
+    def unique_count(self):
+        return len({r['code'] for r in self.results})
+
+    def done(self):
+        return self.unique_count() >= self.expected
+
+    def expired(self):
+        return self.deadline is not None and time.perf_counter() > self.deadline
+
+    def add(self, code, y):
+        if code:
+            self.results.append({'code': code, 'y': float(y)})
+
+
+def _zbar(ctx, frame, y_offset=0.0, y_factor=1.0, to_y=None):
+    """Run pyzbar on `frame` and record hits, mapping rect centres back to ctx y."""
+    zbar_decode = registry.pyzbar()
+    if zbar_decode is None:
+        return
+    for obj in zbar_decode(frame):
+        (x, y, w, h) = obj.rect
+        if to_y is not None:
+            cy = to_y(x + w / 2, y + h / 2)
         else:
-            pil_img = Image.open(io.BytesIO(image_data))
+            cy = y + h / 2
+        ctx.add(obj.data.decode('utf-8'), (y_offset + cy) * y_factor)
+
+
+def _opencv(ctx, frame, y_factor=1.0):
+    """Run the OpenCV detector on `frame` (handles both API versions); returns its boxes."""
+    detector = get_detector()
+    if hasattr(detector, "detectAndDecodeWithType"):
+        # OpenCV ≥ 4.8: detectAndDecode became single-code, the multi-code call was renamed
+        retval, decoded_info, decoded_type, corners = detector.detectAndDecodeWithType(frame)
+    else:
+        retval, decoded_info, decoded_type, corners = detector.detectAndDecode(frame)
+
+    if retval and decoded_info:
+        points = corners if corners is not None else [None] * len(decoded_info)
+        for text, pts in zip(decoded_info, points):
+            if text:
+                y_avg = np.mean(pts[:, 1]) if pts is not None else 0
+                ctx.add(text, y_avg * y_factor)
+    return corners
+
+
+def _stage_opencv(ctx):
+    ctx.candidates = _opencv(ctx, ctx.gray)
 
-        # Convert PIL → OpenCV
-        image = cv2.cvtColor(np.array(pil_img.convert("RGB")), cv2.COLOR_RGB2BGR)
 
-        # ✅ Resize if too large (max dimension = 1280 px)
-        h, w = image.shape[:2]
-        if max(h, w) > 1280:
-            scale = 1280 / max(h, w)
-            image = cv2.resize(image, (int(w * scale), int(h * scale)))
+def _stage_zbar(ctx):
+    _zbar(ctx, ctx.gray)
 
-        # ✅ Preprocess once
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        gray = cv2.convertScaleAbs(gray, alpha=1.5, beta=0)
-        gray = cv2.GaussianBlur(gray, (3, 3), 0)
 
-        # ✅ Try OpenCV barcode detector (handles both signatures)
-        detector = cv2.barcode_BarcodeDetector()
+def _stage_roi(ctx):
+    """Decode full-resolution crops around boxes OpenCV found but could not read."""
+    if ctx.candidates is None:
         try:
-            retval, decoded_info, decoded_type, corners = detector.detectAndDecode(gray)
-        except ValueError:
-            retval, decoded_info, decoded_type = detector.detectAndDecode(gray)
-            corners = None
-
-        results = []
-
-        # Add OpenCV results (with coordinates)
-        if retval and decoded_info:
-            for text, pts in zip(decoded_info, corners or []):
-                if text:
-                    y_avg = np.mean(pts[:, 1]) if pts is not None else 0
-                    results.append({'code': text, 'y': y_avg})
-
-        # ✅ Fallback to pyzbar (and also record coordinates)
-        if not results:
-            decoded_objects = decode(gray)
-            for obj in decoded_objects:
-                (x, y, w, h) = obj.rect
-                results.append({'code': obj.data.decode('utf-8'), 'y': y + h/2})
-
-            # Try one rotation if nothing found
-            if not results:
-                rotated = cv2.rotate(gray, cv2.ROTATE_90_CLOCKWISE)
-                decoded_objects = decode(rotated)
-                for obj in decoded_objects:
-                    (x, y, w, h) = obj.rect
-                    results.append({'code': obj.data.decode('utf-8'), 'y': y + h/2})
-
-        if not results:
-            return {'success': False, 'codes': [], 'message': 'No barcodes detected'}
+            ok, corners = get_detector().detectMulti(ctx.gray)
+            ctx.candidates = corners if ok else None
+        except Exception:
+            ctx.candidates = None
+    if ctx.candidates is None:
+        return
+
+    H, W = ctx.image.shape
+    for pts in ctx.candidates:
+        if ctx.expired() or ctx.done():
+            return
+        x0, y0 = pts.min(axis=0) / ctx.scale
+        x1, y1 = pts.max(axis=0) / ctx.scale
+        pad_x, pad_y = (x1 - x0) * ROI_PADDING, (y1 - y0) * ROI_PADDING
+        x0, y0 = max(0, int(x0 - pad_x)), max(0, int(y0 - pad_y))
+        x1, y1 = min(W, int(x1 + pad_x)), min(H, int(y1 + pad_y))
+        if x1 - x0 < 8 or y1 - y0 < 8:
+            continue
+        _zbar(ctx, ctx.original[y0:y1, x0:x1], y_offset=y0, y_factor=ctx.scale)
+
+
+def _stage_enhance(ctx):
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    _zbar(ctx, clahe.apply(ctx.small))
+    if ctx.expired() or ctx.done():
+        return
+    binary = cv2.adaptiveThreshold(
+        ctx.small, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10
+    )
+    _zbar(ctx, binary)
+
+
+def _rotate(frame, angle):
+    """Rotate without cropping; returns the frame and a point mapper back to the source y."""
+    h, w = frame.shape[:2]
+    M = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    cos, sin = abs(M[0, 0]), abs(M[0, 1])
+    new_w, new_h = int(h * sin + w * cos), int(h * cos + w * sin)
+    M[0, 2] += new_w / 2 - w / 2
+    M[1, 2] += new_h / 2 - h / 2
+    rotated = cv2.warpAffine(frame, M, (new_w, new_h), borderValue=255)
+    inv = cv2.invertAffineTransform(M)
+    return rotated, lambda x, y: inv[1, 0] * x + inv[1, 1] * y + inv[1, 2]
+
+
+def _stage_rotate(ctx):
+    for angle in (90, 45, -45):
+        if ctx.expired() or ctx.results:
+            return
+        rotated, to_y = _rotate(ctx.gray, angle)
+        _zbar(ctx, rotated, to_y=to_y)
+
+
+def _stage_fullres(ctx):
+    if ctx.scale >= 1.0:
+        return  # the other stages already saw every pixel
+    _opencv(ctx, ctx.original, y_factor=ctx.scale)
+    if ctx.expired() or ctx.results:
+        return
+    _zbar(ctx, ctx.original, y_factor=ctx.scale)
+
+
+STAGE_FUNCTIONS = {
+    "opencv": _stage_opencv,
+    "zbar": _stage_zbar,
+    "roi": _stage_roi,
+    "enhance": _stage_enhance,
+    "rotate": _stage_rotate,
+    "fullres": _stage_fullres,
+}
+
+
+# ============================
+# IMAGE LOADING
+# ============================
+# cv2.imdecode flags: grayscale straight from the JPEG's DCT at 1/8, 1/4 or 1/2
+# scale, without applying EXIF orientation (the PIL path never did either)
+_REDUCED = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+_NO_ROTATE = cv2.IMREAD_IGNORE_ORIENTATION
+
+
+def _jpeg_size(data):
+    """(height, width) from a JPEG's frame header, or None if `data` isn't a JPEG."""
+    if data[:2] != b"\xff\xd8":
+        return None
+    i, n = 2, len(data)
+    while i + 9 < n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:                                  # fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:        # markers without a length
+            i += 2
+            continue
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):  # SOFn
+            return int.from_bytes(data[i + 5:i + 7], "big"), int.from_bytes(data[i + 7:i + 9], "big")
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+
+def _pil_gray(image_bytes):
+    """Grayscale through PIL, for formats cv2 can't read."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_bytes)) as pil_img:
+        return np.asarray(pil_img.convert("L"))
+
+
+class GrayImage:
+    """
+    Grayscale access to an upload, decoded no further than needed.
+
+    JPEGs (every photo from the scan page) are decoded by cv2.imdecode on a
+    zero-copy np.frombuffer view: the working frame straight from the DCT at
+    the coarsest 1/2, 1/4 or 1/8 scale still at least MAX_DIMENSION, and the
+    full-resolution frame only when a stage asks for it. Other formats are
+    decoded once at full size, by cv2 or else PIL.
+    """
+
+    def __init__(self, image_bytes):
+        self._bytes = image_bytes
+        self._buf = np.frombuffer(image_bytes, dtype=np.uint8)
+        self._full = None
+        size = _jpeg_size(image_bytes)
+        if size is None or 0 in size:
+            size = self.full().shape[:2]
+        self.shape = size
+
+    def full(self):
+        if self._full is None:
+            frame = cv2.imdecode(self._buf, cv2.IMREAD_GRAYSCALE | _NO_ROTATE)
+            self._full = frame if frame is not None else _pil_gray(self._bytes)
+        return self._full
+
+    def working(self, max_dimension):
+        """(scale, frame): the image downscaled to at most `max_dimension`, and the scale used."""
+        h, w = self.shape
+        scale = min(1.0, max_dimension / max(h, w))
+        if scale >= 1.0:
+            return 1.0, self.full()
+
+        frame = self._full
+        if frame is None:
+            flag = next((flag for factor, flag in _REDUCED if max(h, w) / factor >= max_dimension), None)
+            if flag is not None:
+                frame = cv2.imdecode(self._buf, flag | _NO_ROTATE)
+            if frame is None:
+                frame = self.full()
+
+        size = (int(w * scale), int(h * scale))
+        if (frame.shape[1], frame.shape[0]) != size:
+            frame = cv2.resize(frame, size)
+        return scale, frame
+
+
+def _load_image(image_data):
+    """Wrap the upload (raw bytes or base64 str) for decoding."""
+    if isinstance(image_data, str):
+        image_data = base64.b64decode(image_data)
+    return GrayImage(bytes(image_data))
+
+
+def process_barcode_image(image_data, stages=None, expected_codes=EXPECTED_CODES):
+    """
+    Staged, sorted (top→bottom), and version-safe barcode processor.
+
+    Runs the configured stages in order and stops as soon as `expected_codes`
+    unique codes are found. Each stage gets a time budget; a stage that runs
+    over it stops at its next checkpoint. Per-stage timings are returned
+    under 'timings'.
+    """
+    timings = []
+    try:
+        start = time.perf_counter()
+        ctx = DecodeContext(_load_image(image_data), expected_codes)
+        timings.append({'stage': 'prepare', 'ms': round((time.perf_counter() - start) * 1000, 1)})
+
+        for name, budget_ms in (stages or DEFAULT_STAGES):
+            if ctx.done() or (name in ONLY_WHEN_EMPTY and ctx.results):
+                break
+
+            before = ctx.unique_count()
+            t0 = time.perf_counter()
+            ctx.deadline = t0 + budget_ms / 1000
+            STAGE_FUNCTIONS[name](ctx)
+            elapsed = (time.perf_counter() - t0) * 1000
+
+            timings.append({
+                'stage': name,
+                'ms': round(elapsed, 1),
+                'found': ctx.unique_count() - before,
+                'over_budget': elapsed > budget_ms,
+            })
+
+        if not ctx.results:
+            return {'success': False, 'codes': [], 'message': 'No barcodes detected', 'timings': timings}
 
         # ✅ Sort top → bottom (ascending y)
-        results.sort(key=lambda r: r['y'])
+        results = sorted(ctx.results, key=lambda r: r['y'])
 
-        # ✅ Extract only top 3 unique codes
+        # ✅ Extract only top unique codes
         seen = set()
         codes = []
         for r in results:
             if r['code'] not in seen:
                 seen.add(r['code'])
                 codes.append(r['code'])
-            if len(codes) >= 3:
+            if len(codes) >= expected_codes:
                 break
 
-        return {'success': True, 'codes': codes, 'message': f'{len(codes)} barcode(s) detected successfully'}
+        return {
+            'success': True,
+            'codes': codes,
+            'message': f'{len(codes)} barcode(s) detected successfully',
+            'timings': timings,
+        }
 
     except Exception as e:
         print(e)
-        return {'success': False, 'codes': [], 'message': f'Error processing image: {str(e)}'}
\ No newline at end of file
+        return {'success': False, 'codes': [], 'message': f'Error processing image: {str(e)}', 'timings': timings}
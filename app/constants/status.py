@@ -19,4 +19,19 @@ class ScanRecordStatus:
     SUBMITTED = "Submitted"
     COMPLETED = "Completed"
     VERIFIED = "Verified"
-    VERIFICATION_FAILED = "Verification Failed"
\ No newline at end of file
+    VERIFICATION_FAILED = "Verification Failed"
+
+
+class ImageStatus:
+    PENDING = "Pending"    # spooled locally, waiting for the storage worker
+    STORED = "Stored"
+    FAILED = "Failed"      # gave up after STORAGE_MAX_ATTEMPTS
+
+
+class ExportJobStatus:
+    QUEUED = "Queued"
+    RUNNING = "Running"
+    DONE = "Done"
+    FAILED = "Failed"
+
+    FINISHED_STATUSES = [DONE, FAILED]
@@ -0,0 +1,235 @@
+# app/decode_engine.py
+
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+
+class DecodeQueueFull(Exception):
+    """Raised when every decode slot (running + queued) is taken."""
+
+
+class DecodeTimeout(Exception):
+    """Raised when a decode job does not finish within its time budget."""
+
+
+def _init_worker():
+    """Runs once in every pool process: load libzbar and build the detectors."""
+    from app.libzbar_preload import preload_zbar_for_heroku
+    preload_zbar_for_heroku()
+
+    from app import barcode_processor
+    barcode_processor.warm_up()
+
+
+def _run_job(image_bytes, stages=None):
+    from app.barcode_processor import process_barcode_image
+    return process_barcode_image(image_bytes, stages=stages)
+
+
+def _ping():
+    return os.getpid()
+
+
+def _error_result(message):
+    # `retry`: the decoder didn't get to the image (busy, too slow, crashed) — not a verdict on it
+    return {'success': False, 'codes': [], 'message': message, 'retry': True}
+
+
+class DecodeEngine:
+    """
+    Process pool that keeps CPU-bound barcode decoding off the web workers.
+
+    Registered like the other extensions (db, migrate, login_manager) and
+    configured from Config:
+      - DECODE_POOL_SIZE:   number of decoder processes (0 = decode inline)
+      - DECODE_QUEUE_SIZE:  jobs allowed to wait on top of the running ones
+      - DECODE_TIMEOUT:     seconds a request waits for its result (or whole batch)
+      - DECODE_STAGES:      pipeline stages and budgets, e.g. "opencv,zbar,roi:500"
+    """
+
+    def __init__(self, app=None):
+        self.pool_size = 0
+        self.queue_size = 0
+        self.timeout = 20
+        self.stages = None
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self._warmups = []
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.pool_size = app.config.get("DECODE_POOL_SIZE", 0)
+        self.queue_size = app.config.get("DECODE_QUEUE_SIZE", 0)
+        self.timeout = app.config.get("DECODE_TIMEOUT", 20)
+
+        stages = app.config.get("DECODE_STAGES")
+        if stages:
+            from app.barcode_processor import parse_stages
+            self.stages = parse_stages(stages)  # fail at boot on a typo, not per scan
+
+        app.extensions["decode_engine"] = self
+
+    # ----------------------------
+    # Pool lifecycle
+    # ----------------------------
+    def start(self):
+        """
+        Create the pool for the current process (idempotent). Its processes
+        spawn and build their decoders in the background; jobs submitted
+        meanwhile queue behind that. warm_up() waits for it.
+        """
+        # Spawned decoder processes re-import __main__ (e.g. `python run.py` builds
+        # the app at import) — they must never start pools of their own. While
+        # that import runs, parent_process() is still None: check _inheriting too.
+        if (
+            self.pool_size <= 0
+            or multiprocessing.parent_process() is not None
+            or getattr(multiprocessing.current_process(), "_inheriting", False)
+        ):
+            return None
+
+        with self._lock:
+            # A pool inherited across fork (gunicorn workers) is unusable — rebuild it
+            if self._executor is not None and self._pid == os.getpid():
+                return self._executor
+
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.pool_size,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+            self._slots = threading.BoundedSemaphore(self.pool_size + self.queue_size)
+            self._pid = os.getpid()
+
+            # Make every process spawn and run its initializer now, not on the first scan
+            self._warmups = [self._executor.submit(_ping) for _ in range(self.pool_size)]
+            pending = [len(self._warmups)]
+
+            def ready(future):
+                pending[0] -= 1
+                if not pending[0] and not future.cancelled() and future.exception() is None:
+                    logging.info(f"✅ Decode pool ready ({self.pool_size} processes)")
+
+            for f in self._warmups:
+                f.add_done_callback(ready)
+            return self._executor
+
+    def warm_up(self, wait=True):
+        """
+        Get decoding ready before the first scan: the pool, or the inline
+        decoders. With `wait=False` this happens in the background.
+        """
+        if self.start() is None:
+            from app import barcode_processor
+            if wait:
+                barcode_processor.warm_up()
+            else:
+                threading.Thread(target=barcode_processor.warm_up, name="decode-warm-up", daemon=True).start()
+        elif wait:
+            for f in self._warmups:
+                f.result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._pid = None
+
+    # ----------------------------
+    # Jobs
+    # ----------------------------
+    def _submit(self, executor, image_bytes, wait=None):
+        """
+        Take a decode slot and submit one job. With `wait=None` a full engine
+        raises DecodeQueueFull immediately; otherwise wait up to `wait` seconds.
+        """
+        slots = self._slots
+        acquired = slots.acquire(blocking=False) if wait is None else slots.acquire(timeout=max(wait, 0))
+        if not acquired:
+            raise DecodeQueueFull("Barcode decoder is busy, please retry")
+
+        try:
+            future = executor.submit(_run_job, image_bytes, self.stages)
+        except BrokenProcessPool:
+            slots.release()
+            self.shutdown()  # a decoder process died — next call rebuilds the pool
+            raise
+        except Exception:
+            slots.release()
+            raise
+
+        # The slot stays taken until the process really finishes the job,
+        # so a timed-out request still counts against the queue.
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    def _result(self, future, timeout):
+        try:
+            return future.result(timeout=max(timeout, 0))
+        except FutureTimeout:
+            future.cancel()
+            raise DecodeTimeout(f"Barcode decoding exceeded {self.timeout}s")
+        except BrokenProcessPool:
+            self.shutdown()
+            raise
+
+    def decode(self, image_bytes):
+        """
+        Decode one image and return the `process_barcode_image` result dict.
+
+        Raises DecodeQueueFull when the engine is saturated and DecodeTimeout
+        when the job exceeds DECODE_TIMEOUT.
+        """
+        executor = self.start()
+        if executor is None:
+            return _run_job(image_bytes, self.stages)
+
+        future = self._submit(executor, image_bytes)
+        return self._result(future, self.timeout)
+
+    def decode_many(self, images):
+        """
+        Decode several images in parallel and return their results in input order.
+
+        The first image must find a free slot (else DecodeQueueFull, as for a
+        single decode); the rest wait for slots as earlier jobs finish. The
+        whole batch shares one DECODE_TIMEOUT deadline, as a single image
+        does, so the request ends within the server's timeout: an image not
+        decoded by then, like a job that fails, yields an error result (with
+        `retry` set) instead of failing the batch.
+        """
+        executor = self.start()
+        if executor is None:
+            return [_run_job(image_bytes, self.stages) for image_bytes in images]
+
+        deadline = time.monotonic() + self.timeout
+
+        futures = []
+        for index, image_bytes in enumerate(images):
+            if index == 0:
+                futures.append(self._submit(executor, image_bytes))
+                continue
+            try:
+                futures.append(self._submit(executor, image_bytes, wait=deadline - time.monotonic()))
+            except DecodeQueueFull as e:
+                futures.append(e)
+
+        results = []
+        for future in futures:
+            if isinstance(future, Exception):
+                results.append(_error_result(str(future)))
+                continue
+            try:
+                results.append(self._result(future, deadline - time.monotonic()))
+            except (DecodeTimeout, BrokenProcessPool) as e:
+                results.append(_error_result(str(e) or "Decoder process crashed"))
+        return results
@@ -1,7 +1,7 @@
 from . import db
 from flask_login import UserMixin
 from datetime import datetime
-from app.constants.status import ScanLineStatus
+from app.constants.status import ScanLineStatus, ExportJobStatus
 
 
 # ============================
@@ -155,6 +155,9 @@ class ScanRecord(db.Model):
     barcode_2 = db.Column(db.String(100))
     barcode_3 = db.Column(db.String(100))
     image_path = db.Column(db.String(255))
+    image_status = db.Column(db.String(20), nullable=True)  # ImageStatus; None when no image
+    client_id = db.Column(db.String(64), nullable=True)     # set by the client on bulk ingest; makes retries idempotent
+    image_hash = db.Column(db.String(64), nullable=True)    # sha256 of the photo, to spot one attached twice
 
     # Status fields
     status = db.Column(db.String(50), default="Scanned")  # Scanned / Completed
@@ -166,6 +169,13 @@ class ScanRecord(db.Model):
 
     counter_user = db.relationship("User", foreign_keys=[counter_user_id], lazy=True)
 
+    __table_args__ = (
+        # Keyset pagination of a line's records (see app.utils.pagination)
+        db.Index("ix_scan_records_line_created", "scan_line_id", "created_on", "id"),
+        db.Index("ix_scan_records_client_id", "client_id", unique=True),
+        db.Index("ix_scan_records_image_hash", "image_hash"),
+    )
+
     def __repr__(self):
         return (
             f"<ScanRecord ID={self.id} Status={self.status} Verification={self.verification_status}>"
@@ -182,4 +192,90 @@ class BarcodeEntry(db.Model):
             db.Index('idx_barcode_unique', 'barcode', unique=True),
         )
 
-    scan_record = db.relationship('ScanRecord', backref=db.backref('barcodes', cascade="all, delete-orphan"))
\ No newline at end of file
+    scan_record = db.relationship('ScanRecord', backref=db.backref('barcodes', cascade="all, delete-orphan"))
+
+# ============================
+# SCAN ROLLUP (derived)
+# ============================
+class ScanRollup(db.Model):
+    """
+    Scan counts per line / warehouse / location / counter / hour.
+
+    Derived from scan_records and kept in step with it inside the same
+    transaction (see app.utils.rollups). Dimension ids are 0 when the record
+    has none, so every key is non-null and the upsert key stays unique.
+    """
+    __tablename__ = "scan_rollups"
+
+    id = db.Column(db.Integer, primary_key=True)
+    scan_line_id = db.Column(db.Integer, nullable=False, default=0)
+    warehouse_id = db.Column(db.Integer, nullable=False, default=0)
+    location_id = db.Column(db.Integer, nullable=False, default=0)
+    counter_user_id = db.Column(db.Integer, nullable=False, default=0)
+    hour = db.Column(db.DateTime, nullable=False)
+    scans = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            "scan_line_id", "warehouse_id", "location_id", "counter_user_id", "hour",
+            name="uq_scan_rollups_key",
+        ),
+        db.Index("ix_scan_rollups_warehouse", "warehouse_id"),
+        db.Index("ix_scan_rollups_counter", "counter_user_id"),
+    )
+
+    def __repr__(self):
+        return f"<ScanRollup line={self.scan_line_id} hour={self.hour} scans={self.scans}>"
+
+
+# ============================
+# EXPORT JOB MODEL
+# ============================
+class ExportJob(db.Model):
+    """
+    A scan record export run in the background (see app.utils.export_jobs).
+
+    `fingerprint` identifies the requester + filter set + format, so the same
+    user repeating a request within EXPORT_CACHE_TTL reuses this job and its
+    artifact (whose summary names the requester). `updated_on` is
+    the worker's heartbeat: a running job that stops beating is requeued.
+    """
+    __tablename__ = "export_jobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    export_format = db.Column(db.String(10), nullable=False)
+    filters = db.Column(db.Text, nullable=False)  # JSON: location_ids / warehouse_ids / statuses
+    status = db.Column(db.String(20), nullable=False, default=ExportJobStatus.QUEUED)
+
+    rows_total = db.Column(db.Integer)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    artifact_key = db.Column(db.String(255))
+    error = db.Column(db.Text)
+
+    requested_by_id = db.Column(
+        db.Integer,
+        db.ForeignKey("users.id", name="fk_exportjob_requested_by_id"),
+    )
+    created_on = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_on = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_on = db.Column(db.DateTime)
+
+    requested_by = db.relationship("User", foreign_keys=[requested_by_id], lazy=True)
+
+    __table_args__ = (
+        db.Index("ix_export_jobs_fingerprint", "fingerprint", "created_on"),
+        db.Index("ix_export_jobs_status", "status"),
+    )
+
+    @property
+    def progress(self):
+        """Percentage of rows written to the artifact."""
+        if self.status == ExportJobStatus.DONE:
+            return 100
+        if not self.rows_total:
+            return 0
+        return min(99, int(self.rows_done * 100 / self.rows_total))
+
+    def __repr__(self):
+        return f"<ExportJob {self.id} {self.export_format} {self.status}>"
@@ -0,0 +1,97 @@
+"""
+Read-side queries for the dashboard pages.
+
+Each function returns what one template needs, fully loaded: relationships
+the template walks are eager-loaded (joinedload) or joined in, only the
+columns it renders are fetched, and per-line scan totals come from
+scan_rollups rather than from the records themselves. A page therefore
+costs a fixed number of queries however many lines it lists (see
+benchmarks/bench_dashboard_queries.py).
+"""
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload, aliased
+
+from app import db
+from app.constants.status import ScanLineStatus
+from app.models import User, Location, Warehouse, ScanLine, ScanRollup
+
+
+def line_options():
+    """Loader options for ScanLine rows shown in a dashboard table."""
+    return [
+        joinedload(ScanLine.location).load_only(Location.name),
+        joinedload(ScanLine.warehouse).load_only(Warehouse.warehouse_name),
+    ]
+
+
+def line_summaries(*filters):
+    """
+    One row per scan line with the names and scan totals a dashboard table
+    shows: id, line_code, target_count, current_count, status, location,
+    warehouse, counter_1, counter_2, team_leader, scans, last_scan.
+
+    A single query; scans / last_scan are correlated sums over scan_rollups,
+    evaluated only for the rows of the requested page. Returns a Query, so
+    callers can .paginate() it.
+    """
+    counter_1, counter_2, team_leader = aliased(User), aliased(User), aliased(User)
+    line_rollups = db.session.query(ScanRollup).filter(ScanRollup.scan_line_id == ScanLine.id)
+    scans = line_rollups.with_entities(func.coalesce(func.sum(ScanRollup.scans), 0)).scalar_subquery()
+    last_scan = (
+        line_rollups.filter(ScanRollup.scans > 0)
+        .with_entities(func.max(ScanRollup.hour))
+        .scalar_subquery()
+    )
+
+    return (
+        db.session.query(
+            ScanLine.id,
+            ScanLine.line_code,
+            ScanLine.target_count,
+            ScanLine.current_count,
+            ScanLine.status,
+            Location.name.label("location"),
+            Warehouse.warehouse_name.label("warehouse"),
+            counter_1.username.label("counter_1"),
+            counter_2.username.label("counter_2"),
+            team_leader.username.label("team_leader"),
+            scans.label("scans"),
+            last_scan.label("last_scan"),
+        )
+        .outerjoin(Location, ScanLine.location_id == Location.id)
+        .outerjoin(Warehouse, ScanLine.warehouse_id == Warehouse.id)
+        .outerjoin(counter_1, ScanLine.counter_1_id == counter_1.id)
+        .outerjoin(counter_2, ScanLine.counter_2_id == counter_2.id)
+        .outerjoin(team_leader, ScanLine.team_leader_user_id == team_leader.id)
+        .filter(*filters)
+        .order_by(ScanLine.id)
+    )
+
+
+class LineSummaryPagination(Pagination):
+    """
+    Paginates line_summaries(*filters). The total is counted on scan_lines
+    alone, so the rollup subqueries only run for the rows on the page.
+    """
+
+    def _query_items(self):
+        query = line_summaries(*self._query_args["filters"])
+        return query.limit(self.per_page).offset(self._query_offset).all()
+
+    def _query_count(self):
+        return db.session.query(func.count(ScanLine.id)).filter(*self._query_args["filters"]).scalar()
+
+
+def paginate_line_summaries(filters, page, per_page):
+    return LineSummaryPagination(page=page, per_page=per_page, error_out=False, filters=filters)
+
+
+def counter_lines(user):
+    """(active_jobs, other_jobs) for the counter dashboard."""
+    assigned = (ScanLine.counter_1_id == user.id) | (ScanLine.counter_2_id == user.id)
+    query = ScanLine.query.options(*line_options()).order_by(ScanLine.id)
+
+    active_jobs = query.filter(assigned & ScanLine.status.in_(ScanLineStatus.ACTIVE_STATUSES)).all()
+    other_jobs = query.filter(assigned & ScanLine.status.in_(ScanLineStatus.OTHER_STATUSES)).all()
+    return active_jobs, other_jobs
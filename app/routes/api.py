@@ -1,47 +1,89 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required
-from sqlalchemy import func
-from app.models import db, User, ScanLine, ScanRecord
+from sqlalchemy import func, case
+from app.constants.status import ScanLineStatus
+from app.models import db, User, Location, Warehouse, ScanLine, ScanRollup
 
 
 bp = Blueprint("api", __name__, url_prefix="/api/insights")
 
 
-@bp.route("/dashboard")
-@login_required
-def dashboard_insights():
+def _line_filters():
+    """ScanLine conditions for the ?location=&warehouse=&tl= filters."""
+    filters = []
     location_id = request.args.get("location")
     warehouse_id = request.args.get("warehouse")
     tl_id = request.args.get("tl")
 
-    query = ScanLine.query
-
     if location_id:
-        query = query.filter(ScanLine.location_id == location_id)
+        filters.append(ScanLine.location_id == location_id)
     if warehouse_id:
-        query = query.filter(ScanLine.warehouse_id == warehouse_id)
+        filters.append(ScanLine.warehouse_id == warehouse_id)
     if tl_id:
-        query = query.filter(ScanLine.team_leader_user_id == tl_id)
-        
-    lines = query.all()
+        filters.append(ScanLine.team_leader_user_id == tl_id)
+    return filters
 
-    total_lines = len(lines)
-    total_scans = sum(len(line.scan_records) for line in lines)
-    active_jobs = sum(1 for line in lines if line.status in ["Allocated", "In-Progress"])
-    completed_jobs = sum(1 for line in lines if line.status == "Completed")
 
-    location_data = {}
-    warehouse_data = {}
+@bp.route("/dashboard")
+@login_required
+def dashboard_insights():
+    # Everything is aggregated in SQL over scan_rollups (kept in step with
+    # scan_records, see app.utils.rollups), so the cost depends on the number of
+    # lines/groups, not on the scan volume.
+    filters = _line_filters()
 
-    for line in lines:
-        location_data[line.location.name] = location_data.get(line.location.name, 0) + len(line.scan_records)
-        warehouse_data[line.warehouse.warehouse_name] = warehouse_data.get(line.warehouse.warehouse_name, 0) + len(line.scan_records)
+    # Records per line, summed once and joined to the (filtered) lines below
+    line_scans = (
+        db.session.query(ScanRollup.scan_line_id.label("line_id"), func.sum(ScanRollup.scans).label("scans"))
+        .group_by(ScanRollup.scan_line_id)
+        .subquery()
+    )
+    scans = func.coalesce(func.sum(line_scans.c.scans), 0)
+
+    totals = (
+        db.session.query(
+            func.count(ScanLine.id),
+            func.count(case((ScanLine.status.in_([ScanLineStatus.ALLOCATED, ScanLineStatus.IN_PROGRESS]), 1))),
+            func.count(case((ScanLine.status == ScanLineStatus.COMPLETED, 1))),
+            scans,
+        )
+        .outerjoin(line_scans, line_scans.c.line_id == ScanLine.id)
+        .filter(*filters)
+        .one()
+    )
+    total_lines, active_jobs, completed_jobs, total_scans = totals
+
+    # Per location / warehouse, in the order their first line was created
+    location_rows = (
+        db.session.query(Location.name, scans)
+        .select_from(ScanLine)
+        .join(Location, ScanLine.location_id == Location.id)
+        .outerjoin(line_scans, line_scans.c.line_id == ScanLine.id)
+        .filter(*filters)
+        .group_by(Location.id, Location.name)
+        .order_by(func.min(ScanLine.id))
+        .all()
+    )
+    warehouse_rows = (
+        db.session.query(Warehouse.warehouse_name, scans)
+        .select_from(ScanLine)
+        .join(Warehouse, ScanLine.warehouse_id == Warehouse.id)
+        .outerjoin(line_scans, line_scans.c.line_id == ScanLine.id)
+        .filter(*filters)
+        .group_by(Warehouse.id, Warehouse.warehouse_name)
+        .order_by(func.min(ScanLine.id))
+        .all()
+    )
 
+    counter_scans = func.sum(ScanRollup.scans)
     top_counters = (
-        db.session.query(User.username, func.count(ScanRecord.id))
-        .join(ScanRecord, ScanRecord.counter_user_id == User.id)
-        .group_by(User.id)
-        .order_by(func.count(ScanRecord.id).desc())
+        db.session.query(User.username, counter_scans)
+        .join(ScanRollup, ScanRollup.counter_user_id == User.id)
+        .join(ScanLine, ScanRollup.scan_line_id == ScanLine.id)
+        .filter(*filters)
+        .group_by(User.id, User.username)
+        .having(counter_scans > 0)
+        .order_by(counter_scans.desc())
         .limit(5)
         .all()
     )
@@ -50,10 +92,10 @@ def dashboard_insights():
         "totalLines": total_lines,
         "activeJobs": active_jobs,
         "completedJobs": completed_jobs,
-        "totalScans": total_scans,
-        "locations": list(location_data.keys()),
-        "locationScans": list(location_data.values()),
-        "warehouses": list(warehouse_data.keys()),
-        "warehouseJobs": list(warehouse_data.values()),
-        "topCounters": [{"name": name, "scans": count} for name, count in top_counters],
+        "totalScans": int(total_scans),
+        "locations": [name for name, _ in location_rows],
+        "locationScans": [int(count) for _, count in location_rows],
+        "warehouses": [name for name, _ in warehouse_rows],
+        "warehouseJobs": [int(count) for _, count in warehouse_rows],
+        "topCounters": [{"name": name, "scans": int(count)} for name, count in top_counters],
     })
@@ -1,15 +1,22 @@
-from flask import request, Blueprint, jsonify, render_template, redirect, url_for, flash
+from flask import request, Blueprint, jsonify, render_template, redirect, url_for, flash, current_app, send_from_directory
 from flask_login import login_required, current_user
-from app.constants.status import ScanLineStatus
+from app.constants.status import ImageStatus
 import time
-from collections import defaultdict
+from sqlalchemy.exc import IntegrityError
 from werkzeug.utils import secure_filename
-from app.models import ScanLine, ScanRecord, BarcodeEntry
-from app.utils.s3_helper import upload_to_s3, delete_from_s3, generate_presigned_url
-from app import db
+from app.models import ScanLine, ScanRecord
+from app.queries import counter_lines
+from app.utils.rollups import line_scan_count
+from app.utils.pagination import scan_record_page, page_size, attach_image_urls, scan_record_dict
+from app.utils.upload_staging import stage_upload, claim_upload, unclaim_upload, release_upload
+from app.utils.ingest import ingest_scan_records
+from app.utils.barcode_index import duplicate_error
+from app.utils.scan_writes import DuplicateBarcode, count_scans, insert_barcode_entries
+from app.utils.decode_cache import image_digest, attached_records
+from app import db, decode_engine, decode_cache, storage_queue, barcode_index
+from app.decode_engine import DecodeQueueFull, DecodeTimeout
 
 import os
-from app.barcode_processor import process_barcode_image
 
 bp = Blueprint("counter", __name__, url_prefix="/counter")
 
@@ -17,15 +24,7 @@ bp = Blueprint("counter", __name__, url_prefix="/counter")
 @bp.route("/dashboard")
 @login_required
 def dashboard():
-    active_jobs = ScanLine.query.filter(
-        ((ScanLine.counter_1_id == current_user.id) | (ScanLine.counter_2_id == current_user.id)) &
-        (ScanLine.status.in_(ScanLineStatus.ACTIVE_STATUSES))
-    ).all()
-
-    other_jobs = ScanLine.query.filter(
-        ((ScanLine.counter_1_id == current_user.id) | (ScanLine.counter_2_id == current_user.id)) &
-        (ScanLine.status.in_(ScanLineStatus.OTHER_STATUSES))
-    ).all()
+    active_jobs, other_jobs = counter_lines(current_user)
 
     return render_template('counter_dashboard.html', active_jobs=active_jobs, other_jobs=other_jobs)
 
@@ -41,15 +40,68 @@ def view_scan_line(id):
         flash("You are not assigned to this scan line.", "danger")
         return redirect(url_for('counter.dashboard'))
 
-    # Fetch scan records linked to this line
-    records = ScanRecord.query.filter_by(scan_line_id=line.id).all()
-    # Generate presigned URLs for each record image
-    for record in records:
-        if record.image_path:
-            record.image_url = generate_presigned_url(record.image_path)
-        else:
-            record.image_url = None
-    return render_template('counter_view_scan_line.html', line=line, records=records)
+    # First page only; the rest is fetched by the table's infinite scroll
+    records, next_cursor = scan_record_page(line.id)
+    attach_image_urls(records)
+    return render_template('counter_view_scan_line.html', line=line, records=records, next_cursor=next_cursor)
+
+
+@bp.route('/view/<int:id>/records')
+@login_required
+def scan_line_records(id):
+    """Next page of a line's scan records (JSON), after the ?cursor= of the previous one."""
+    line = ScanLine.query.get_or_404(id)
+    if current_user.id not in [line.counter_1_id, line.counter_2_id]:
+        return jsonify({"success": False, "error": "You are not assigned to this scan line."}), 403
+
+    try:
+        records, next_cursor = scan_record_page(
+            line.id, request.args.get("cursor"), page_size(request.args.get("limit"))
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    attach_image_urls(records)
+    return jsonify({
+        "success": True,
+        "records": [scan_record_dict(r) for r in records],
+        "next_cursor": next_cursor,
+    })
+
+
+@bp.route('/view/<int:id>/barcodes')
+@login_required
+def scan_line_barcodes(id):
+    """
+    Barcodes already scanned on a line, for the scan page's local duplicate check.
+    ?since=<last_id> returns only those of records added after that one.
+    """
+    line = ScanLine.query.get_or_404(id)
+    if current_user.id not in [line.counter_1_id, line.counter_2_id]:
+        return jsonify({"success": False, "error": "You are not assigned to this scan line."}), 403
+
+    since = request.args.get("since", 0, type=int)
+    rows = (
+        db.session.query(ScanRecord.id, ScanRecord.barcode_1, ScanRecord.barcode_2, ScanRecord.barcode_3)
+        .filter(ScanRecord.scan_line_id == line.id, ScanRecord.id > since)
+        .order_by(ScanRecord.id)
+        .all()
+    )
+    return jsonify({
+        "success": True,
+        "barcodes": [code for _, *codes in rows for code in codes if code],
+        "last_id": rows[-1].id if rows else since,
+    })
+
+
+@bp.route('/sw.js')
+def service_worker():
+    """The scan queue's service worker, served from /counter/ so that is its scope."""
+    response = send_from_directory(
+        os.path.join(current_app.static_folder, "js"), "scan_sync_sw.js", mimetype="application/javascript"
+    )
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 
 @bp.route('/count/<int:line_id>')
@@ -63,7 +115,7 @@ def count_page(line_id):
         flash("You are not assigned to this scan line.", "danger")
         return redirect(url_for('counter.dashboard'))
 
-    scanned_count = ScanRecord.query.filter_by(scan_line_id=line.id).count()
+    scanned_count = line_scan_count(line.id)
     remaining = (line.target_count or 0) - scanned_count
     return render_template(
         "counter_count_page.html",
@@ -73,11 +125,55 @@ def count_page(line_id):
     )
 
 
+def _reject_oversized(max_images=1):
+    """413 before the body is parsed when the upload can't be a (compressed) scan photo."""
+    limit = current_app.config.get("MAX_IMAGE_UPLOAD_BYTES")
+    if limit and request.content_length and request.content_length > limit * max_images:
+        return jsonify({
+            "success": False,
+            "error": f"Upload too large ({request.content_length // 1024} KB). Please retake the photo."
+        }), 413
+    return None
+
+
+def _barcode_payload(result, hit=None):
+    """Shape a decode result into the {barcodes: [b1, b2, b3]} contract the scan page expects."""
+    codes = result.get("codes", []) if isinstance(result, dict) else []
+    return {
+        "barcodes": (codes + ["", "", ""])[:3],
+        "message": result.get("message", "Processed"),
+        "timings": result.get("timings", []),
+        "cache": hit,  # "exact" when served by the decode cache
+    }
+
+
+def _duplicate_image(result, digest, attached):
+    """Warning for a photo (or a near-identical one, per the decode cache) already attached to a record."""
+    record = attached.get(digest)
+    similar = record is None and result.get("matched") in attached
+    if similar:
+        record = attached[result["matched"]]
+    if record is None:
+        return None
+    return {
+        "record_id": record.id,
+        "scan_line_id": record.scan_line_id,
+        "message": (
+            f"{'A near-identical photo' if similar else 'This photo'} is already attached "
+            f"to Scan Record ID {record.id}."
+        ),
+    }
+
+
 @bp.route('/process_barcode', methods=['POST'])
 @login_required
 def process_barcode():
     """Process image only — detect barcodes but do NOT save ScanRecord."""
     try:
+        rejected = _reject_oversized()
+        if rejected:
+            return rejected
+
         file = request.files.get("image")
         if not file:
             return jsonify({"error": "No image uploaded"}), 400
@@ -86,21 +182,105 @@ def process_barcode():
         file.stream.seek(0)
         raw_bytes = file.read()
 
-        # Process via barcode_processor
-        result = process_barcode_image(raw_bytes)
-        codes = result.get("codes", []) if isinstance(result, dict) else []
-        codes = (codes + ["", "", ""])[:3]
+        # Decode in the process pool so this worker stays free for DB endpoints;
+        # a resubmitted photo gets the earlier result from the decode cache
+        result, digest, hit = decode_cache.decode(raw_bytes, current_user.id, decode_engine.decode)
+        attached = attached_records([digest, result.get("matched")])
+
+        # Keep the bytes so save_scan_record doesn't need the photo uploaded again
+        upload_token = stage_upload(raw_bytes, file.filename, current_user.id, digest=digest)
+
+        return jsonify({
+            "success": True,
+            "upload_token": upload_token,
+            **_barcode_payload(result, hit),
+            "duplicate_image": _duplicate_image(result, digest, attached),
+        })
+
+    except DecodeQueueFull as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "2"}
+    except DecodeTimeout as e:
+        return jsonify({"error": str(e)}), 504
+    except Exception as e:
+        return jsonify({"error": f"Processing failed: {str(e)}"}), 500
+
+
+@bp.route('/process_barcode_batch', methods=['POST'])
+@login_required
+def process_barcode_batch():
+    """Decode several images from one multipart upload (field `images`), in parallel."""
+    try:
+        batch_max = current_app.config.get("DECODE_BATCH_MAX", 10)
+        rejected = _reject_oversized(max_images=batch_max)
+        if rejected:
+            return rejected
+
+        files = request.files.getlist("images")
+        if not files:
+            return jsonify({"error": "No images uploaded"}), 400
+
+        if len(files) > batch_max:
+            return jsonify({"error": f"At most {batch_max} images per batch"}), 413
+
+        images = [f.read() for f in files]
+        results = decode_cache.decode_many(images, current_user.id, decode_engine.decode_many)
+        attached = attached_records(
+            [digest for _, digest, _ in results] + [r.get("matched") for r, _, _ in results]
+        )
 
         return jsonify({
             "success": True,
-            "barcodes": codes,
-            "message": result.get("message", "Processed")
+            "results": [
+                {
+                    "index": i,
+                    "filename": f.filename,
+                    "success": bool(r.get("success")),
+                    "retry": bool(r.get("retry")),  # not decoded in time: send this image again
+                    "upload_token": stage_upload(data, f.filename, current_user.id, digest=digest),
+                    **_barcode_payload(r, hit),
+                    "duplicate_image": _duplicate_image(r, digest, attached),
+                }
+                for i, (f, data, (r, digest, hit)) in enumerate(zip(files, images, results))
+            ],
         })
 
+    except DecodeQueueFull as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "2"}
     except Exception as e:
         return jsonify({"error": f"Processing failed: {str(e)}"}), 500
     
 
+@bp.route('/stage_image', methods=['POST'])
+@login_required
+def stage_image():
+    """
+    Stage a photo without decoding it and return its upload token. Used by the
+    scan queue for photos captured offline, whose barcodes were typed in.
+    """
+    rejected = _reject_oversized()
+    if rejected:
+        return rejected
+
+    wrong_user = _queued_by_other_user(request.form.get("user_id"))
+    if wrong_user:
+        return wrong_user
+
+    file = request.files.get("image")
+    if not file:
+        return jsonify({"success": False, "error": "No image uploaded"}), 400
+    return jsonify({"success": True, "upload_token": stage_upload(file.read(), file.filename, current_user.id)})
+
+
+def _queued_by_other_user(user_id):
+    """
+    The 409 for scan queue requests tagged with someone else's user id: on a
+    shared device, queued scans are only sent while their counter is signed in.
+    """
+    if user_id is None or str(user_id) == str(current_user.id):
+        return None
+    return jsonify({"success": False, "wrong_user": True, "error": "These scans were queued by another user."}), 409
+
+
 # --- Directory to store uploaded barcode images ---
 UPLOAD_FOLDER = "app/static/uploads"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -109,11 +289,16 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 @bp.route("/save_scan_record", methods=["POST"])
 @login_required
 def save_scan_record():
+    rejected = _reject_oversized()
+    if rejected:
+        return rejected
+
     line_id = request.form.get("line_id")
     barcode1 = (request.form.get("barcode_1") or "").strip()
     barcode2 = (request.form.get("barcode_2") or "").strip()
     barcode3 = (request.form.get("barcode_3") or "").strip()
     image = request.files.get("image")
+    upload_token = request.form.get("upload_token")
 
     barcodes = [b for b in [barcode1, barcode2, barcode3] if b]
 
@@ -121,25 +306,11 @@ def save_scan_record():
     if not barcodes:
         return jsonify({"success": False, "error": "At least one barcode is required."}), 400
 
-    # ✅ Step 2: Fetch all existing barcode entries that match any input barcode
-    existing_entries = BarcodeEntry.query.filter(BarcodeEntry.barcode.in_(barcodes)).all()
-
-    # ✅ Step 3: Group by scan_record_id and count matching barcodes
-    scan_record_barcode_count = defaultdict(list)
-
-    for entry in existing_entries:
-        scan_record_barcode_count[entry.scan_record_id].append(entry.barcode)
-
-    # ✅ Step 4: If any scan_record_id has 2 or more matching barcodes from the input, block
-    for scan_record_id, matched_barcodes in scan_record_barcode_count.items():
-        if len(matched_barcodes) >= 2:
-            return jsonify({
-                "success": False,
-                "error": (
-                    f"The barcodes {matched_barcodes} already exist together "
-                    f"under Scan Record ID {scan_record_id}."
-                )
-            }), 400
+    # ✅ Step 2: Look up any input barcode that already exists (the duplicate
+    # index skips the query for barcodes it knows are new)
+    duplicate = duplicate_error(barcodes, barcode_index.lookup(barcodes))
+    if duplicate:
+        return jsonify({"success": False, "error": duplicate}), 400
 
     # ✅ Step 3: Proceed with image saving
     scan_line = ScanLine.query.get(line_id)
@@ -148,11 +319,27 @@ def save_scan_record():
 
     filename = None
     s3_key = ""
+    staged_path = None
+    image_hash = None
     if image:
         timestamp = str(time.time()).replace(".", "")
         filename = f"{timestamp}_{secure_filename(image.filename)}"
         s3_key = f"uploads/{filename}" 
-        upload_to_s3(image, s3_key)
+        image_hash = image_digest(image.stream.read())
+    elif upload_token:
+        # Photo already sent with process_barcode — use the staged copy
+        staged = claim_upload(upload_token, current_user.id)
+        if not staged:
+            return jsonify({
+                "success": False,
+                "upload_expired": True,
+                "error": "The captured image has expired, please attach it again."
+            }), 410
+
+        staged_path, staged_name, image_hash = staged
+        timestamp = str(time.time()).replace(".", "")
+        filename = f"{timestamp}_{staged_name}"
+        s3_key = f"uploads/{filename}"
 
     # ✅ Step 4: Create ScanRecord
     record = ScanRecord(
@@ -164,35 +351,138 @@ def save_scan_record():
         barcode_2=barcode2 or None,
         barcode_3=barcode3 or None,
         image_path=s3_key,
+        image_status=ImageStatus.PENDING if s3_key else None,
+        image_hash=image_hash,
     )
 
     db.session.add(record)
     db.session.flush()  # ✅ ensures record.id is available
 
-    # ✅ Step 5: Create BarcodeEntry for each barcode
-    for code in barcodes:
-        db.session.add(BarcodeEntry(scan_record_id=record.id, barcode=code))
-
-    # ✅ Step 6: Update ScanLine count and status
-    scan_line.current_count = (scan_line.current_count or 0) + 1
-    if scan_line.status == "Created":
-        scan_line.status = "In-Progress"
-
-    db.session.commit()
-
-    # ✅ Step 7: Return JSON response for UI update
-    return jsonify({
-        "success": True,
-        "record": {
+    try:
+        # ✅ Step 5: Create BarcodeEntry for each barcode (a barcode a concurrent
+        # save took first raises DuplicateBarcode instead of failing the commit)
+        insert_barcode_entries(
+            db.session.connection(),
+            [{"scan_record_id": record.id, "barcode": code} for code in barcodes],
+        )
+        barcode_index.add(barcodes)  # Core insert: not seen by the flush hook
+
+        # ✅ Step 6: Update ScanLine count and status in one atomic UPDATE
+        scanned_count = count_scans(db.session.connection(), scan_line, 1)
+        remaining = scan_line.target_count - scanned_count
+        record_data = {
+            "id": record.id,
             "barcode_1": record.barcode_1,
             "barcode_2": record.barcode_2,
             "barcode_3": record.barcode_3,
             "created_on": record.created_on.strftime("%Y-%m-%d %H:%M:%S"),
             "image_url": url_for("static", filename=record.image_path, _external=False),
-        },
+            "image_status": record.image_status,
+        }
+        db.session.commit()
+    except (DuplicateBarcode, IntegrityError):
+        # Stored by another process since its index was loaded: ask the database
+        db.session.rollback()
+        if staged_path:
+            unclaim_upload(upload_token)  # the photo can go with the corrected save
+        duplicate = duplicate_error(barcodes, barcode_index.lookup(barcodes, use_index=False))
+        return jsonify({
+            "success": False,
+            "error": duplicate or "Conflicting concurrent save, please retry."
+        }), 400 if duplicate else 409
+
+    # ✅ Step 6b: Hand the image to the background storage queue (after commit,
+    # so the worker can always find the record it marks as stored)
+    if s3_key:
+        try:
+            if staged_path:
+                storage_queue.enqueue_upload(staged_path, s3_key, record_id=record.id, move=True)
+                release_upload(upload_token)
+            else:
+                image.stream.seek(0)
+                storage_queue.enqueue_upload(image.stream, s3_key, record_id=record.id)
+        except Exception as e:
+            current_app.logger.error(f"Failed to spool image {s3_key}: {e}")
+            record.image_status = record_data["image_status"] = ImageStatus.FAILED
+            db.session.commit()
+
+    # ✅ Step 7: Return JSON response for UI update
+    return jsonify({
+        "success": True,
+        "record": record_data,
+        "scanned_count": scanned_count,
+        "remaining": remaining
+    })    
+
+
+@bp.route("/save_scan_records", methods=["POST"])
+@login_required
+def save_scan_records():
+    """
+    Bulk ingest for scans collected offline: {"line_id": .., "user_id": .., "records":
+    [{client_id, barcode_1..3, upload_token?, scanned_on?}, ..]} → a result per record,
+    in order. One transaction for the batch; retrying with the same client_ids is safe.
+    `user_id` is who queued the scans: a batch queued by another user gets a 409.
+    """
+    data = request.get_json(silent=True) or {}
+    wrong_user = _queued_by_other_user(data.get("user_id"))
+    if wrong_user:
+        return wrong_user
+
+    items = data.get("records")
+    if not isinstance(items, list) or not items or not all(isinstance(i, dict) for i in items):
+        return jsonify({"success": False, "error": "A non-empty list of records is required."}), 400
+
+    batch_max = current_app.config.get("INGEST_BATCH_MAX", 500)
+    if len(items) > batch_max:
+        return jsonify({"success": False, "error": f"At most {batch_max} records per request"}), 413
+
+    try:
+        scan_line = db.session.get(ScanLine, int(data.get("line_id")))
+    except (TypeError, ValueError):
+        scan_line = None
+    if not scan_line:
+        return jsonify({"success": False, "error": "Invalid scan line."}), 404
+
+    user = current_user._get_current_object()
+    uploads = []
+    try:
+        try:
+            results, uploads = ingest_scan_records(scan_line, user, items)
+            db.session.commit()
+        except (DuplicateBarcode, IntegrityError):
+            # Possibly a barcode another process stored since its duplicate
+            # index was loaded: check the whole batch against the database once
+            db.session.rollback()
+            for *_, upload_token in uploads:
+                unclaim_upload(upload_token)
+            uploads = []
+            results, uploads = ingest_scan_records(scan_line, user, items, use_index=False)
+            db.session.commit()
+    except (DuplicateBarcode, IntegrityError):
+        # A concurrent request stored one of these barcodes / client_ids first
+        db.session.rollback()
+        for *_, upload_token in uploads:
+            unclaim_upload(upload_token)
+        return jsonify({"success": False, "retry": True, "error": "Conflicting concurrent save, please retry."}), 409
+
+    # Images go to the background storage queue after commit, as in save_scan_record
+    for staged_path, s3_key, record_id, upload_token in uploads:
+        try:
+            storage_queue.enqueue_upload(staged_path, s3_key, record_id=record_id, move=True)
+            release_upload(upload_token)
+        except Exception as e:
+            current_app.logger.error(f"Failed to spool image {s3_key}: {e}")
+            ScanRecord.query.filter_by(id=record_id).update({"image_status": ImageStatus.FAILED})
+            db.session.commit()
+
+    return jsonify({
+        "success": True,
+        "results": results,
+        "accepted": sum(1 for r in results if r["status"] == "accepted"),
         "scanned_count": scan_line.current_count,
         "remaining": scan_line.target_count - scan_line.current_count
-    })    
+    })
 
 
 @bp.route("/raise_variation", methods=["POST"])
@@ -253,26 +543,25 @@ def delete_scan_record():
         return jsonify({"success": False, "error": "Unauthorized action"}), 403
 
     try:
-        # ✅ Delete associated image file (if exists)
+        # ✅ Queue deletion of the associated image file (if exists)
         if record.image_path:
-            delete_from_s3(record.image_path)
+            storage_queue.enqueue_delete(record.image_path)
 
         # ✅ Get related ScanLine before deleting
         scan_line = record.scan_line
 
         # ✅ Delete the record (BarcodeEntry cascade handles automatically)
         db.session.delete(record)
-        db.session.commit()  # commit early to ensure the deletion is flushed
+        db.session.flush()
 
-        # ✅ Recalculate the actual count from remaining ScanRecords
-        if scan_line:
-            new_count = ScanRecord.query.filter_by(scan_line_id=scan_line.id).count()
-            scan_line.current_count = new_count
-            db.session.commit()
+        # ✅ Decrement the line count in the same transaction, atomically, so a
+        # concurrent save on the line isn't overwritten
+        new_count = count_scans(db.session.connection(), scan_line, -1) if scan_line else 0
+        db.session.commit()
 
         return jsonify({
             "success": True,
-            "new_count": scan_line.current_count if scan_line else 0
+            "new_count": new_count
         })
 
     except Exception as e:
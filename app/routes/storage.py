@@ -0,0 +1,53 @@
+from flask import Blueprint, abort, send_file, request, jsonify, current_app
+from flask_login import login_required, current_user
+from app.constants.status import ImageStatus
+from app.models import ScanLine, ScanRecord
+from app.utils.storage import get_storage, signed_url, LocalStorage
+
+bp = Blueprint("storage", __name__, url_prefix="/storage")
+
+
+@bp.route("/files/<token>")
+def serve_file(token):
+    """Serve an image from the local storage backend via a signed, expiring token."""
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        abort(404)
+
+    path = storage.resolve(token)
+    if not path:
+        abort(404)
+    return send_file(path, max_age=300)
+
+
+@bp.route("/sign", methods=["POST"])
+@login_required
+def sign_urls():
+    """
+    Batch-sign image URLs for scan records: {"record_ids": [..]} → {"urls": {id: url}}.
+    Used by the scan line pages to sign thumbnails only once they scroll into view.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        record_ids = [int(i) for i in data.get("record_ids", [])]
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "Invalid record ids"}), 400
+
+    batch_max = current_app.config.get("PRESIGNED_URL_BATCH_MAX", 100)
+    if len(record_ids) > batch_max:
+        return jsonify({"success": False, "error": f"At most {batch_max} records per request"}), 413
+
+    query = (
+        ScanRecord.query.join(ScanLine, ScanRecord.scan_line_id == ScanLine.id)
+        .filter(ScanRecord.id.in_(record_ids))
+        .with_entities(ScanRecord.id, ScanRecord.image_path, ScanRecord.image_status)
+    )
+    # Counters only see images from lines they're assigned to
+    if current_user.role == "Counter":
+        query = query.filter((ScanLine.counter_1_id == current_user.id) | (ScanLine.counter_2_id == current_user.id))
+
+    urls = {}
+    for record_id, image_path, image_status in query:
+        if image_path and image_status != ImageStatus.PENDING:
+            urls[record_id] = signed_url(image_path)
+    return jsonify({"success": True, "urls": urls})
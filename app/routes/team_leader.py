@@ -1,13 +1,15 @@
-from flask import Blueprint, flash, redirect, jsonify, render_template, request, url_for
+from flask import Blueprint, flash, redirect, jsonify, render_template, request, url_for, current_app
 from flask_login import login_required, current_user
-from app.models import Location, Warehouse, User, ScanLine, ScanRecord
-from app import db
-from app.constants.status import ScanLineStatus
-from flask import send_file
-import io
-from app.utils.s3_helper import generate_presigned_url
-from openpyxl import Workbook
-from datetime import datetime
+from app.models import Location, Warehouse, User, ScanLine, ScanRecord, ExportJob
+from app import db, export_jobs
+from app.constants.status import ScanLineStatus, ExportJobStatus
+from app.queries import paginate_line_summaries
+from app.utils.rollups import line_scan_count
+from app.utils.pagination import scan_record_page, page_size, attach_image_urls, scan_record_dict
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
+from app.utils.export import export_query
+from app.utils.storage import get_storage
 
 
 
@@ -31,8 +33,27 @@ def dashboard():
     warehouses = [w.to_dict() for w in Warehouse.query.all()]
     counters = User.query.filter_by(role="Counter", is_active=True).all()
 
-    my_lines = ScanLine.query.filter_by(team_leader=current_user).all()
-    other_lines = ScanLine.query.filter(ScanLine.team_leader != current_user).all()
+    # Summary rows only (one query per table); records load when a row is expanded
+    filters = {key: request.args.get(key) for key in ("status", "location", "warehouse") if request.args.get(key)}
+    conditions = []
+    if "status" in filters:
+        conditions.append(ScanLine.status == filters["status"])
+    if "location" in filters:
+        conditions.append(ScanLine.location_id == filters["location"])
+    if "warehouse" in filters:
+        conditions.append(ScanLine.warehouse_id == filters["warehouse"])
+
+    per_page = current_app.config.get("DASHBOARD_LINES_PER_PAGE", 25)
+    my_lines = paginate_line_summaries(
+        [ScanLine.team_leader_user_id == current_user.id, *conditions],
+        request.args.get("page", 1, type=int),
+        per_page,
+    )
+    other_lines = paginate_line_summaries(
+        [or_(ScanLine.team_leader_user_id != current_user.id, ScanLine.team_leader_user_id.is_(None)), *conditions],
+        request.args.get("other_page", 1, type=int),
+        per_page,
+    )
 
     return render_template(
         "team_leader_dashboard.html",
@@ -41,7 +62,9 @@ def dashboard():
         counters=counters,
         my_lines=my_lines,
         other_lines=other_lines,
-        statuses=statuses
+        statuses=statuses,
+        filters=filters,
+        active_tab=request.args.get("tab", "my"),
     )
 
 
@@ -85,14 +108,41 @@ def create_scan_line():
 def view_scan_line(id):
     line = ScanLine.query.get_or_404(id)
 
-    records = ScanRecord.query.filter_by(scan_line_id=line.id).all()
-    # Generate presigned URLs for each record image
-    for record in records:
-        if record.image_path:
-            record.image_url = generate_presigned_url(record.image_path)
-        else:
-            record.image_url = None
-    return render_template('team_leader_view_scan_line.html', line=line, scan_records=records)
+    # First page only; the rest is fetched by the table's infinite scroll
+    records, next_cursor = scan_record_page(line.id, options=[joinedload(ScanRecord.counter_user)])
+    attach_image_urls(records)
+    total_records = line_scan_count(line.id)
+    return render_template(
+        'team_leader_view_scan_line.html',
+        line=line,
+        scan_records=records,
+        next_cursor=next_cursor,
+        total_records=total_records,
+    )
+
+
+@bp.route('/scan_line/<int:id>/records')
+@login_required
+def scan_line_records(id):
+    """Next page of a line's scan records (JSON), after the ?cursor= of the previous one."""
+    line = ScanLine.query.get_or_404(id)
+
+    try:
+        records, next_cursor = scan_record_page(
+            line.id,
+            request.args.get("cursor"),
+            page_size(request.args.get("limit")),
+            options=[joinedload(ScanRecord.counter_user)],
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    attach_image_urls(records)
+    return jsonify({
+        "success": True,
+        "records": [scan_record_dict(r) for r in records],
+        "next_cursor": next_cursor,
+    })
 
 
 @bp.route('/scan_line/<int:id>/edit', methods=['GET', 'POST'])
@@ -202,81 +252,61 @@ def update_scan_record():
 @bp.route("/export_custom", methods=["POST"])
 @login_required
 def export_custom():
+    """
+    Queue an export of the selected scan records (see app.utils.export_jobs).
+    Returns the job; the page polls export_status until the file is ready.
+    """
     location_ids = request.form.getlist("location_ids")
     warehouse_ids = request.form.getlist("warehouse_ids")
     statuses = request.form.getlist("status_list")
 
-    query = ScanRecord.query.join(ScanLine)
+    export_format = request.form.get("format", "xlsx")
+    if export_format not in ("xlsx", "csv"):
+        return jsonify({"success": False, "error": f"Unknown export format: {export_format}"}), 400
 
-    if location_ids:
-        query = query.filter(ScanLine.location_id.in_(location_ids))
-    if warehouse_ids:
-        query = query.filter(ScanLine.warehouse_id.in_(warehouse_ids))
-    if statuses:
-        query = query.filter(ScanLine.status.in_(statuses))
+    if export_query(location_ids, warehouse_ids, statuses).first() is None:
+        return jsonify({"success": False, "error": "No records found for selected filters."}), 404
 
-    records = query.all()
-    if not records:
-        flash("No records found for selected filters.", "warning")
-        return redirect(url_for("team_leader.dashboard"))
+    job, created = export_jobs.enqueue(current_user, export_format, location_ids, warehouse_ids, statuses)
+    return jsonify({"success": True, "cached": not created, "job": export_job_dict(job)}), 202 if created else 200
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Exported Scan Records"
-
-    # Add summary header
-    ws["A1"] = "Export Summary"
-    ws["A2"] = f"Generated by: {current_user.username}"
-    ws["A3"] = f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-    ws["A4"] = f"Selected Locations: {', '.join(location_ids) if location_ids else 'All'}"
-    ws["A5"] = f"Selected Warehouses: {', '.join(warehouse_ids) if warehouse_ids else 'All'}"
-    ws["A6"] = f"Statuses: {', '.join(statuses) if statuses else 'All'}"
-    ws["A8"] = "Scan Records:"
-
-    headers = [
-        "Location",
-        "Warehouse",
-        "Line Code",
-        "Status",
-        "Counter (User)",
-        "Partner (Team Leader)",
-        "Barcode 1",
-        "Barcode 2",
-        "Barcode 3",
-        "Created Date Time",
-    ]
-    ws.append([])
-    ws.append(headers)
-
-    for r in records:
-        line = r.scan_line
-        ws.append([
-            line.location.name if line.location else "",
-            line.warehouse.warehouse_name if line.warehouse else "",
-            line.line_code or "",
-            line.status or "",
-            r.counter_user.username if r.counter_user else "",
-            line.team_leader.username if line.team_leader else "",
-            r.barcode_1 or "",
-            r.barcode_2 or "",
-            r.barcode_3 or "",
-            r.created_on.strftime("%Y-%m-%d %H:%M:%S"),
-        ])
-
-    # Auto-width
-    for col in ws.columns:
-        max_len = max(len(str(c.value)) for c in col if c.value)
-        ws.column_dimensions[col[0].column_letter].width = max_len + 2
-
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    filename = f"DSV_Export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-
-    return send_file(
-        output,
-        as_attachment=True,
-        download_name=filename,
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
\ No newline at end of file
+
+def can_access_export(job):
+    """Exports are for whoever requested them, and for Team Leaders and Managers."""
+    return job.requested_by_id == current_user.id or current_user.role in ("TeamLeader", "Manager")
+
+
+@bp.route("/export_jobs/<int:job_id>")
+@login_required
+def export_status(job_id):
+    job = db.session.get(ExportJob, job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Export not found"}), 404
+    if not can_access_export(job):
+        return jsonify({"success": False, "error": "Unauthorized action."}), 403
+    return jsonify({"success": True, "job": export_job_dict(job)})
+
+
+@bp.route("/export_jobs/<int:job_id>/download")
+@login_required
+def export_download(job_id):
+    job = db.session.get(ExportJob, job_id)
+    if job is None or not can_access_export(job) or job.status != ExportJobStatus.DONE or not job.artifact_key:
+        flash("That export is not available.", "warning")
+        return redirect(url_for("team_leader.dashboard"))
+    return redirect(get_storage().url(job.artifact_key, expires_in=current_app.config.get("PRESIGNED_URL_EXPIRES", 3600)))
+
+
+def export_job_dict(job):
+    return {
+        "id": job.id,
+        "format": job.export_format,
+        "status": job.status,
+        "rows_total": job.rows_total,
+        "rows_done": job.rows_done,
+        "progress": job.progress,
+        "error": job.error,
+        "status_url": url_for("team_leader.export_status", job_id=job.id),
+        "download_url": url_for("team_leader.export_download", job_id=job.id)
+        if job.status == ExportJobStatus.DONE else None,
+    }
@@ -0,0 +1,24 @@
+// app/static/js/capture_worker.js
+// Downscales and re-encodes a captured photo off the main thread.
+// In:  { id, file: Blob, maxDimension: number, quality: 0..1 }
+// Out: { id, blob, width, height } or { id, error }
+
+self.onmessage = async (e) => {
+  const { id, file, maxDimension, quality } = e.data;
+  try {
+    const bitmap = await createImageBitmap(file, { imageOrientation: 'from-image' });
+    const scale = Math.min(1, maxDimension / Math.max(bitmap.width, bitmap.height));
+    const width = Math.round(bitmap.width * scale);
+    const height = Math.round(bitmap.height * scale);
+
+    const canvas = new OffscreenCanvas(width, height);
+    const ctx = canvas.getContext('2d');
+    ctx.drawImage(bitmap, 0, 0, width, height);
+    bitmap.close();
+
+    const blob = await canvas.convertToBlob({ type: 'image/jpeg', quality });
+    self.postMessage({ id, blob, width, height });
+  } catch (err) {
+    self.postMessage({ id, error: String(err) });
+  }
+};
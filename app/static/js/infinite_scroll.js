@@ -0,0 +1,62 @@
+// app/static/js/infinite_scroll.js
+// Loads further pages of a keyset-paginated JSON list when a sentinel element
+// scrolls into view. The server renders the first page and the first cursor.
+//
+// const scroller = InfiniteScroll.attach({
+//   url: '/counter/view/12/records',     // returns { records: [...], next_cursor }
+//   cursor: '<next_cursor or empty>',
+//   sentinel: document.getElementById('recordsSentinel'),
+//   render: records => { ... append rows ... },
+// });
+// scroller.done → true once the last page has been loaded
+
+const InfiniteScroll = (() => {
+  function attach({ url, cursor, sentinel, render }) {
+    const state = { done: !cursor, loading: false };
+    const button = sentinel.querySelector('button');
+
+    async function loadMore() {
+      if (state.done || state.loading) return;
+      state.loading = true;
+      if (button) button.disabled = true;
+      try {
+        const res = await fetch(`${url}?cursor=${encodeURIComponent(cursor)}`);
+        const data = await res.json();
+        if (!data.success) throw new Error(data.error || res.statusText);
+        render(data.records);
+        cursor = data.next_cursor;
+        state.done = !cursor;
+      } catch (err) {
+        console.warn('Failed to load more records', err);
+      } finally {
+        state.loading = false;
+        if (button) button.disabled = false;
+        if (state.done) {
+          sentinel.style.display = 'none';
+          if (observer) observer.disconnect();
+        } else if (observer) {
+          // Re-observe so a sentinel that is still on screen triggers the next page
+          observer.unobserve(sentinel);
+          observer.observe(sentinel);
+        }
+      }
+    }
+
+    // "Load more" stays as a fallback (no IntersectionObserver, or a failed fetch)
+    if (button) button.addEventListener('click', loadMore);
+
+    const observer = !state.done && 'IntersectionObserver' in window
+      ? new IntersectionObserver(entries => {
+          if (entries.some(e => e.isIntersecting)) loadMore();
+        }, { rootMargin: '400px' })
+      : null;
+
+    if (state.done) sentinel.style.display = 'none';
+    else if (observer) observer.observe(sentinel);
+
+    state.loadMore = loadMore;
+    return state;
+  }
+
+  return { attach };
+})();
@@ -0,0 +1,94 @@
+// app/static/js/lazy_images.js
+// Signs scan record image URLs on demand: thumbnails are signed in one batch
+// request (POST /storage/sign) when they scroll into view.
+//
+// <script src=".../lazy_images.js" data-sign-url="{{ url_for('storage.sign_urls') }}"></script>
+// <img class="record-thumb" data-record-id="12" data-src="<already signed url or empty>">
+
+const LazyImages = (() => {
+  const signUrl = document.currentScript.dataset.signUrl;
+  const BATCH_DELAY_MS = 50;
+  const BATCH_MAX = 100;
+
+  const urls = new Map();      // recordId → Promise<url | null>
+  let waiting = new Map();     // recordId → resolve, for the next batch
+  let timer = null;
+
+  async function flush() {
+    timer = null;
+    const batch = waiting;
+    waiting = new Map();
+    const ids = Array.from(batch.keys());
+
+    for (let i = 0; i < ids.length; i += BATCH_MAX) {
+      const chunk = ids.slice(i, i + BATCH_MAX);
+      let signed = {};
+      try {
+        const res = await fetch(signUrl, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ record_ids: chunk })
+        });
+        const data = await res.json();
+        signed = data.urls || {};
+      } catch (err) {
+        console.warn('Failed to sign image URLs', err);
+      }
+      chunk.forEach(id => {
+        const url = signed[id] || null;
+        if (!url) urls.delete(id);   // allow a retry later (e.g. image still uploading)
+        batch.get(id)(url);
+      });
+    }
+  }
+
+  function urlFor(recordId) {
+    const id = String(recordId);
+    if (!urls.has(id)) {
+      urls.set(id, new Promise(resolve => waiting.set(id, resolve)));
+      if (!timer) timer = setTimeout(flush, BATCH_DELAY_MS);
+    }
+    return urls.get(id);
+  }
+
+  function load(img) {
+    if (img.dataset.src) {
+      img.src = img.dataset.src;
+      img.style.visibility = 'visible';
+      return;
+    }
+    urlFor(img.dataset.recordId).then(url => {
+      if (url) {
+        img.src = url;
+        img.style.visibility = 'visible';
+      }
+    });
+  }
+
+  const observer = 'IntersectionObserver' in window
+    ? new IntersectionObserver(entries => {
+        entries.forEach(entry => {
+          if (!entry.isIntersecting) return;
+          observer.unobserve(entry.target);
+          load(entry.target);
+        });
+      }, { rootMargin: '200px' })
+    : null;
+
+  function observe(root = document) {
+    root.querySelectorAll('img.record-thumb:not([data-observed])').forEach(img => {
+      img.dataset.observed = '1';
+      observer ? observer.observe(img) : load(img);
+    });
+  }
+
+  // Resolve a modal image: use the URL rendered with the page, else sign it now
+  async function resolve(imageUrl, recordId) {
+    if (imageUrl && imageUrl !== 'None') return imageUrl;
+    if (!recordId) return null;
+    return urlFor(recordId);
+  }
+
+  document.addEventListener('DOMContentLoaded', () => observe());
+  return { urlFor, observe, resolve };
+})();
@@ -0,0 +1,169 @@
+// app/static/js/scan_queue.js
+// On-device queue of scans for the counter page, shared with the service
+// worker (scan_sync_sw.js). A confirmed scan is written to IndexedDB at once
+// and synced later, in batches, through POST /counter/save_scan_records.
+// Each scan carries a client_id, so a batch retried after a dropped
+// connection is not counted twice, and the user_id of the counter who scanned
+// it: the queue belongs to the device, not the session, and the server refuses
+// scans sent under anyone else's login. They stay queued (held through a
+// sign-out) until their counter is signed in again.
+//
+// await ScanQueue.add({ user_id, line_id, barcode_1, barcode_2, barcode_3, upload_token, image });
+// const result = await ScanQueue.flush({ ingestUrl, stageUrl, batchMax, userId });
+// result.lines[lineId] → { scanned_count, remaining, records: [...], rejected: [...] }
+// result.held → scans left for another user (flush without userId, e.g. the service worker)
+
+const ScanQueue = (() => {
+  const DB_NAME = 'dsv-scan-queue';
+  const DB_VERSION = 1;
+  const supported = typeof indexedDB !== 'undefined';
+  let dbPromise = null;
+
+  function open() {
+    if (!dbPromise) {
+      dbPromise = new Promise((resolve, reject) => {
+        const req = indexedDB.open(DB_NAME, DB_VERSION);
+        req.onupgradeneeded = () => {
+          const db = req.result;
+          // Queued / rejected scans, by client_id
+          db.createObjectStore('scans', { keyPath: 'client_id' }).createIndex('line_id', 'line_id');
+          // Barcodes already on the server, per line: { line_id, barcodes: [...], last_id }
+          db.createObjectStore('seen', { keyPath: 'line_id' });
+        };
+        req.onsuccess = () => resolve(req.result);
+        req.onerror = () => reject(req.error);
+      });
+    }
+    return dbPromise;
+  }
+
+  async function run(storeName, mode, fn) {
+    const db = await open();
+    return new Promise((resolve, reject) => {
+      const tx = db.transaction(storeName, mode);
+      const req = fn(tx.objectStore(storeName));
+      tx.oncomplete = () => resolve(req && req.result);
+      tx.onerror = () => reject(tx.error);
+    });
+  }
+
+  function newClientId() {
+    if (self.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+  }
+
+  function add(scan) {
+    const item = {
+      client_id: newClientId(),
+      scanned_on: new Date().toISOString(),
+      status: 'queued',
+      error: null,
+      ...scan,
+    };
+    return run('scans', 'readwrite', store => store.put(item)).then(() => item);
+  }
+
+  const list = (lineId, userId) => run('scans', 'readonly', store => store.index('line_id').getAll(lineId))
+    .then(items => items.filter(item => item.user_id === userId));
+  const all = () => run('scans', 'readonly', store => store.getAll());
+  const put = (item) => run('scans', 'readwrite', store => store.put(item));
+  const remove = (clientId) => run('scans', 'readwrite', store => store.delete(clientId));
+
+  const loadSeen = (lineId) => run('seen', 'readonly', store => store.get(lineId));
+  const saveSeen = (seen) => run('seen', 'readwrite', store => store.put(seen));
+
+  // One flush at a time across the page and the service worker
+  function exclusive(fn) {
+    if (self.navigator && navigator.locks) return navigator.locks.request('dsv-scan-queue-flush', fn);
+    return fn();
+  }
+
+  // Both return false when the signed-in user isn't the one who queued the scans
+  async function stageImage(item, stageUrl) {
+    const form = new FormData();
+    form.append('user_id', item.user_id);
+    form.append('image', item.image, item.image.name || 'scan.jpg');
+    const res = await fetch(stageUrl, { method: 'POST', body: form });
+    const data = await res.json();
+    if (data.wrong_user) return false;
+    if (!data.success) throw new Error(data.error || res.statusText);
+    item.upload_token = data.upload_token;
+    await put(item);
+    return true;
+  }
+
+  async function sendBatch(lineId, userId, items, ingestUrl, summary) {
+    const res = await fetch(ingestUrl, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        line_id: lineId,
+        user_id: userId,
+        records: items.map(({ client_id, barcode_1, barcode_2, barcode_3, upload_token, scanned_on }) => (
+          { client_id, barcode_1, barcode_2, barcode_3, upload_token, scanned_on }
+        )),
+      }),
+    });
+    const data = await res.json();
+    if (data.wrong_user) return false;
+    if (!data.success) throw new Error(data.error || res.statusText);
+
+    const byId = new Map(items.map(item => [item.client_id, item]));
+    for (const result of data.results) {
+      const item = byId.get(result.client_id);
+      if (result.status !== 'rejected') {
+        await remove(item.client_id);
+        summary.records.push(result.record);
+      } else if (result.upload_expired && item.image) {
+        // Staged copy expired while offline: stage the photo again next time
+        item.upload_token = null;
+        await put(item);
+      } else {
+        item.status = 'rejected';
+        item.error = result.error;
+        await put(item);
+        summary.rejected.push(item);
+      }
+    }
+    summary.scanned_count = data.scanned_count;
+    summary.remaining = data.remaining;
+    return true;
+  }
+
+  // Send every queued scan of `userId` (default: every user's, each batch
+  // checked by the server). Stops at the first network or server error; the
+  // rest stays queued for the next attempt.
+  function flush({ ingestUrl, stageUrl, batchMax = 500, userId }) {
+    return exclusive(async () => {
+      const result = { lines: {}, held: 0, error: null };
+      const queued = (await all()).filter(item =>
+        item.status === 'queued' && (userId === undefined || item.user_id === userId));
+      const groups = new Map();  // one per user and line
+      queued.forEach(item => {
+        const key = `${item.user_id}:${item.line_id}`;
+        groups.set(key, [...(groups.get(key) || []), item]);
+      });
+
+      try {
+        for (const items of groups.values()) {
+          const { line_id: lineId, user_id: owner } = items[0];
+          const summary = { records: [], rejected: [] };
+          let sent = true;
+          for (const item of items) {
+            if (sent && item.image && !item.upload_token) sent = await stageImage(item, stageUrl);
+          }
+          for (let i = 0; sent && i < items.length; i += batchMax) {
+            sent = await sendBatch(lineId, owner, items.slice(i, i + batchMax), ingestUrl, summary);
+          }
+          if (sent) result.lines[lineId] = summary;
+          else result.held += items.length;
+        }
+      } catch (err) {
+        result.error = err.message;
+      }
+      return result;
+    });
+  }
+
+  return { supported, add, list, put, remove, loadSeen, saveSeen, flush };
+})();
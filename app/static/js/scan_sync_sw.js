@@ -0,0 +1,72 @@
+// app/static/js/scan_sync_sw.js
+// Service worker for the counter pages, served as /counter/sw.js so its scope
+// is /counter/. It syncs the on-device scan queue (scan_queue.js) when the
+// connection comes back, even if the page has been closed (Background Sync),
+// and keeps the last copy of each scan page and its scripts for offline reloads.
+//
+// Registered with the endpoints in its query string:
+//   /counter/sw.js?queue=<scan_queue.js>&ingest=<save_scan_records>&stage=<stage_image>&batch=500
+
+const params = new URL(self.location).searchParams;
+importScripts(params.get('queue'));
+
+const CONFIG = {
+  ingestUrl: params.get('ingest'),
+  stageUrl: params.get('stage'),
+  batchMax: Number(params.get('batch')) || 500,
+};
+const CACHE = 'dsv-counter-v1';
+const SYNC_TAG = 'dsv-scan-queue';
+
+self.addEventListener('install', () => self.skipWaiting());
+self.addEventListener('activate', (event) => event.waitUntil(self.clients.claim()));
+
+async function syncQueue() {
+  const result = await ScanQueue.flush(CONFIG);
+  const clients = await self.clients.matchAll({ type: 'window' });
+  clients.forEach(client => client.postMessage({ type: 'scan-queue-synced', result }));
+  // Rejecting makes the browser retry the sync later
+  if (result.error) throw new Error(result.error);
+}
+
+self.addEventListener('sync', (event) => {
+  if (event.tag === SYNC_TAG) event.waitUntil(syncQueue());
+});
+
+self.addEventListener('message', (event) => {
+  if (event.data && event.data.type === 'flush') event.waitUntil(syncQueue().catch(() => {}));
+});
+
+// Scan pages: network first, last good copy when offline. Static scripts:
+// cached copy first, refreshed in the background.
+self.addEventListener('fetch', (event) => {
+  const request = event.request;
+  if (request.method !== 'GET') return;
+  const url = new URL(request.url);
+  if (url.origin !== self.location.origin) return;
+
+  if (request.mode === 'navigate' && url.pathname.startsWith('/counter/view/')) {
+    event.respondWith(
+      fetch(request)
+        .then(response => {
+          if (response.ok && !response.redirected) {
+            const copy = response.clone();
+            caches.open(CACHE).then(cache => cache.put(request, copy));
+          }
+          return response;
+        })
+        .catch(() => caches.match(request).then(cached => cached || Response.error()))
+    );
+  } else if (url.pathname.startsWith('/static/js/')) {
+    event.respondWith(
+      caches.open(CACHE).then(async cache => {
+        const cached = await cache.match(request);
+        const fresh = fetch(request).then(response => {
+          if (response.ok) cache.put(request, response.clone());
+          return response;
+        }).catch(() => cached || Response.error());
+        return cached || fresh;
+      })
+    );
+  }
+});
@@ -0,0 +1,106 @@
+import json
+import logging
+from tempfile import SpooledTemporaryFile
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BufferedWSGI:
+    """
+    ASGI application serving the Flask app from an event loop.
+
+    Views stay synchronous and run on a2wsgi's thread pool (`threads` per
+    process). Each request body is read in full on the event loop first
+    (in memory up to `spool_size`, then in a temporary file), so a counter
+    uploading a photo over a slow connection holds a socket, not a thread;
+    bodies over MAX_CONTENT_LENGTH are refused before any thread is taken.
+    Responses go back through a2wsgi's send queue, also on the loop.
+
+    Handles the lifespan protocol: startup starts this process's background
+    work (start_workers), shutdown stops its decode pool.
+    """
+
+    def __init__(self, flask_app, threads=32, spool_size=1024 * 1024):
+        from a2wsgi import WSGIMiddleware
+
+        self.flask_app = flask_app
+        self.wsgi = WSGIMiddleware(flask_app, workers=threads)
+        self.max_body = flask_app.config.get("MAX_CONTENT_LENGTH")
+        self.spool_size = spool_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def _http(self, scope, receive, send):
+        with SpooledTemporaryFile(max_size=self.spool_size) as body:
+            size = 0
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return  # client went away mid-upload: no thread was ever used
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if self.max_body and size > self.max_body:
+                    await self._too_large(send, size)
+                    return
+                body.write(chunk)
+                if not message.get("more_body"):
+                    break
+            body.seek(0)
+            if not any(name == b"content-length" for name, _ in scope["headers"]):
+                # Chunked upload: now that the size is known, say so (WSGI reads CONTENT_LENGTH bytes)
+                headers = [(n, v) for n, v in scope["headers"] if n != b"transfer-encoding"]
+                scope = {**scope, "headers": headers + [(b"content-length", str(size).encode())]}
+
+            async def replay():
+                chunk = body.read(CHUNK_SIZE)
+                return {"type": "http.request", "body": chunk, "more_body": body.tell() < size}
+
+            await self.wsgi(scope, replay, send)
+
+    async def _too_large(self, send, size):
+        payload = json.dumps({
+            "success": False,
+            "error": f"Upload too large ({size // 1024} KB). Please retake the photo.",
+        }).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())],
+        })
+        await send({"type": "http.response.body", "body": payload})
+
+    async def _lifespan(self, receive, send):
+        from app import decode_engine, start_workers
+
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    start_workers(self.flask_app)
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                try:
+                    decode_engine.shutdown()
+                    self.wsgi.executor.shutdown(wait=False)
+                except Exception as e:
+                    logging.warning(f"ASGI shutdown: {e}")
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def create_asgi_app(flask_app):
+    """Wrap a Flask app for an ASGI server, sized from ASGI_THREADS and ASGI_BODY_SPOOL."""
+    return BufferedWSGI(
+        flask_app,
+        threads=flask_app.config.get("ASGI_THREADS", 32),
+        spool_size=flask_app.config.get("ASGI_BODY_SPOOL", 1024 * 1024),
+    )
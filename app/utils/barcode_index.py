@@ -0,0 +1,216 @@
+import os
+import math
+import time
+import logging
+import hashlib
+import threading
+
+from sqlalchemy import event, select, func, inspect
+from sqlalchemy.orm import Session
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings: no false negatives, false positives
+    at about `error_rate` while no more than `capacity` items are added.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(1, int(capacity))
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))  # bits
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class BarcodeIndex:
+    """
+    Per-process duplicate index in front of barcode_entry.
+
+    A Bloom filter of every stored barcode answers "definitely new" for most
+    scans without a query; only barcodes it might contain are looked up, so
+    every rejection is confirmed by the database (a record deleted by another
+    process frees its barcodes at once). The unique idx_barcode_unique index
+    stays the source of truth: another process's insert can be missing from
+    this filter, so callers treat an IntegrityError on insert as a duplicate
+    and re-check with `lookup(..., use_index=False)`.
+
+    Kept in step by a Session after_flush hook (new entries are added to the
+    filter; deleted ones stay in it and only cost a lookup); rows written with
+    bulk inserts are reported with `add()`. Until the filter has been loaded
+    from the table (`start()` warms it in a background thread), every lookup
+    goes to the DB.
+
+    Configured from Config: BARCODE_INDEX_ENABLED, BARCODE_INDEX_CAPACITY,
+    BARCODE_INDEX_ERROR_RATE.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.bloom = None
+        self.ready = False
+        self._pending = None        # barcodes added while warm() runs
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._listening = False
+        self.stats = {"skipped": 0, "db_lookups": 0, "false_positives": 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("BARCODE_INDEX_ENABLED", True)
+        self.capacity = app.config.get("BARCODE_INDEX_CAPACITY", 1_000_000)
+        self.error_rate = app.config.get("BARCODE_INDEX_ERROR_RATE", 0.01)
+        if not self._listening:
+            event.listen(Session, "after_flush", self._after_flush)
+            self._listening = True
+        app.extensions["barcode_index"] = self
+
+    # ----------------------------
+    # Warm-up
+    # ----------------------------
+    def start(self):
+        """Load the filter in a background thread (idempotent, fork-aware)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and (self.ready or (self._thread is not None and self._thread.is_alive())):
+                return
+            if self._pid != os.getpid():
+                self.ready = False  # a forked copy missed the parent's later inserts
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._warm_logged, name="barcode-index", daemon=True)
+            self._thread.start()
+
+    def _warm_logged(self, retry_interval=5):
+        try:
+            # A process can boot before its schema exists (fresh database,
+            # `python run.py` creating it after the app): wait for the table
+            while not self.warm():
+                time.sleep(retry_interval)
+                retry_interval = min(retry_interval * 2, 60)
+        except Exception as e:
+            logging.error(f"Barcode index warm-up failed, using the database only: {e}")
+
+    def warm(self, batch_size=10000):
+        """
+        Build a new filter from barcode_entry, then swap it in. Returns False
+        (and stays unloaded) while the table doesn't exist yet.
+        """
+        from app import db
+        from app.models import BarcodeEntry
+
+        started = time.perf_counter()
+        with self.app.app_context():
+            if not inspect(db.engine).has_table(BarcodeEntry.__tablename__):
+                return False
+            total = db.session.scalar(select(func.count(BarcodeEntry.id))) or 0
+            bloom = BloomFilter(max(self.capacity, 2 * total), self.error_rate)
+            pending = self._pending = []
+            result = db.session.execute(
+                select(BarcodeEntry.barcode).execution_options(yield_per=batch_size)
+            )
+            for barcode in result.scalars():
+                bloom.add(barcode)
+            db.session.remove()
+
+        with self._lock:
+            for barcode in pending:
+                bloom.add(barcode)
+            self._pending = None
+            self.bloom = bloom
+            self.ready = True
+        logging.info(f"Barcode index loaded {bloom.count} barcodes in {time.perf_counter() - started:.1f}s")
+        return True
+
+    # ----------------------------
+    # Lookups
+    # ----------------------------
+    def lookup(self, barcodes, use_index=True):
+        """
+        Existing (barcode, scan_record_id) pairs among `barcodes`, like
+        querying barcode_entry for them. With `use_index=False` (or while the
+        filter is not loaded) every barcode goes to the database.
+        """
+        from app import db
+        from app.models import BarcodeEntry
+
+        candidates = list(dict.fromkeys(barcodes))
+        if use_index and self.enabled and self.ready:
+            with self._lock:
+                maybe = [code for code in candidates if code in self.bloom]
+            self.stats["skipped"] += len(candidates) - len(maybe)
+            candidates = maybe
+        if not candidates:
+            return []
+
+        self.stats["db_lookups"] += 1
+        rows = (
+            db.session.query(BarcodeEntry.barcode, BarcodeEntry.scan_record_id)
+            .filter(BarcodeEntry.barcode.in_(candidates))
+            .all()
+        )
+        with self._lock:
+            for code, _ in rows:
+                if self.bloom is not None and code not in self.bloom:
+                    self.bloom.add(code)  # stored by another process since the filter was loaded
+        self.stats["false_positives"] += len(candidates) - len(rows)
+        return [tuple(row) for row in rows]
+
+    def add(self, barcodes):
+        """Record barcodes inserted outside the ORM unit of work (bulk inserts)."""
+        with self._lock:
+            for code in barcodes:
+                if self.bloom is not None:
+                    self.bloom.add(code)
+                if self._pending is not None:
+                    self._pending.append(code)
+            grow = self.ready and self.bloom.count > self.bloom.capacity
+        if grow:
+            # Past capacity the false positive rate climbs: rebuild a bigger filter
+            self.ready = False
+            self._thread = None
+            self.start()
+
+    def _after_flush(self, session, flush_context):
+        from app.models import BarcodeEntry
+
+        added = [obj.barcode for obj in session.new if isinstance(obj, BarcodeEntry)]
+        if added:
+            self.add(added)
+
+
+def duplicate_error(barcodes, existing):
+    """
+    The save_scan_record error for `barcodes` given their existing
+    (barcode, scan_record_id) pairs, or None when they can be saved.
+    """
+    by_record = {}
+    for code, record_id in existing:
+        if code in barcodes:
+            by_record.setdefault(record_id, []).append(code)
+    for record_id, codes in by_record.items():
+        if len(codes) >= 2:
+            return f"The barcodes {codes} already exist together under Scan Record ID {record_id}."
+    for record_id, codes in by_record.items():
+        return f"The barcode {codes[0]} already exists under Scan Record ID {record_id}."
+    return None
@@ -0,0 +1,194 @@
+import io
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+NO_BARCODES = "No barcodes detected"  # process_barcode_image's message for a clean miss
+
+
+def image_digest(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def perceptual_hash(image_bytes, size=16):
+    """
+    Difference hash (size x size bits) of the downscaled grayscale frame:
+    re-encoded or resized copies of a photo land a few bits apart, different
+    photos about half the bits apart. Uses JPEG draft mode, so only a 1/8
+    scale image is decoded.
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(image_bytes))
+    image.draft("L", (size, size))
+    pixels = image.convert("L").resize((size + 1, size), Image.BILINEAR).tobytes()
+    bits = 0
+    for y in range(size):
+        row = pixels[y * (size + 1):(y + 1) * (size + 1)]
+        for x in range(size):
+            bits = bits << 1 | (row[x] < row[x + 1])
+    return bits
+
+
+def _cacheable(result):
+    """Successful decodes, and misses that ran every stage within its budget (a retry would miss again)."""
+    if result.get("success"):
+        return True
+    timings = result.get("timings") or []
+    return result.get("message") == NO_BARCODES and not any(t.get("over_budget") for t in timings)
+
+
+class DecodeCache:
+    """
+    Decode results for recently submitted photos, in front of decode_engine.
+
+    Exact repeats are found by the sha256 of the upload and get the earlier
+    result, hit or miss. Every other photo is decoded. A perceptual hash
+    within DECODE_CACHE_MAX_DISTANCE bits of one of the same counter's
+    recent photos only marks the new result with the earlier photo's digest
+    (`result["matched"]`, for the duplicate-photo warning): labels with the
+    same layout hash alike even when their barcodes differ, so a similar
+    photo never gets the earlier photo's codes. Entries expire after
+    DECODE_CACHE_TTL and the least recently used go first past
+    DECODE_CACHE_SIZE.
+
+    `stats` counts exact hits, similar matches and misses for this process.
+
+    Configured from Config: DECODE_CACHE_ENABLED, DECODE_CACHE_SIZE,
+    DECODE_CACHE_TTL, DECODE_CACHE_MAX_DISTANCE (0 = no similarity check).
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self._entries = OrderedDict()  # sha256 → {phash, user_id, result, stored_at}
+        self._lock = threading.Lock()
+        self.stats = {"exact": 0, "similar": 0, "misses": 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get("DECODE_CACHE_ENABLED", True)
+        self.size = app.config.get("DECODE_CACHE_SIZE", 1000)
+        self.ttl = app.config.get("DECODE_CACHE_TTL", 600)
+        self.max_distance = app.config.get("DECODE_CACHE_MAX_DISTANCE", 24)
+        app.extensions["decode_cache"] = self
+
+    # ----------------------------
+    # Decoding through the cache
+    # ----------------------------
+    def decode(self, image_bytes, user_id, decode):
+        """
+        The decode result for one photo, from the cache or from `decode(image_bytes)`.
+        Returns (result, digest, hit) with hit "exact" or None; a decoded
+        photo close to an earlier one has that photo's digest in `result["matched"]`.
+        """
+        return self.decode_many([image_bytes], user_id, lambda images: [decode(images[0])])[0]
+
+    def decode_many(self, images, user_id, decode_many):
+        """decode() for several photos; the misses go to `decode_many(images)` in one call."""
+        lookups = [self._lookup(image_bytes, user_id) for image_bytes in images]
+        misses = [i for i, (_, _, entry, _) in enumerate(lookups) if entry is None]
+        decoded = dict(zip(misses, decode_many([images[i] for i in misses]))) if misses else {}
+
+        out = []
+        for i, (digest, phash, entry, matched) in enumerate(lookups):
+            if entry is None:
+                result = decoded[i]
+                if not result.get("retry"):  # a timeout or crash isn't this photo's result
+                    self._store(digest, phash, user_id, result)
+                if matched is not None:
+                    result = {**result, "matched": matched}
+                out.append((result, digest, None))
+            else:
+                started, cached = entry
+                result = {
+                    **cached["result"],
+                    "timings": [{"stage": "cache", "ms": round((time.perf_counter() - started) * 1000, 1), "hit": "exact"}],
+                }
+                out.append((result, digest, "exact"))
+        return out
+
+    def _lookup(self, image_bytes, user_id):
+        """(digest, phash, (started, entry) on an exact hit or None, digest of a similar earlier photo or None)"""
+        started = time.perf_counter()
+        digest = image_digest(image_bytes)
+        if not self.enabled:
+            return digest, None, None, None
+
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(digest)
+            if entry is not None and now - entry["stored_at"] > self.ttl:
+                del self._entries[digest]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self.stats["exact"] += 1
+                return digest, entry["phash"], (started, entry), None
+
+        phash = None
+        if self.max_distance > 0:
+            try:
+                phash = perceptual_hash(image_bytes)
+            except Exception as e:
+                logging.debug(f"No perceptual hash for upload {digest[:12]}: {e}")
+
+        with self._lock:
+            self.stats["misses"] += 1
+            if phash is None:
+                return digest, None, None, None
+            best = min(
+                (
+                    entry for entry in self._entries.values()
+                    if entry["user_id"] == user_id
+                    and entry["phash"] is not None
+                    and now - entry["stored_at"] <= self.ttl
+                ),
+                key=lambda entry: (entry["phash"] ^ phash).bit_count(),
+                default=None,
+            )
+            if best is None or (best["phash"] ^ phash).bit_count() > self.max_distance:
+                return digest, phash, None, None
+            self.stats["similar"] += 1
+            return digest, phash, None, best["digest"]
+
+    def _store(self, digest, phash, user_id, result):
+        if not self.enabled or not _cacheable(result):
+            return
+        with self._lock:
+            self._entries[digest] = {
+                "digest": digest,
+                "phash": phash,
+                "user_id": user_id,
+                "result": result,
+                "stored_at": time.monotonic(),
+            }
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def _expire(self, now):
+        # Entries are in use order, not age order: drop expired ones from the cold end
+        while self._entries:
+            digest, entry = next(iter(self._entries.items()))
+            if now - entry["stored_at"] <= self.ttl:
+                break
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def attached_records(digests):
+    """{sha256: ScanRecord} for the digests already attached to a scan record (one query)."""
+    from app.models import ScanRecord
+
+    digests = {d for d in digests if d}
+    if not digests:
+        return {}
+    records = ScanRecord.query.filter(ScanRecord.image_hash.in_(digests)).order_by(ScanRecord.id.desc())
+    return {record.image_hash: record for record in records}
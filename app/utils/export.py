@@ -0,0 +1,164 @@
+import io
+import csv
+import tempfile
+
+from sqlalchemy.orm import aliased
+
+from app import db
+from app.models import User, Location, Warehouse, ScanLine, ScanRecord
+
+EXPORT_HEADERS = [
+    "Location",
+    "Warehouse",
+    "Line Code",
+    "Status",
+    "Counter (User)",
+    "Partner (Team Leader)",
+    "Barcode 1",
+    "Barcode 2",
+    "Barcode 3",
+    "Created Date Time",
+]
+
+
+def export_query(location_ids=None, warehouse_ids=None, statuses=None, batch_size=1000):
+    """
+    One joined query for the export rows (no per-record lazy loads), fetched
+    in batches of `batch_size` through a server-side cursor where supported.
+    """
+    counter, team_leader = aliased(User), aliased(User)
+    query = (
+        db.session.query(
+            ScanRecord.id,
+            Location.name,
+            Warehouse.warehouse_name,
+            ScanLine.line_code,
+            ScanLine.status,
+            counter.username,
+            team_leader.username,
+            ScanRecord.barcode_1,
+            ScanRecord.barcode_2,
+            ScanRecord.barcode_3,
+            ScanRecord.created_on,
+        )
+        .select_from(ScanRecord)
+        .join(ScanLine, ScanRecord.scan_line_id == ScanLine.id)
+        .outerjoin(Location, ScanLine.location_id == Location.id)
+        .outerjoin(Warehouse, ScanLine.warehouse_id == Warehouse.id)
+        .outerjoin(counter, ScanRecord.counter_user_id == counter.id)
+        .outerjoin(team_leader, ScanLine.team_leader_user_id == team_leader.id)
+    )
+
+    if location_ids:
+        query = query.filter(ScanLine.location_id.in_(location_ids))
+    if warehouse_ids:
+        query = query.filter(ScanLine.warehouse_id.in_(warehouse_ids))
+    if statuses:
+        query = query.filter(ScanLine.status.in_(statuses))
+
+    return query.order_by(ScanRecord.id).execution_options(yield_per=batch_size)
+
+
+def export_batches(query, batch_size=1000):
+    """
+    The rows of `export_query()` as lists of up to `batch_size`, read by
+    keyset on the record id. Each batch is a separate short query, so no
+    cursor stays open between batches and the caller may commit in between.
+    """
+    last_id = 0
+    while True:
+        batch = query.filter(ScanRecord.id > last_id).limit(batch_size).all()
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1][0]
+
+
+def export_rows(query):
+    """Export rows as lists of strings, one at a time."""
+    for row in query:
+        _, *values, created_on = row
+        yield [value or "" for value in values] + [created_on.strftime("%Y-%m-%d %H:%M:%S") if created_on else ""]
+
+
+def stream_csv(rows, chunk_rows=500):
+    """Yield the CSV export (header + rows) in chunks of about `chunk_rows` rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADERS)
+
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % chunk_rows == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def export_summary(username, generated_on, location_ids=None, warehouse_ids=None, statuses=None):
+    """The summary block written above the XLSX headers."""
+    return [
+        "Export Summary",
+        f"Generated by: {username}",
+        f"Generated on: {generated_on.strftime('%Y-%m-%d %H:%M:%S')}",
+        f"Selected Locations: {', '.join(location_ids) if location_ids else 'All'}",
+        f"Selected Warehouses: {', '.join(warehouse_ids) if warehouse_ids else 'All'}",
+        f"Statuses: {', '.join(statuses) if statuses else 'All'}",
+        "",
+        "Scan Records:",
+    ]
+
+
+def write_csv(rows, output):
+    """Write the CSV export (header + rows) to the binary file `output`."""
+    for chunk in stream_csv(rows):
+        output.write(chunk)
+
+
+def write_xlsx(rows, summary, title="Exported Scan Records", on_progress=None, progress_every=1000):
+    """
+    Write the XLSX export to an anonymous temp file and return it, rewound.
+
+    openpyxl's write-only mode keeps memory flat, but it writes column widths
+    before the first row. So rows are first spooled to a temp CSV while the
+    running maximum width of each column is tracked, then replayed into the
+    workbook once the widths are known. The database is read only once.
+
+    `on_progress(n)` is called every `progress_every` rows added to the
+    workbook (the slow part) with the number of rows written so far.
+    """
+    # Imported here: openpyxl (and the numpy/PIL it pulls in) only loads for XLSX exports
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    widths = [len(header) for header in EXPORT_HEADERS]
+    with tempfile.TemporaryFile(mode="w+", newline="", encoding="utf-8") as spool:
+        writer = csv.writer(spool)
+        for row in rows:
+            writer.writerow(row)
+            for i, value in enumerate(row):
+                if len(value) > widths[i]:
+                    widths[i] = len(value)
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title)
+        for i, width in enumerate(widths):
+            ws.column_dimensions[get_column_letter(i + 1)].width = width + 2
+
+        for line in summary:
+            ws.append([line] if line else [])
+        ws.append([])
+        ws.append(EXPORT_HEADERS)
+
+        spool.seek(0)
+        for i, row in enumerate(csv.reader(spool), 1):
+            ws.append(row)
+            if on_progress and i % progress_every == 0:
+                on_progress(i)
+
+        output = tempfile.TemporaryFile()
+        wb.save(output)
+    output.seek(0)
+    return output
+
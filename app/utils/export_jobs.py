@@ -0,0 +1,306 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import update
+
+from app.constants.status import ExportJobStatus
+
+
+def normalize_filters(location_ids=None, warehouse_ids=None, statuses=None):
+    """Filter lists in a canonical order, so equal filter sets compare equal."""
+    return {
+        "location_ids": sorted(set(location_ids or []), key=str),
+        "warehouse_ids": sorted(set(warehouse_ids or []), key=str),
+        "statuses": sorted(set(statuses or [])),
+    }
+
+
+def fingerprint(filters, export_format, user_id):
+    # Per user: the file's summary names who requested it
+    payload = json.dumps({"filters": filters, "format": export_format, "user": user_id}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ExportJobs:
+    """
+    Background scan record exports, queued in the export_jobs table.
+
+    `enqueue()` records a job and returns at once; daemon threads in each web
+    process (or a dedicated `flask exports work` process) claim queued jobs
+    with a conditional UPDATE, write the file, and upload it to the storage
+    backend under exports/. Progress is committed as rows are written, so
+    the status endpoint sees it from any process.
+
+    A request whose user, filters and format match a job queued, running, or
+    finished within EXPORT_CACHE_TTL gets that job instead of a new one.
+    Finished jobs and their artifacts are removed after EXPORT_RETENTION.
+    """
+
+    SWEEP_INTERVAL = 600  # seconds between retention sweeps per worker
+
+    def __init__(self, app=None):
+        self.app = None
+        self._threads = []
+        self._pid = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._last_sweep = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.threads = app.config.get("EXPORT_WORKER_THREADS", 1)
+        self.batch_size = app.config.get("EXPORT_BATCH_SIZE", 1000)
+        self.cache_ttl = app.config.get("EXPORT_CACHE_TTL", 300)
+        self.retention = app.config.get("EXPORT_RETENTION", 86400)
+        self.poll_interval = app.config.get("EXPORT_POLL_INTERVAL", 5)
+        self.claim_timeout = app.config.get("EXPORT_CLAIM_TIMEOUT", 600)
+        app.cli.add_command(exports_cli)
+        app.extensions["export_jobs"] = self
+
+    # ----------------------------
+    # Enqueue
+    # ----------------------------
+    def enqueue(self, user, export_format, location_ids=None, warehouse_ids=None, statuses=None):
+        """
+        Queue an export for these filters. Returns (job, created); `created`
+        is False when an identical recent job of this user was reused.
+        """
+        from app import db
+        from app.models import ExportJob
+
+        filters = normalize_filters(location_ids, warehouse_ids, statuses)
+        key = fingerprint(filters, export_format, user.id)
+        now = datetime.utcnow()
+
+        job = (
+            ExportJob.query.filter(
+                ExportJob.fingerprint == key,
+                (ExportJob.status.in_([ExportJobStatus.QUEUED, ExportJobStatus.RUNNING]))
+                | ((ExportJob.status == ExportJobStatus.DONE)
+                   & (ExportJob.finished_on >= now - timedelta(seconds=self.cache_ttl))),
+            )
+            .order_by(ExportJob.created_on.desc())
+            .first()
+        )
+        if job is not None:
+            return job, False
+
+        job = ExportJob(
+            fingerprint=key,
+            export_format=export_format,
+            filters=json.dumps(filters),
+            status=ExportJobStatus.QUEUED,
+            requested_by_id=user.id,
+            created_on=now,
+            updated_on=now,
+        )
+        db.session.add(job)
+        db.session.commit()
+        self._wakeup.set()
+        return job, True
+
+    # ----------------------------
+    # Worker
+    # ----------------------------
+    def start(self):
+        """Start the worker threads for the current process (idempotent, fork-aware)."""
+        with self._lock:
+            if self._pid == os.getpid() and all(t.is_alive() for t in self._threads):
+                return
+            self._pid = os.getpid()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"export-jobs-{i}", daemon=True)
+                for i in range(max(1, self.threads))
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_pending()
+            except Exception as e:
+                logging.error(f"Export worker error: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def run_pending(self, now=None):
+        """Run queued jobs until none are left. Returns the number of jobs run."""
+        from app import db
+
+        with self.app.app_context():
+            now = now or datetime.utcnow()
+            self._recover_stale_claims(now)
+            if time.monotonic() - self._last_sweep > self.SWEEP_INTERVAL:
+                self._last_sweep = time.monotonic()
+                self.sweep(now)
+
+            ran = 0
+            while True:
+                job_id = self._claim_next()
+                if job_id is None:
+                    break
+                ran += 1
+                self._process(job_id)
+                db.session.remove()
+            return ran
+
+    def _claim_next(self):
+        from app import db
+        from app.models import ExportJob
+
+        while True:
+            job_id = (
+                db.session.query(ExportJob.id)
+                .filter(ExportJob.status == ExportJobStatus.QUEUED)
+                .order_by(ExportJob.id)
+                .limit(1)
+                .scalar()
+            )
+            if job_id is None:
+                db.session.rollback()
+                return None
+
+            # Only one worker's UPDATE can move the job out of QUEUED
+            claimed = db.session.execute(
+                update(ExportJob)
+                .where(ExportJob.id == job_id, ExportJob.status == ExportJobStatus.QUEUED)
+                .values(status=ExportJobStatus.RUNNING, rows_done=0, updated_on=datetime.utcnow())
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return job_id
+
+    def _process(self, job_id):
+        from app import db
+        from app.models import ExportJob
+        from app.utils.export import (
+            export_query, export_batches, export_rows, export_summary, write_csv, write_xlsx,
+        )
+        from app.utils.storage import get_storage
+
+        job = db.session.get(ExportJob, job_id)
+        if job is None:
+            return
+        filters = json.loads(job.filters)
+        export_format = job.export_format
+        summary = export_summary(
+            job.requested_by.username if job.requested_by else "",
+            datetime.now(),
+            filters["location_ids"],
+            filters["warehouse_ids"],
+            filters["statuses"],
+        )
+
+        try:
+            query = export_query(
+                filters["location_ids"], filters["warehouse_ids"], filters["statuses"], self.batch_size
+            )
+            self._update(job_id, rows_total=query.order_by(None).count())
+
+            # Heartbeat after every batch read, whatever the format: an XLSX
+            # export reads all its rows before the workbook reports progress
+            def rows():
+                done = 0
+                for batch in export_batches(query, self.batch_size):
+                    yield from export_rows(batch)
+                    done += len(batch)
+                    if export_format == "csv":
+                        self._update(job_id, rows_done=done)
+                    else:
+                        self._update(job_id)
+
+            if export_format == "csv":
+                output = tempfile.TemporaryFile()
+                write_csv(rows(), output)
+                output.seek(0)
+            else:
+                output = write_xlsx(
+                    rows(),
+                    summary,
+                    on_progress=lambda n: self._update(job_id, rows_done=n),
+                    progress_every=self.batch_size,
+                )
+
+            self._update(job_id)  # the file is written; the upload may take a while
+            key = f"exports/DSV_Export_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{job_id}.{export_format}"
+            with output:
+                get_storage(self.app).upload(output, key)
+        except Exception as e:
+            logging.error(f"Export job {job_id} failed: {e}")
+            db.session.rollback()
+            self._update(job_id, status=ExportJobStatus.FAILED, error=str(e), finished_on=datetime.utcnow())
+            return
+
+        self._update(job_id, status=ExportJobStatus.DONE, artifact_key=key, finished_on=datetime.utcnow())
+
+    def _update(self, job_id, **values):
+        """Commit job fields plus the heartbeat. Callers hold no open cursor."""
+        from app import db
+        from app.models import ExportJob
+
+        db.session.execute(
+            update(ExportJob).where(ExportJob.id == job_id).values(updated_on=datetime.utcnow(), **values)
+        )
+        db.session.commit()
+
+    def _recover_stale_claims(self, now):
+        """Requeue jobs whose worker stopped beating (process died mid-export)."""
+        from app import db
+        from app.models import ExportJob
+
+        requeued = db.session.execute(
+            update(ExportJob)
+            .where(
+                ExportJob.status == ExportJobStatus.RUNNING,
+                ExportJob.updated_on < now - timedelta(seconds=self.claim_timeout),
+            )
+            .values(status=ExportJobStatus.QUEUED, rows_done=0, updated_on=now)
+        ).rowcount
+        db.session.commit()
+        if requeued:
+            logging.warning(f"Requeued {requeued} stalled export job(s)")
+
+    def sweep(self, now=None):
+        """Delete finished jobs older than EXPORT_RETENTION and their artifacts."""
+        from app import db
+        from app.models import ExportJob
+        from app.utils.storage import get_storage
+
+        now = now or datetime.utcnow()
+        expired = ExportJob.query.filter(
+            ExportJob.status.in_(ExportJobStatus.FINISHED_STATUSES),
+            ExportJob.finished_on < now - timedelta(seconds=self.retention),
+        ).all()
+        for job in expired:
+            if job.artifact_key and not get_storage(self.app).delete(job.artifact_key):
+                continue  # keep the row so the next sweep retries the delete
+            db.session.delete(job)
+        db.session.commit()
+        return len(expired)
+
+
+exports_cli = AppGroup("exports", help="Background scan record exports.")
+
+
+@exports_cli.command("work")
+@click.option("--once", is_flag=True, help="Run the queued jobs, then exit.")
+def work_command(once):
+    """Process export jobs in this process (e.g. with EXPORT_WORKER_ENABLED=0 on the web dynos)."""
+    from flask import current_app
+
+    jobs = current_app.extensions["export_jobs"]
+    if once:
+        click.echo(f"Ran {jobs.run_pending()} export job(s).")
+        return
+    jobs._run()
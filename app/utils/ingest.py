@@ -0,0 +1,212 @@
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload
+
+from app import db, barcode_index
+from app.constants.status import ImageStatus
+from app.models import ScanRecord
+from app.utils.pagination import scan_record_dict
+from app.utils.rollups import TRACKED_FIELDS, apply_deltas, rollup_key
+from app.utils.scan_writes import count_scans, insert_barcode_entries
+from app.utils.upload_staging import claim_upload, unclaim_upload
+
+CLIENT_ID_MAX = 64
+
+# Per-item outcomes
+ACCEPTED = "accepted"
+REPLAYED = "replayed"   # client_id ingested by an earlier request: nothing written
+REJECTED = "rejected"
+
+
+def _barcodes(item):
+    return [b for b in ((item.get(f"barcode_{i}") or "").strip() for i in (1, 2, 3)) if b]
+
+
+def _scanned_on(value, now):
+    """The client's capture time (ISO 8601) as naive UTC, or `now` if missing, invalid or in the future."""
+    if not value:
+        return now
+    try:
+        scanned = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return now
+    if scanned.tzinfo is not None:
+        scanned = scanned.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(scanned, now)
+
+
+def ingest_scan_records(scan_line, user, items, use_index=True):
+    """
+    Insert a batch of scans for `scan_line` in one transaction.
+
+    Each item is {client_id, barcode_1..3, upload_token?, scanned_on?}. The
+    same duplicate rules as save_scan_record apply, checked with a single
+    barcode_index lookup for the whole batch (plus the barcodes accepted
+    earlier in the same batch); `use_index=False` checks every barcode
+    against the database. Items whose client_id was already ingested
+    are replayed: the stored record is returned and nothing is written.
+
+    Returns (results, uploads): one result dict per item, in order (records
+    already serialized with scan_record_dict), and
+    (staged_path, storage_key, record_id, upload_token) for each staged image
+    to hand to the storage queue once the caller has committed. The caller
+    commits. DuplicateBarcode (or an IntegrityError on commit) means a
+    concurrent request won a race and the whole batch can simply be retried.
+    Staged images are claimed here (claim_upload) and handed back if this
+    raises; if the commit fails, the caller unclaims the tokens in `uploads`.
+    """
+    claimed = []
+    try:
+        return _ingest(scan_line, user, items, use_index, claimed)
+    except Exception:
+        for upload_token in claimed:
+            unclaim_upload(upload_token)
+        raise
+
+
+def _ingest(scan_line, user, items, use_index, claimed):
+    now = datetime.utcnow()
+    stamp = str(time.time()).replace(".", "")
+    client_ids = [str(item.get("client_id") or "") for item in items]
+
+    # One query each for replays and existing barcodes. Only this counter's
+    # scans on this line are replayed; a client_id stored by anyone else is
+    # rejected (client_id is unique across all scans)
+    replays = {
+        record.client_id: record
+        for record in ScanRecord.query.options(joinedload(ScanRecord.counter_user))
+        .filter(
+            ScanRecord.client_id.in_([c for c in client_ids if c]),
+            ScanRecord.counter_user_id == user.id,
+            ScanRecord.scan_line_id == scan_line.id,
+        )
+    }
+    others = [c for c in client_ids if c and c not in replays]
+    taken = {
+        client_id
+        for (client_id,) in db.session.query(ScanRecord.client_id).filter(ScanRecord.client_id.in_(others))
+    } if others else set()
+    existing = defaultdict(list)  # barcode -> [scan_record_id]
+    all_barcodes = {b for item in items for b in _barcodes(item)}
+    for code, record_id in barcode_index.lookup(all_barcodes, use_index=use_index):
+        existing[code].append(record_id)
+
+    results, accepted, uploads = [], [], []
+    seen_client_ids, batch_barcodes = set(), {}
+    for client_id, item in zip(client_ids, items):
+        result = {"client_id": client_id}
+        results.append(result)
+
+        def reject(error, **extra):
+            result.update(status=REJECTED, error=error, **extra)
+
+        if client_id in replays:
+            result["status"] = REPLAYED
+            continue
+        if not client_id or len(client_id) > CLIENT_ID_MAX:
+            reject(f"A client_id of at most {CLIENT_ID_MAX} characters is required.")
+            continue
+        if client_id in taken:
+            reject("This client_id is already used by another scan.")
+            continue
+        if client_id in seen_client_ids:
+            reject("This client_id appears more than once in the batch.")
+            continue
+        seen_client_ids.add(client_id)
+
+        barcodes = _barcodes(item)
+        if not barcodes:
+            reject("At least one barcode is required.")
+            continue
+        if len(set(barcodes)) < len(barcodes):
+            reject("The same barcode is entered more than once.")
+            continue
+
+        matches = defaultdict(list)
+        for code in barcodes:
+            for record_id in existing.get(code, []):
+                matches[record_id].append(code)
+        together = next(((rid, codes) for rid, codes in matches.items() if len(codes) >= 2), None)
+        if together:
+            reject(f"The barcodes {together[1]} already exist together under Scan Record ID {together[0]}.")
+            continue
+        if matches:
+            record_id, codes = next(iter(matches.items()))
+            reject(f"The barcode {codes[0]} already exists under Scan Record ID {record_id}.")
+            continue
+        repeated = next((code for code in barcodes if code in batch_barcodes), None)
+        if repeated:
+            reject(f"The barcode {repeated} was already scanned in this batch ({batch_barcodes[repeated]}).")
+            continue
+
+        staged = None
+        upload_token = item.get("upload_token")
+        if upload_token:
+            staged = claim_upload(upload_token, user.id)
+            if not staged:
+                reject("The captured image has expired, please attach it again.", upload_expired=True)
+                continue
+            claimed.append(upload_token)
+
+        s3_key = f"uploads/{stamp}_{len(accepted)}_{staged[1]}" if staged else ""
+        row = dict(
+            scan_line_id=scan_line.id,
+            location_id=scan_line.location_id,
+            warehouse_id=scan_line.warehouse_id,
+            counter_user_id=user.id,
+            barcode_1=(item.get("barcode_1") or "").strip() or None,
+            barcode_2=(item.get("barcode_2") or "").strip() or None,
+            barcode_3=(item.get("barcode_3") or "").strip() or None,
+            image_path=s3_key,
+            image_status=ImageStatus.PENDING if s3_key else None,
+            image_hash=staged[2] if staged else None,
+            client_id=client_id,
+            created_on=_scanned_on(item.get("scanned_on"), now),
+        )
+        for code in barcodes:
+            batch_barcodes[code] = client_id
+        result["status"] = ACCEPTED
+        accepted.append((row, barcodes, staged, upload_token))
+
+    if accepted:
+        # Bulk INSERTs (executemany), then one SELECT for the new ids by client_id.
+        # An ORM flush would fall back to one INSERT .. RETURNING per row on SQLite.
+        db.session.execute(insert(ScanRecord), [row for row, *_ in accepted])
+        stored = {
+            record.client_id: record
+            for record in ScanRecord.query.options(joinedload(ScanRecord.counter_user))
+            .filter(ScanRecord.client_id.in_([row["client_id"] for row, *_ in accepted]))
+        }
+        insert_barcode_entries(
+            db.session.connection(),
+            [
+                {"scan_record_id": stored[row["client_id"]].id, "barcode": code}
+                for row, barcodes, *_ in accepted
+                for code in barcodes
+            ],
+        )
+
+        # Bulk inserts skip the session's after_flush hooks, so report them here
+        barcode_index.add(code for _, barcodes, *_ in accepted for code in barcodes)
+        apply_deltas(
+            db.session.connection(),
+            Counter(rollup_key(*(row[f] for f in TRACKED_FIELDS)) for row, *_ in accepted),
+        )
+
+        for row, _, staged, upload_token in accepted:
+            if staged:
+                record = stored[row["client_id"]]
+                uploads.append((staged[0], record.image_path, record.id, upload_token))
+
+        count_scans(db.session.connection(), scan_line, len(accepted))
+
+    for result in results:
+        record = replays.get(result["client_id"]) if result["status"] == REPLAYED else None
+        if result["status"] == ACCEPTED:
+            record = stored[result["client_id"]]
+        if record is not None:
+            result["record"] = scan_record_dict(record)
+    return results, uploads
@@ -0,0 +1,100 @@
+import json
+import base64
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import and_, or_
+
+from app.constants.status import ImageStatus
+from app.models import ScanRecord
+from app.utils.storage import signed_url
+
+
+def encode_cursor(record):
+    """Opaque cursor pointing just after `record` in (created_on, id) order."""
+    raw = json.dumps([record.created_on.isoformat(), record.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor. Raises ValueError for anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_on, record_id = json.loads(raw)
+        return datetime.fromisoformat(created_on), int(record_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def page_size(requested=None):
+    """Clamp a requested page size to SCAN_RECORDS_PAGE_MAX (default SCAN_RECORDS_PAGE_SIZE)."""
+    default = current_app.config.get("SCAN_RECORDS_PAGE_SIZE", 50)
+    maximum = current_app.config.get("SCAN_RECORDS_PAGE_MAX", 200)
+    try:
+        size = int(requested) if requested else default
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+def scan_record_page(line_id, cursor=None, limit=None, options=()):
+    """
+    One page of a scan line's records in (created_on, id) order.
+
+    Keyset pagination: each page seeks straight to the cursor position on the
+    (scan_line_id, created_on, id) index, so page N costs the same as page 1
+    however large the line is. Returns (records, next_cursor); next_cursor is
+    None on the last page.
+    """
+    limit = limit or page_size()
+    query = ScanRecord.query.filter(ScanRecord.scan_line_id == line_id)
+
+    if cursor:
+        created_on, record_id = decode_cursor(cursor)
+        query = query.filter(
+            or_(
+                ScanRecord.created_on > created_on,
+                and_(ScanRecord.created_on == created_on, ScanRecord.id > record_id),
+            )
+        )
+
+    records = (
+        query.options(*options)
+        .order_by(ScanRecord.created_on, ScanRecord.id)
+        .limit(limit + 1)  # one extra row tells us whether there is a next page
+        .all()
+    )
+    if len(records) > limit:
+        records = records[:limit]
+        return records, encode_cursor(records[-1])
+    return records, None
+
+
+def attach_image_urls(records):
+    """
+    Set `record.image_url` for templates. Only signed up front in eager mode;
+    in lazy mode the page signs thumbnails in batches as they scroll into view.
+    Images still uploading never get a URL.
+    """
+    eager = current_app.config.get("PRESIGNED_URL_MODE") == "eager"
+    for record in records:
+        if eager and record.image_path and record.image_status != ImageStatus.PENDING:
+            record.image_url = signed_url(record.image_path)
+        else:
+            record.image_url = None
+    return records
+
+
+def scan_record_dict(record):
+    """JSON shape of a scan record row for the scan line pages' infinite scroll."""
+    return {
+        "id": record.id,
+        "barcode_1": record.barcode_1,
+        "barcode_2": record.barcode_2,
+        "barcode_3": record.barcode_3,
+        "counter": record.counter_user.username if record.counter_user else None,
+        "counter_user_id": record.counter_user_id,
+        "created_on": record.created_on.strftime('%Y-%m-%d %H:%M:%S') if record.created_on else None,
+        "has_image": bool(record.image_path),
+        "image_status": record.image_status,
+        "image_url": getattr(record, "image_url", None),
+    }
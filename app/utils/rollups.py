@@ -0,0 +1,247 @@
+import logging
+from collections import Counter
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, func, inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+KEY_FIELDS = ("scan_line_id", "warehouse_id", "location_id", "counter_user_id")
+TRACKED_FIELDS = KEY_FIELDS + ("created_on",)
+
+
+def hour_bucket(created_on):
+    return created_on.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_key(scan_line_id, warehouse_id, location_id, counter_user_id, created_on):
+    """The scan_rollups row a record with these values is counted in (None: not counted)."""
+    if created_on is None:
+        return None
+    return (
+        scan_line_id or 0,
+        warehouse_id or 0,
+        location_id or 0,
+        counter_user_id or 0,
+        hour_bucket(created_on),
+    )
+
+
+def _old_value(state, name):
+    history = state.attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.object, name)
+
+
+class ScanRollups:
+    """
+    Keeps scan_rollups in step with scan_records.
+
+    An after_flush hook turns every inserted, deleted or re-keyed ScanRecord
+    in the flush into +1/-1 deltas and upserts them in the same transaction,
+    so the rollup commits (or rolls back) together with the records.
+    `reconcile()` recounts from scan_records to catch anything that bypassed
+    the ORM (bulk SQL, manual fixes) and can rebuild the table.
+
+    CLI: `flask rollups reconcile [--fix]`.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        if not self._listening:
+            event.listen(Session, "after_flush", self._after_flush)
+            self._listening = True
+        app.cli.add_command(rollups_cli)
+        app.extensions["scan_rollups"] = self
+
+    # ----------------------------
+    # Incremental maintenance
+    # ----------------------------
+    def _after_flush(self, session, flush_context):
+        from app.models import ScanRecord
+
+        deltas = Counter()
+        for obj in session.new:
+            if isinstance(obj, ScanRecord):
+                deltas[self._key(obj)] += 1
+
+        for obj in session.deleted:
+            if isinstance(obj, ScanRecord):
+                state = sa_inspect(obj)
+                deltas[rollup_key(*(_old_value(state, f) for f in TRACKED_FIELDS))] -= 1
+
+        for obj in session.dirty:
+            if not isinstance(obj, ScanRecord) or obj in session.new or obj in session.deleted:
+                continue
+            state = sa_inspect(obj)
+            if not any(state.attrs[f].history.deleted for f in TRACKED_FIELDS):
+                continue
+            old_key = rollup_key(*(_old_value(state, f) for f in TRACKED_FIELDS))
+            new_key = self._key(obj)
+            if old_key != new_key:
+                deltas[old_key] -= 1
+                deltas[new_key] += 1
+
+        deltas = {key: delta for key, delta in deltas.items() if key is not None and delta}
+        if deltas:
+            apply_deltas(session.connection(), deltas)
+
+    @staticmethod
+    def _key(record):
+        return rollup_key(*(getattr(record, f) for f in KEY_FIELDS), record.created_on)
+
+    # ----------------------------
+    # Reconciliation
+    # ----------------------------
+    def reconcile(self, fix=False, batch_size=5000):
+        """
+        Recount scan_records and compare with scan_rollups.
+
+        Returns the drifted keys as dicts (key fields, expected, actual). With
+        `fix=True` the table is rebuilt from scratch in one transaction.
+        """
+        from app import db
+        from app.models import ScanRecord, ScanRollup
+
+        session = db.session
+        table = ScanRollup.__table__
+
+        if fix:
+            # Hold off concurrent upserts until the rebuilt counts are committed
+            if session.get_bind().dialect.name == "postgresql":
+                session.execute(db.text("LOCK TABLE scan_rollups IN EXCLUSIVE MODE"))
+
+        actual = {
+            rollup_key(*row[:4], row[4]): row[5]
+            for row in session.query(
+                table.c.scan_line_id, table.c.warehouse_id, table.c.location_id,
+                table.c.counter_user_id, table.c.hour, table.c.scans,
+            )
+        }
+
+        if fix:
+            session.execute(table.delete())  # also takes SQLite's write lock before the recount
+
+        expected = Counter()
+        rows = (
+            session.query(*(getattr(ScanRecord, f) for f in TRACKED_FIELDS))
+            .filter(ScanRecord.created_on.isnot(None))
+            .execution_options(yield_per=batch_size)
+        )
+        for row in rows:
+            expected[rollup_key(*row)] += 1
+
+        drift = []
+        for key in set(expected) | set(actual):
+            if expected.get(key, 0) != actual.get(key, 0):
+                drift.append({
+                    **dict(zip(KEY_FIELDS + ("hour",), key)),
+                    "expected": expected.get(key, 0),
+                    "actual": actual.get(key, 0),
+                })
+        drift.sort(key=lambda d: (d["scan_line_id"], d["hour"]))
+
+        if fix:
+            values = [dict(zip(KEY_FIELDS + ("hour",), key), scans=n) for key, n in expected.items()]
+            for i in range(0, len(values), batch_size):
+                session.execute(table.insert(), values[i:i + batch_size])
+            session.commit()
+        else:
+            session.rollback()
+
+        if drift:
+            logging.warning(f"scan_rollups drift on {len(drift)} key(s){' (rebuilt)' if fix else ''}")
+        return drift
+
+
+def apply_deltas(connection, deltas):
+    """Add `deltas` ({rollup_key: n}) to scan_rollups with one upsert per key."""
+    from app.models import ScanRollup
+
+    table = ScanRollup.__table__
+    insert = dialect_insert(connection.dialect.name)
+
+    for key, delta in deltas.items():
+        values = dict(zip(KEY_FIELDS + ("hour",), key))
+        if insert is not None:
+            stmt = insert(table).values(**values, scans=delta)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(KEY_FIELDS) + ["hour"],
+                set_={"scans": table.c.scans + stmt.excluded.scans},
+            )
+            connection.execute(stmt)
+            continue
+
+        # Other databases: update, then insert when the row doesn't exist yet
+        where = [table.c[name] == value for name, value in values.items()]
+        result = connection.execute(table.update().where(*where).values(scans=table.c.scans + delta))
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**values, scans=delta))
+
+
+def dialect_insert(dialect_name):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+
+# ----------------------------
+# Readers
+# ----------------------------
+def line_scan_counts(line_ids):
+    """{scan_line_id: scans} for the given lines, read from scan_rollups."""
+    from app import db
+    from app.models import ScanRollup
+
+    line_ids = list(line_ids)
+    if not line_ids:
+        return {}
+    rows = (
+        db.session.query(ScanRollup.scan_line_id, func.sum(ScanRollup.scans))
+        .filter(ScanRollup.scan_line_id.in_(line_ids))
+        .group_by(ScanRollup.scan_line_id)
+        .all()
+    )
+    return {line_id: int(total or 0) for line_id, total in rows}
+
+
+def line_scan_count(line_id):
+    return line_scan_counts([line_id]).get(line_id, 0)
+
+
+# ----------------------------
+# CLI
+# ----------------------------
+rollups_cli = AppGroup("rollups", help="Maintain the scan_rollups table.")
+
+
+@rollups_cli.command("reconcile")
+@click.option("--fix", is_flag=True, help="Rebuild scan_rollups from scan_records.")
+def reconcile_command(fix):
+    """Report (and optionally repair) drift between scan_rollups and scan_records."""
+    from flask import current_app
+
+    drift = current_app.extensions["scan_rollups"].reconcile(fix=fix)
+    for d in drift:
+        click.echo(
+            f"line={d['scan_line_id']} warehouse={d['warehouse_id']} location={d['location_id']} "
+            f"counter={d['counter_user_id']} hour={d['hour']:%Y-%m-%d %H:00}: "
+            f"expected {d['expected']}, found {d['actual']}"
+        )
+    if not drift:
+        click.echo("scan_rollups is in sync.")
+    elif fix:
+        click.echo(f"Rebuilt scan_rollups ({len(drift)} key(s) corrected).")
+    else:
+        click.echo(f"{len(drift)} key(s) drifted; run with --fix to rebuild.")
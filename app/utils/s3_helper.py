@@ -1,58 +1,114 @@
-import boto3
-import os
-from flask import current_app
-
-# Initialize S3 client using environment variables
-s3 = boto3.client(
-    "s3",
-    aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
-    region_name=os.environ.get("AWS_REGION", "us-east-1")
-)
-
-
-def upload_to_s3(file_obj, filename):
-    """Uploads file to S3 (private) and returns the S3 key (not URL)."""
-    bucket = os.environ.get("S3_BUCKET_NAME")
-    if not bucket:
-        raise ValueError("S3_BUCKET_NAME is not configured")
-
-    s3.upload_fileobj(
-        file_obj,
-        bucket,
-        filename,
-        ExtraArgs={"ACL": "private"}  # ❌ No public access
-    )
-    return filename  # store the key in DB (e.g. uploads/<filename>)
-
-
-def generate_presigned_url(filename, expires_in=3600):
-    """Generate a temporary download URL for private S3 files."""
-    bucket = os.environ.get("S3_BUCKET_NAME")
-    if not bucket:
-        raise ValueError("S3_BUCKET_NAME is not configured")
-
-    try:
-        url = s3.generate_presigned_url(
-            ClientMethod="get_object",
-            Params={"Bucket": bucket, "Key": filename},
-            ExpiresIn=expires_in  # expires in 1 hour
+import logging
+import threading
+
+from app.utils.storage import StorageBackend
+
+
+class S3Storage(StorageBackend):
+    """
+    Private S3 bucket backend.
+
+    The boto3 client is created on first use (not at import) with a sized
+    connection pool, standard retries and explicit timeouts. Uploads go through
+    boto3's managed transfer, which switches to multipart above the threshold.
+    """
+
+    def __init__(self, bucket, region="us-east-1", access_key=None, secret_key=None,
+                 max_pool_connections=20, max_attempts=5, connect_timeout=5, read_timeout=30,
+                 multipart_threshold=8 * 1024 * 1024, multipart_chunksize=8 * 1024 * 1024,
+                 max_concurrency=4):
+        if not bucket:
+            raise ValueError("S3_BUCKET_NAME is not configured")
+        self.bucket = bucket
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.max_pool_connections = max_pool_connections
+        self.max_attempts = max_attempts
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.multipart_threshold = multipart_threshold
+        self.multipart_chunksize = multipart_chunksize
+        self.max_concurrency = max_concurrency
+        self._client = None
+        self._transfer_config = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            bucket=config.get("S3_BUCKET_NAME"),
+            region=config.get("AWS_REGION", "us-east-1"),
+            access_key=config.get("AWS_ACCESS_KEY_ID"),
+            secret_key=config.get("AWS_SECRET_ACCESS_KEY"),
+            max_pool_connections=config.get("S3_MAX_POOL_CONNECTIONS", 20),
+            max_attempts=config.get("S3_MAX_ATTEMPTS", 5),
+            connect_timeout=config.get("S3_CONNECT_TIMEOUT", 5),
+            read_timeout=config.get("S3_READ_TIMEOUT", 30),
+            multipart_threshold=config.get("S3_MULTIPART_THRESHOLD", 8 * 1024 * 1024),
+            multipart_chunksize=config.get("S3_MULTIPART_CHUNKSIZE", 8 * 1024 * 1024),
         )
-        return url
-    except Exception as e:
-        current_app.logger.error(f"Failed to generate presigned URL: {e}")
-        return None
-
-
-def delete_from_s3(filename):
-    """Deletes a file from S3 bucket."""
-    bucket = os.environ.get("S3_BUCKET_NAME")
-    if not bucket:
-        raise ValueError("S3_BUCKET_NAME is not configured")
-
-    try:
-        s3.delete_object(Bucket=bucket, Key=filename)
-        return True
-    except Exception as e:
-        current_app.logger.error(f"Failed to delete from S3: {e}")
-        return False
\ No newline at end of file
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import boto3
+                    from botocore.config import Config as BotoConfig
+                    from boto3.s3.transfer import TransferConfig
+
+                    # Own session: boto3's default session isn't safe to build clients from concurrently
+                    session = boto3.session.Session(
+                        aws_access_key_id=self.access_key,
+                        aws_secret_access_key=self.secret_key,
+                        region_name=self.region,
+                    )
+                    self._transfer_config = TransferConfig(
+                        multipart_threshold=self.multipart_threshold,
+                        multipart_chunksize=self.multipart_chunksize,
+                        max_concurrency=self.max_concurrency,
+                    )
+                    self._client = session.client(
+                        "s3",
+                        config=BotoConfig(
+                            max_pool_connections=self.max_pool_connections,
+                            retries={"max_attempts": self.max_attempts, "mode": "standard"},
+                            connect_timeout=self.connect_timeout,
+                            read_timeout=self.read_timeout,
+                        ),
+                    )
+        return self._client
+
+    def upload(self, file_obj, key):
+        """Uploads file to S3 (private) and returns the S3 key (not URL)."""
+        client = self.client
+        client.upload_fileobj(
+            file_obj,
+            self.bucket,
+            key,
+            ExtraArgs={"ACL": "private"},  # ❌ No public access
+            Config=self._transfer_config,
+        )
+        return key  # store the key in DB (e.g. uploads/<filename>)
+
+    def url(self, key, expires_in=3600):
+        """Generate a temporary download URL for private S3 files."""
+        try:
+            return self.client.generate_presigned_url(
+                ClientMethod="get_object",
+                Params={"Bucket": self.bucket, "Key": key},
+                ExpiresIn=expires_in,
+            )
+        except Exception as e:
+            logging.error(f"Failed to generate presigned URL: {e}")
+            return None
+
+    def delete(self, key):
+        """Deletes a file from S3 bucket."""
+        try:
+            self.client.delete_object(Bucket=self.bucket, Key=key)
+            return True
+        except Exception as e:
+            logging.error(f"Failed to delete from S3: {e}")
+            return False
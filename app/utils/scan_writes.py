@@ -0,0 +1,70 @@
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.constants.status import ScanLineStatus
+from app.utils.rollups import dialect_insert
+
+
+class DuplicateBarcode(Exception):
+    """A barcode was stored by a concurrent save before this transaction's insert."""
+
+    def __init__(self, barcodes):
+        super().__init__(f"Barcodes already stored: {sorted(barcodes)}")
+        self.barcodes = set(barcodes)
+
+
+def count_scans(connection, scan_line, delta):
+    """
+    Add `delta` to scan_line.current_count in one UPDATE (no read-modify-write,
+    so concurrent saves on the line can't lose increments) and move a Created
+    line to In-Progress. Returns the new count; the ORM object is updated
+    without being marked dirty, so a later flush won't write a stale value.
+    """
+    from app.models import ScanLine
+
+    table = ScanLine.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == scan_line.id)
+        .values(
+            current_count=func.coalesce(table.c.current_count, 0) + delta,
+            status=case(
+                (table.c.status == ScanLineStatus.CREATED, ScanLineStatus.IN_PROGRESS),
+                else_=table.c.status,
+            ) if delta > 0 else table.c.status,
+        )
+    )
+    if connection.dialect.update_returning:
+        current_count, status = connection.execute(stmt.returning(table.c.current_count, table.c.status)).one()
+    else:
+        connection.execute(stmt)
+        current_count, status = connection.execute(
+            select(table.c.current_count, table.c.status).where(table.c.id == scan_line.id)
+        ).one()
+    set_committed_value(scan_line, "current_count", current_count)
+    set_committed_value(scan_line, "status", status)
+    return current_count
+
+
+def insert_barcode_entries(connection, rows):
+    """
+    Insert barcode_entry rows ({scan_record_id, barcode}). On PostgreSQL and
+    SQLite a barcode already taken is skipped (ON CONFLICT DO NOTHING) and
+    reported with DuplicateBarcode rather than an IntegrityError that would
+    abort the transaction; the caller rolls back either way.
+    """
+    from app.models import BarcodeEntry
+
+    if not rows:
+        return
+    table = BarcodeEntry.__table__
+    insert = dialect_insert(connection.dialect.name)
+    if insert is None:
+        connection.execute(table.insert(), rows)  # unique index raises IntegrityError
+        return
+
+    stmt = insert(table).on_conflict_do_nothing(index_elements=["barcode"]).returning(table.c.barcode)
+    inserted = set(connection.execute(stmt, rows).scalars())
+    taken = {row["barcode"] for row in rows} - inserted
+    if taken:
+        raise DuplicateBarcode(taken)
@@ -0,0 +1,171 @@
+import os
+import asyncio
+import time
+import shutil
+import logging
+import threading
+from collections import OrderedDict
+from flask import current_app, url_for
+from itsdangerous import URLSafeSerializer
+
+_build_lock = threading.Lock()
+
+
+class StorageBackend:
+    """Where scan images live. Keys look like 'uploads/<filename>'."""
+
+    def upload(self, file_obj, key):
+        """Store the contents of `file_obj` under `key` and return the key."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Remove `key`. Returns True on success, False on failure (logged)."""
+        raise NotImplementedError
+
+    def url(self, key, expires_in=3600):
+        """Return a temporary download URL for `key`, or None."""
+        raise NotImplementedError
+
+    # Awaitable variants for code running on an event loop. boto3 and the
+    # filesystem only block, so these run the calls above on a worker thread.
+    async def upload_async(self, file_obj, key):
+        return await asyncio.to_thread(self.upload, file_obj, key)
+
+    async def delete_async(self, key):
+        return await asyncio.to_thread(self.delete, key)
+
+    async def url_async(self, key, expires_in=3600):
+        return await asyncio.to_thread(self.url, key, expires_in)
+
+
+class LocalStorage(StorageBackend):
+    """
+    Filesystem backend for on-prem sites and tests. Files are served by the
+    storage blueprint through signed, expiring URLs — same contract as S3.
+    """
+
+    def __init__(self, root, secret_key):
+        self.root = os.path.abspath(root)
+        self.serializer = URLSafeSerializer(secret_key, salt="local-storage")
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def upload(self, file_obj, key):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".part"
+        with open(tmp, "wb") as f:
+            shutil.copyfileobj(file_obj, f)
+        os.replace(tmp, path)
+        return key
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+            return True
+        except FileNotFoundError:
+            return True
+        except Exception as e:
+            logging.error(f"Failed to delete {key} from local storage: {e}")
+            return False
+
+    def url(self, key, expires_in=3600):
+        token = self.serializer.dumps({"key": key, "exp": time.time() + expires_in})
+        return url_for("storage.serve_file", token=token)
+
+    def resolve(self, token):
+        """Return the file path for a signed token, or None if invalid/expired."""
+        try:
+            data = self.serializer.loads(token)
+            if data["exp"] < time.time():
+                return None
+            path = self.path(data["key"])
+        except Exception:
+            return None
+        return path if os.path.exists(path) else None
+
+
+def _build(app):
+    backend = app.config.get("STORAGE_BACKEND")
+    if backend == "s3":
+        from app.utils.s3_helper import S3Storage
+        return S3Storage.from_config(app.config)
+    if backend == "local":
+        root = app.config.get("LOCAL_STORAGE_DIR") or os.path.join(app.instance_path, "storage")
+        return LocalStorage(root, app.config["SECRET_KEY"])
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+def get_storage(app=None):
+    """Return the app's storage backend, building it on first use."""
+    app = app or current_app._get_current_object()
+    storage = app.extensions.get("storage")
+    if storage is None:
+        with _build_lock:
+            storage = app.extensions.get("storage")
+            if storage is None:
+                storage = app.extensions["storage"] = _build(app)
+    return storage
+
+
+class UrlCache:
+    """
+    Bounded LRU of signed download URLs, keyed by storage key.
+
+    A URL is reused only while it still has at least `min_remaining` seconds
+    of validity left, so a page never hands out a link about to expire.
+    """
+
+    def __init__(self, maxsize=5000, min_remaining=900):
+        self.maxsize = maxsize
+        self.min_remaining = min_remaining
+        self._entries = OrderedDict()   # key → (url, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, storage, key, expires_in):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] - now >= self.min_remaining:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Sign outside the lock: S3 signing is local but not free
+        url = storage.url(key, expires_in=expires_in)
+        if url is None:
+            return None
+
+        with self._lock:
+            self._entries[key] = (url, now + expires_in)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return url
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def signed_url(key, app=None):
+    """Cached temporary download URL for `key` (PRESIGNED_URL_EXPIRES seconds)."""
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get("storage_url_cache")
+    if cache is None:
+        with _build_lock:
+            cache = app.extensions.get("storage_url_cache")
+            if cache is None:
+                cache = app.extensions["storage_url_cache"] = UrlCache(
+                    maxsize=app.config.get("PRESIGNED_URL_CACHE_SIZE", 5000),
+                    min_remaining=app.config.get("PRESIGNED_URL_MIN_REMAINING", 900),
+                )
+    return cache.get(get_storage(app), key, app.config.get("PRESIGNED_URL_EXPIRES", 3600))
@@ -0,0 +1,269 @@
+import os
+import json
+import asyncio
+import time
+import uuid
+import random
+import shutil
+import logging
+import threading
+
+from app.constants.status import ImageStatus
+
+
+class StorageQueue:
+    """
+    Durable background queue for object-storage uploads and deletes.
+
+    Jobs are spooled to local disk (STORAGE_SPOOL_DIR) before the request
+    returns, then a daemon thread in each web process pushes them to storage,
+    retrying with exponential backoff; up to STORAGE_CONCURRENCY transfers
+    run at once, as tasks on a short-lived event loop. Workers in several
+    processes can share one spool directory: a job is claimed by atomically
+    renaming its file.
+
+    `uploader(fileobj, key)` and `deleter(key)` default to the configured
+    storage backend (see app.utils.storage) and can be swapped in tests.
+    """
+
+    JOB_SUFFIX = ".job"
+    CLAIM_SUFFIX = ".claimed"
+
+    def __init__(self, app=None, uploader=None, deleter=None):
+        self.app = None
+        self.uploader = uploader
+        self.deleter = deleter
+        self._thread = None
+        self._pid = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.spool_dir = app.config.get("STORAGE_SPOOL_DIR") or os.path.join(app.instance_path, "spool")
+        self.max_attempts = app.config.get("STORAGE_MAX_ATTEMPTS", 8)
+        self.backoff_base = app.config.get("STORAGE_BACKOFF_BASE", 2)
+        self.backoff_max = app.config.get("STORAGE_BACKOFF_MAX", 300)
+        self.poll_interval = app.config.get("STORAGE_POLL_INTERVAL", 5)
+        self.claim_timeout = app.config.get("STORAGE_CLAIM_TIMEOUT", 600)
+        self.concurrency = max(1, app.config.get("STORAGE_CONCURRENCY", 4))
+        os.makedirs(os.path.join(self.spool_dir, "dead"), exist_ok=True)
+        app.extensions["storage_queue"] = self
+
+    # ----------------------------
+    # Enqueue
+    # ----------------------------
+    def enqueue_upload(self, src, key, record_id=None, move=False):
+        """
+        Spool `src` (a file object, or a path) for upload as `key`. With
+        `move=True` a path is moved into the spool instead of copied.
+        """
+        job_id = self._new_job_id()
+        data_path = os.path.join(self.spool_dir, job_id + ".data")
+
+        if isinstance(src, (str, os.PathLike)):
+            if move:
+                shutil.move(src, data_path)
+            else:
+                shutil.copyfile(src, data_path)
+        else:
+            with open(data_path, "wb") as f:
+                shutil.copyfileobj(src, f)
+
+        self._write_job(job_id, {"op": "upload", "key": key, "record_id": record_id, "data": data_path})
+        return job_id
+
+    def enqueue_delete(self, key, record_id=None):
+        """Spool a delete for `key`, dropping any upload of it that hasn't started yet."""
+        for job_id, job in self._pending_jobs():
+            if job["op"] == "upload" and job["key"] == key:
+                self._discard(job_id, job)
+
+        job_id = self._new_job_id()
+        self._write_job(job_id, {"op": "delete", "key": key, "record_id": record_id})
+        return job_id
+
+    # ----------------------------
+    # Worker
+    # ----------------------------
+    def start(self):
+        """Start the worker thread for the current process (idempotent, fork-aware)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="storage-queue", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_pending()
+            except Exception as e:
+                logging.error(f"Storage queue worker error: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def run_pending(self, now=None):
+        """Process every job that is due. Returns the number of jobs attempted."""
+        now = now or time.time()
+        self._recover_stale_claims(now)
+
+        due = [(job_id, job) for job_id, job in self._pending_jobs() if job.get("next_try", 0) <= now]
+        if not due:
+            return 0
+        return asyncio.run(self._run_due(due))
+
+    async def _run_due(self, due):
+        """
+        Transfer `due` jobs, up to STORAGE_CONCURRENCY at once. Jobs for the
+        same key run one after another in queue order, so a delete never
+        overtakes the upload it follows.
+        """
+        by_key = {}
+        for job_id, job in due:
+            by_key.setdefault(job["key"], []).append((job_id, job))
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def run_key(jobs):
+            attempted = 0
+            for job_id, job in jobs:
+                async with slots:
+                    claimed = self._claim(job_id)
+                    if claimed:
+                        attempted += 1
+                        await self._process(job_id, job, claimed)
+            return attempted
+
+        return sum(await asyncio.gather(*(run_key(jobs) for jobs in by_key.values())))
+
+    async def _process(self, job_id, job, claimed_path):
+        try:
+            if job["op"] == "upload":
+                with open(job["data"], "rb") as f:
+                    await self._upload(f, job["key"])
+            elif await self._delete(job["key"]) is False:
+                raise RuntimeError(f"delete of {job['key']} failed")
+        except Exception as e:
+            await asyncio.to_thread(self._retry, job_id, job, claimed_path, e)
+            return
+
+        if job["op"] == "upload":
+            await asyncio.to_thread(self._set_image_status, job.get("record_id"), ImageStatus.STORED)
+            self._remove(job.get("data"))
+        self._remove(claimed_path)
+
+    def _retry(self, job_id, job, claimed_path, error):
+        job["attempts"] = job.get("attempts", 0) + 1
+        job["last_error"] = str(error)
+
+        if job["attempts"] >= self.max_attempts:
+            logging.error(f"Storage {job['op']} of {job['key']} failed permanently: {error}")
+            if job["op"] == "upload":
+                self._set_image_status(job.get("record_id"), ImageStatus.FAILED)
+            dead_dir = os.path.join(self.spool_dir, "dead")
+            if job.get("data") and os.path.exists(job["data"]):
+                job["data"] = shutil.move(job["data"], dead_dir)
+            with open(os.path.join(dead_dir, job_id + self.JOB_SUFFIX), "w") as f:
+                json.dump(job, f)
+            self._remove(claimed_path)
+            return
+
+        delay = min(self.backoff_base * 2 ** (job["attempts"] - 1), self.backoff_max)
+        job["next_try"] = time.time() + delay + random.uniform(0, self.backoff_base)
+        logging.warning(f"Storage {job['op']} of {job['key']} failed (attempt {job['attempts']}), retry in {delay}s: {error}")
+        self._write_job(job_id, job)
+        self._remove(claimed_path)
+
+    def _set_image_status(self, record_id, status):
+        if not record_id:
+            return
+        from app import db
+        from app.models import ScanRecord
+
+        with self.app.app_context():
+            record = db.session.get(ScanRecord, record_id)
+            if record:
+                record.image_status = status
+                db.session.commit()
+
+    async def _upload(self, file_obj, key):
+        if self.uploader is None:
+            from app.utils.storage import get_storage
+            return await get_storage(self.app).upload_async(file_obj, key)
+        return await asyncio.to_thread(self.uploader, file_obj, key)
+
+    async def _delete(self, key):
+        if self.deleter is None:
+            from app.utils.storage import get_storage
+            return await get_storage(self.app).delete_async(key)
+        return await asyncio.to_thread(self.deleter, key)
+
+    # ----------------------------
+    # Spool files
+    # ----------------------------
+    def _new_job_id(self):
+        # Time-ordered so jobs run in the order they were queued
+        return f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+
+    def _write_job(self, job_id, job):
+        path = os.path.join(self.spool_dir, job_id + self.JOB_SUFFIX)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(job, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)  # atomic: a worker never sees a half-written job
+        self._wakeup.set()
+
+    def _pending_jobs(self):
+        jobs = []
+        for name in sorted(os.listdir(self.spool_dir)):
+            if not name.endswith(self.JOB_SUFFIX):
+                continue
+            try:
+                with open(os.path.join(self.spool_dir, name)) as f:
+                    jobs.append((name[: -len(self.JOB_SUFFIX)], json.load(f)))
+            except (OSError, ValueError):
+                continue  # claimed or removed by another worker meanwhile
+        return jobs
+
+    def _claim(self, job_id):
+        src = os.path.join(self.spool_dir, job_id + self.JOB_SUFFIX)
+        dst = os.path.join(self.spool_dir, job_id + self.CLAIM_SUFFIX)
+        try:
+            os.rename(src, dst)
+        except FileNotFoundError:
+            return None  # another worker got it
+        os.utime(dst)
+        return dst
+
+    def _recover_stale_claims(self, now):
+        """Requeue jobs claimed by a worker that died mid-transfer."""
+        for name in os.listdir(self.spool_dir):
+            if not name.endswith(self.CLAIM_SUFFIX):
+                continue
+            path = os.path.join(self.spool_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.claim_timeout:
+                    os.rename(path, path[: -len(self.CLAIM_SUFFIX)] + self.JOB_SUFFIX)
+            except FileNotFoundError:
+                pass
+
+    def _discard(self, job_id, job):
+        if self._claim(job_id):
+            self._remove(job.get("data"))
+            self._remove(os.path.join(self.spool_dir, job_id + self.CLAIM_SUFFIX))
+
+    @staticmethod
+    def _remove(path):
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def pending_count(self):
+        return len(self._pending_jobs())
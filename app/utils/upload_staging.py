@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import hashlib
+import secrets
+import logging
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+# Last sweep time per staging directory (per process)
+_last_sweep = {}
+
+
+def _staging_dir():
+    path = current_app.config.get("UPLOAD_STAGING_DIR") or os.path.join(current_app.instance_path, "staging")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _paths(token):
+    """(image, metadata, metadata once claimed) paths of a staged upload."""
+    base = os.path.join(_staging_dir(), token)
+    return base + ".bin", base + ".json", base + ".claimed"
+
+
+def stage_upload(data, filename, user_id, digest=None):
+    """
+    Keep an uploaded image on local disk and return a short-lived token for it.
+
+    The scan page sends this token to save_scan_record instead of re-uploading
+    the same photo it already sent to process_barcode. `digest` is the
+    image's sha256 hex digest, if the caller already has it.
+    """
+    sweep_expired(throttle=True)
+
+    token = secrets.token_urlsafe(24)
+    data_path, meta_path, _ = _paths(token)
+    with open(data_path, "wb") as f:
+        f.write(data)
+    with open(meta_path, "w") as f:
+        json.dump({
+            "user_id": user_id,
+            "filename": secure_filename(filename or "image.jpg"),
+            "sha256": digest or hashlib.sha256(data).hexdigest(),
+            "created": time.time(),
+        }, f)
+    return token
+
+
+def claim_upload(token, user_id):
+    """
+    Claim a staged upload owned by `user_id` for one save and return
+    (path, filename, sha256), or None if the token is unknown, expired,
+    belongs to someone else or is already claimed.
+
+    The claim renames the metadata file, so of two requests sending the same
+    token (a double submit) only one gets the photo. The caller then either
+    stores it and calls release_upload(), or hands it back with
+    unclaim_upload() when the save fails.
+    """
+    if not token or not all(c.isalnum() or c in "-_" for c in token):
+        return None
+
+    data_path, meta_path, claimed_path = _paths(token)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    ttl = current_app.config.get("UPLOAD_TOKEN_TTL", 900)
+    if meta.get("user_id") != user_id or time.time() - meta.get("created", 0) > ttl:
+        return None
+    try:
+        os.rename(meta_path, claimed_path)
+    except FileNotFoundError:
+        return None  # claimed by a concurrent request
+    if not os.path.exists(data_path):
+        return None
+    return data_path, meta["filename"], meta.get("sha256")
+
+
+def unclaim_upload(token):
+    """Make a claimed upload available again (its save was rolled back)."""
+    _, meta_path, claimed_path = _paths(token)
+    try:
+        os.rename(claimed_path, meta_path)
+    except FileNotFoundError:
+        pass
+
+
+def release_upload(token):
+    """Delete a staged upload once it has been stored for good."""
+    for path in _paths(token):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def sweep_expired(throttle=False):
+    """
+    Remove staged uploads older than UPLOAD_TOKEN_TTL. With `throttle`, run at
+    most once per UPLOAD_SWEEP_INTERVAL seconds per process. Returns files removed.
+    """
+    staging = _staging_dir()
+    now = time.time()
+    if throttle and now - _last_sweep.get(staging, 0) < current_app.config.get("UPLOAD_SWEEP_INTERVAL", 60):
+        return 0
+    _last_sweep[staging] = now
+
+    ttl = current_app.config.get("UPLOAD_TOKEN_TTL", 900)
+    removed = 0
+    for entry in os.scandir(staging):
+        try:
+            if entry.is_file() and now - entry.stat().st_mtime > ttl:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass  # another worker swept it first
+        except OSError as e:
+            logging.warning(f"Could not sweep staged upload {entry.path}: {e}")
+    return removed
@@ -0,0 +1,20 @@
+"""
+ASGI entry point, for serving many slow clients per dyno:
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker -w 2
+
+Request bodies are read on the event loop, views run on a thread pool of
+ASGI_THREADS and barcode decoding goes to the decode process pool, so the
+loop itself never runs Flask or OpenCV code. Use gunicorn for several
+processes: workers started by `uvicorn --workers` are multiprocessing
+children and decode in the request thread instead of a pool.
+"""
+from app.libzbar_preload import preload_zbar_for_heroku
+preload_zbar_for_heroku()
+
+from app import create_app
+from app.utils.asgi import create_asgi_app
+
+flask_app = create_app()
+app = create_asgi_app(flask_app)
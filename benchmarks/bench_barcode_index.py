@@ -0,0 +1,148 @@
+"""
+save_scan_record throughput and duplicate-check latency with and without
+the barcode duplicate index (Bloom filter in front of barcode_entry).
+
+Builds a throwaway SQLite database per size, pre-filled with that many scan
+records (three barcodes each), then saves new scans through
+/counter/save_scan_record with the index off and on, and times the bare
+duplicate lookup for new and for existing barcodes. On SQLite the index
+mostly saves the query round trip; against Postgres over the network the
+difference per scan is larger.
+
+Usage:
+    python benchmarks/bench_barcode_index.py [--records 100000 1000000] [--saves 500]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+
+def _build_app(workdir, records):
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        STORAGE_SPOOL_DIR=os.path.join(workdir, "spool"),
+        STORAGE_WORKER_ENABLED="0",
+        LOCAL_STORAGE_DIR=os.path.join(workdir, "storage"),
+        EXPORT_WORKER_ENABLED="0",
+        DECODE_POOL_SIZE="0",
+        DECODE_WARMUP="0",
+    )
+    import config
+    from importlib import reload
+    reload(config)  # Config reads the environment at import time
+
+    from sqlalchemy import create_engine
+    from werkzeug.security import generate_password_hash
+    from app import create_app, db
+    from app.models import User, Location, Warehouse, ScanLine, ScanRecord, BarcodeEntry
+
+    # The schema is in place before the app boots, as after `flask db upgrade`
+    engine = create_engine(os.environ["DATABASE_URL"])
+    db.metadata.create_all(engine)
+    engine.dispose()
+
+    app = create_app()
+    with app.app_context():
+        counter = User(username="c1", password_hash=generate_password_hash("x"), role="Counter", is_active=True)
+        location = Location(name="Location")
+        db.session.add_all([counter, location])
+        db.session.flush()
+        warehouse = Warehouse(warehouse_name="Warehouse", location_id=location.id)
+        db.session.add(warehouse)
+        db.session.flush()
+        line = ScanLine(line_code="LINE", location_id=location.id, warehouse_id=warehouse.id,
+                        target_count=records, current_count=records, counter_1_id=counter.id)
+        db.session.add(line)
+        db.session.flush()
+        line_id = line.id
+
+        # Core bulk inserts with explicit ids: fast, and the benchmark doesn't need the rollups
+        now = datetime.utcnow()
+        for start in range(0, records, 10000):
+            ids = range(start + 1, min(start + 10000, records) + 1)
+            db.session.execute(ScanRecord.__table__.insert(), [{
+                "id": i, "scan_line_id": line_id, "location_id": location.id, "warehouse_id": warehouse.id,
+                "counter_user_id": counter.id, "barcode_1": f"MST{i:010d}", "barcode_2": f"EAN{i:013d}",
+                "barcode_3": f"SN-{i:08d}", "created_on": now,
+            } for i in ids])
+            db.session.execute(BarcodeEntry.__table__.insert(), [
+                {"scan_record_id": i, "barcode": code}
+                for i in ids
+                for code in (f"MST{i:010d}", f"EAN{i:013d}", f"SN-{i:08d}")
+            ])
+        db.session.commit()
+    return app, line_id
+
+
+def _saves_per_second(app, line_id, saves, prefix):
+    client = app.test_client()
+    client.post("/login", data={"username": "c1", "password": "x"})
+    start = time.perf_counter()
+    for i in range(saves):
+        response = client.post("/counter/save_scan_record", data={
+            "line_id": line_id,
+            "barcode_1": f"{prefix}-MST{i:010d}",
+            "barcode_2": f"{prefix}-EAN{i:013d}",
+        })
+        assert response.json["success"], response.json
+    return saves / (time.perf_counter() - start)
+
+
+def _lookup_us(app, codes, use_index):
+    from app import db, barcode_index
+
+    with app.app_context():
+        start = time.perf_counter()
+        for code in codes:
+            barcode_index.lookup([code], use_index=use_index)
+        elapsed = time.perf_counter() - start
+        db.session.remove()
+    return elapsed / len(codes) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--saves", type=int, default=500)
+    args = parser.parse_args()
+
+    from_db = [f"NEW{i:010d}" for i in range(2000)]
+    for records in args.records:
+        with tempfile.TemporaryDirectory() as workdir:
+            app, line_id = _build_app(workdir, records)
+            from app import db, barcode_index
+            existing = [f"SN-{i:08d}" for i in range(1, records + 1, max(1, records // 2000))]
+
+            barcode_index.enabled = False
+            off = _saves_per_second(app, line_id, args.saves, "OFF")
+            new_off = _lookup_us(app, from_db, use_index=False)
+
+            barcode_index.enabled = True
+            start = time.perf_counter()
+            barcode_index.warm()
+            warm = time.perf_counter() - start
+            barcode_index.stats.update(dict.fromkeys(barcode_index.stats, 0))
+            on = _saves_per_second(app, line_id, args.saves, "ON")
+            new_on = _lookup_us(app, from_db, use_index=True)
+            existing_on = _lookup_us(app, existing, use_index=True)
+
+            print(
+                f"records={records:<8} saves/s off={off:7.1f} on={on:7.1f}  "
+                f"new-barcode lookup off={new_off:6.1f} us on={new_on:5.1f} us  "
+                f"existing on={existing_on:6.1f} us  "
+                f"warm-up={warm:5.1f} s ({len(barcode_index.bloom.bits) / 1e6:.1f} MB)"
+            )
+            print(f"  {barcode_index.stats}")
+            with app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+SQL query budget for the dashboard pages.
+
+Builds throwaway SQLite databases with a small and a large number of scan
+lines, renders each dashboard and counts the queries it runs. The count must
+stay within the budget and must not grow with the number of lines (no N+1
+lazy loads from the templates). Exits non-zero when a page goes over.
+
+Usage:
+    python benchmarks/bench_dashboard_queries.py [--lines 5 200] [--records 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import event
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+# Fixed number of queries each page may run, whatever the line count
+BUDGETS = {
+    "/teamleader/dashboard": 8,
+    "/counter/dashboard": 4,
+}
+
+
+class QueryCounter:
+    """Records the SQL statements executed on `engine` inside a `with` block."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+        return False
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+def _build_app(workdir, lines, records):
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        STORAGE_SPOOL_DIR=os.path.join(workdir, "spool"),
+        STORAGE_WORKER_ENABLED="0",
+        DECODE_POOL_SIZE="0",
+        DECODE_WARMUP="0",
+    )
+    import config
+    from importlib import reload
+    reload(config)  # Config reads the environment at import time
+
+    from sqlalchemy import create_engine
+    from werkzeug.security import generate_password_hash
+    from app import create_app, db
+    from app.models import User, Location, Warehouse, ScanLine, ScanRecord
+
+    # The schema is in place before the app boots, as after `flask db upgrade`
+    engine = create_engine(os.environ["DATABASE_URL"])
+    db.metadata.create_all(engine)
+    engine.dispose()
+
+    app = create_app()
+    with app.app_context():
+        users = {
+            name: User(username=name, password_hash=generate_password_hash("x"), role=role, is_active=True)
+            for name, role in (("tl", "TeamLeader"), ("tl2", "TeamLeader"), ("c1", "Counter"), ("c2", "Counter"))
+        }
+        db.session.add_all(users.values())
+        db.session.flush()
+
+        for i in range(lines):
+            location = Location(name=f"Location {i}")
+            db.session.add(location)
+            db.session.flush()
+            warehouse = Warehouse(warehouse_name=f"Warehouse {i}", location_id=location.id)
+            db.session.add(warehouse)
+            db.session.flush()
+
+            line = ScanLine(
+                line_code=f"LINE-{i}",
+                location_id=location.id,
+                warehouse_id=warehouse.id,
+                target_count=records,
+                current_count=records,
+                counter_1_id=users["c1"].id,
+                counter_2_id=users["c2"].id,
+                team_leader_user_id=users["tl" if i % 2 == 0 else "tl2"].id,
+                status="In-Progress" if i % 3 else "Completed",
+            )
+            db.session.add(line)
+            db.session.flush()
+            db.session.add_all(
+                ScanRecord(
+                    scan_line_id=line.id,
+                    location_id=location.id,
+                    warehouse_id=warehouse.id,
+                    counter_user_id=users["c1"].id,
+                    barcode_1=f"{i}-{n}",
+                )
+                for n in range(records)
+            )
+        db.session.commit()
+    return app
+
+
+def _measure(lines, records):
+    from app import db
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        app = _build_app(workdir, lines, records)
+        with app.app_context():
+            engine = db.engine
+
+        for path, user in (("/teamleader/dashboard", "tl"), ("/counter/dashboard", "c1")):
+            client = app.test_client()
+            client.post("/login", data={"username": user, "password": "x"})
+            with QueryCounter(engine) as queries:
+                start = time.perf_counter()
+                response = client.get(path)
+                elapsed = (time.perf_counter() - start) * 1000
+            if response.status_code != 200:
+                raise SystemExit(f"{path} returned {response.status_code}")
+            results[path] = (queries.count, elapsed)
+
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, nargs="+", default=[5, 200])
+    parser.add_argument("--records", type=int, default=3, help="scan records per line")
+    args = parser.parse_args()
+
+    counts = {path: [] for path in BUDGETS}
+    for lines in args.lines:
+        for path, (count, elapsed) in _measure(lines, args.records).items():
+            counts[path].append(count)
+            print(f"{path:<24} lines={lines:<5} queries={count:<4} {elapsed:8.1f} ms")
+
+    failed = False
+    for path, seen in counts.items():
+        if max(seen) > BUDGETS[path]:
+            print(f"FAIL {path}: {max(seen)} queries, budget {BUDGETS[path]}")
+            failed = True
+        elif len(set(seen)) > 1:
+            print(f"FAIL {path}: query count grows with line count {seen}")
+            failed = True
+    if failed:
+        sys.exit(1)
+    print("OK: query counts within budget and independent of line count")
+
+
+if __name__ == "__main__":
+    main()
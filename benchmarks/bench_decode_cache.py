@@ -0,0 +1,84 @@
+"""
+Per-photo latency of a decode, an exact repeat and a near-identical repeat
+(the same photo re-encoded at lower quality and size) through the decode cache.
+
+Usage:
+    python benchmarks/bench_decode_cache.py [image ...] [--runs N]
+
+With no images given, the sample photos in app/static/uploads are used.
+"""
+import argparse
+import glob
+import hashlib
+import io
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from PIL import Image  # noqa: E402
+
+from app import barcode_processor  # noqa: E402
+from app.utils.decode_cache import DecodeCache  # noqa: E402
+
+
+def _load_images(paths):
+    if not paths:
+        uploads = os.path.join(ROOT, "app", "static", "uploads")
+        paths = sorted(glob.glob(os.path.join(uploads, "*.jp*g")) + glob.glob(os.path.join(uploads, "*.JPG")))
+    images = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        images[hashlib.sha256(data).digest()] = data  # the samples repeat some photos
+    return list(images.values())
+
+
+def _reencode(data, quality=70, scale=0.8):
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    out = io.BytesIO()
+    image.resize((int(image.width * scale), int(image.height * scale))).save(out, "JPEG", quality=quality)
+    return out.getvalue()
+
+
+class _Config:
+    config = {"DECODE_CACHE_SIZE": 1000, "DECODE_CACHE_TTL": 600}
+    extensions = {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    images = _load_images(args.images)
+    near = [_reencode(data) for data in images]
+    barcode_processor.warm_up()
+
+    timings = {"decode": [], "exact": [], "similar": []}
+    hits = {"exact": 0, "similar": 0}
+    for _ in range(args.runs):
+        cache = DecodeCache(_Config)
+        for data, copy in zip(images, near):
+            for kind, image in (("decode", data), ("exact", data), ("similar", copy)):
+                start = time.perf_counter()
+                result, _, hit = cache.decode(image, 1, barcode_processor.process_barcode_image)
+                timings[kind].append((time.perf_counter() - start) * 1000)
+                if kind == "exact":
+                    hits[kind] += hit == kind
+                elif kind == "similar":
+                    hits[kind] += "matched" in result
+
+    total = len(images) * args.runs
+    for kind, values in timings.items():
+        hit_rate = f"  {'hits' if kind == 'exact' else 'matched'}={hits[kind]}/{total}" if kind in hits else ""
+        print(f"{kind:<8} median={statistics.median(values):7.1f} ms  max={max(values):7.1f} ms{hit_rate}")
+    print("(a near-identical photo is decoded again; the match only feeds the duplicate-photo warning)")
+
+
+if __name__ == "__main__":
+    main()
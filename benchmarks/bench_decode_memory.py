@@ -0,0 +1,125 @@
+"""
+Peak RSS and latency of barcode decoding on full-size phone photos: the
+zero-copy cv2.imdecode path against the old PIL → RGB → BGR → GRAY loader.
+
+Each path runs in a fresh process, so ru_maxrss is that path's own peak.
+"prepare" is the image loading stage alone; "total" includes every stage
+that ran. With no images given, 12 MP (4032x3024) JPEGs are made from the
+sample photos in app/static/uploads.
+
+Usage:
+    python benchmarks/bench_decode_memory.py [image ...] [--runs N]
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+
+class _LegacyImage:
+    """The loader this replaced, behind the GrayImage interface."""
+
+    def __init__(self, image_bytes):
+        import cv2
+        import numpy as np
+        from PIL import Image
+
+        pil_img = Image.open(io.BytesIO(image_bytes))
+        image = cv2.cvtColor(np.array(pil_img.convert("RGB")), cv2.COLOR_RGB2BGR)
+        self._full = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        self.shape = self._full.shape[:2]
+
+    def full(self):
+        return self._full
+
+    def working(self, max_dimension):
+        import cv2
+
+        h, w = self.shape
+        scale = min(1.0, max_dimension / max(h, w))
+        if scale >= 1.0:
+            return 1.0, self._full
+        return scale, cv2.resize(self._full, (int(w * scale), int(h * scale)))
+
+
+def _child(path_name, images, runs):
+    from app import barcode_processor
+
+    if path_name == "legacy":
+        barcode_processor._load_image = _LegacyImage
+    barcode_processor.warm_up()
+
+    blobs = []
+    for path in images:
+        with open(path, "rb") as f:
+            blobs.append(f.read())
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    prepare, total = [], []
+    for _ in range(runs):
+        for data in blobs:
+            start = time.perf_counter()
+            result = barcode_processor.process_barcode_image(data)
+            total.append((time.perf_counter() - start) * 1000)
+            prepare.append(next(t["ms"] for t in result["timings"] if t["stage"] == "prepare"))
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "prepare": statistics.median(prepare),
+        "total": statistics.median(total),
+        "peak_mb": peak / 1024,
+        "growth_mb": (peak - baseline) / 1024,
+    }))
+
+
+def _phone_photos(workdir):
+    from PIL import Image
+
+    uploads = os.path.join(ROOT, "app", "static", "uploads")
+    paths = []
+    for i, path in enumerate(sorted(glob.glob(os.path.join(uploads, "*.jp*g")))[:6]):
+        image = Image.open(path).convert("RGB")
+        size = (3024, 4032) if image.height > image.width else (4032, 3024)
+        out = os.path.join(workdir, f"photo_{i}.jpg")
+        image.resize(size, Image.LANCZOS).save(out, quality=92)
+        paths.append(out)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.images, args.runs)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        images = args.images or _phone_photos(workdir)
+        for path_name in ("legacy", "imdecode"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--child", path_name, "--runs", str(args.runs), *images],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            stats = json.loads(out.strip().splitlines()[-1])
+            print(
+                f"{path_name:<9} prepare={stats['prepare']:7.1f} ms  total={stats['total']:7.1f} ms  "
+                f"peak RSS={stats['peak_mb']:6.0f} MB (+{stats['growth_mb']:.0f} MB while decoding)"
+            )
+
+
+if __name__ == "__main__":
+    main()
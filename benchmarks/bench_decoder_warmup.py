@@ -0,0 +1,77 @@
+"""
+Cold vs warm per-image barcode decode latency.
+
+"cold" rebuilds the decoder registry before every image (what the old code
+did with a fresh cv2.barcode_BarcodeDetector per request); "warm" reuses it.
+
+Usage:
+    python benchmarks/bench_decoder_warmup.py [image ...] [--runs N]
+
+With no images given, the sample photos in app/static/uploads are used.
+"""
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from app import barcode_processor  # noqa: E402
+
+
+def _load_images(paths):
+    if not paths:
+        uploads = os.path.join(ROOT, "app", "static", "uploads")
+        paths = sorted(glob.glob(os.path.join(uploads, "*.jp*g")) + glob.glob(os.path.join(uploads, "*.JPG")))
+    images = []
+    for path in paths:
+        with open(path, "rb") as f:
+            images.append(f.read())
+    return images
+
+
+def _time_run(images, runs, cold):
+    timings = []
+    for _ in range(runs):
+        for data in images:
+            if cold:
+                barcode_processor.registry.reset()
+            start = time.perf_counter()
+            barcode_processor.process_barcode_image(data)
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _report(label, timings):
+    print(
+        f"{label:<6} n={len(timings):<4} "
+        f"mean={statistics.mean(timings):8.1f} ms  "
+        f"median={statistics.median(timings):8.1f} ms  "
+        f"max={max(timings):8.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    images = _load_images(args.images)
+    if not images:
+        sys.exit("No images found")
+
+    cold = _time_run(images, args.runs, cold=True)
+    barcode_processor.warm_up()
+    warm = _time_run(images, args.runs, cold=False)
+
+    _report("cold", cold)
+    _report("warm", warm)
+    print(f"warm speed-up: {statistics.mean(cold) / statistics.mean(warm):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Peak Python memory and time of the scan record export, XLSX and CSV.
+
+Builds a throwaway SQLite database per size, queues an export through
+/teamleader/export_custom and records the tracemalloc peak while the export
+job runs (query, file, upload to local storage). With the streaming export
+the peak should stay roughly flat as the number of rows grows. (tracemalloc slows the run down
+considerably, so compare the peaks, not the times.)
+
+Usage:
+    python benchmarks/bench_export_memory.py [--rows 10000 100000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+
+def _build_app(workdir, rows):
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        STORAGE_SPOOL_DIR=os.path.join(workdir, "spool"),
+        STORAGE_WORKER_ENABLED="0",
+        LOCAL_STORAGE_DIR=os.path.join(workdir, "storage"),
+        EXPORT_WORKER_ENABLED="0",  # jobs run below, under tracemalloc
+        DECODE_POOL_SIZE="0",
+        DECODE_WARMUP="0",
+    )
+    import config
+    from importlib import reload
+    reload(config)  # Config reads the environment at import time
+
+    from sqlalchemy import create_engine
+    from werkzeug.security import generate_password_hash
+    from app import create_app, db
+    from app.models import User, Location, Warehouse, ScanLine, ScanRecord
+
+    # The schema is in place before the app boots, as after `flask db upgrade`
+    engine = create_engine(os.environ["DATABASE_URL"])
+    db.metadata.create_all(engine)
+    engine.dispose()
+
+    app = create_app()
+    with app.app_context():
+        tl = User(username="tl", password_hash=generate_password_hash("x"), role="TeamLeader", is_active=True)
+        counter = User(username="c1", password_hash=generate_password_hash("x"), role="Counter", is_active=True)
+        location = Location(name="Location")
+        db.session.add_all([tl, counter, location])
+        db.session.flush()
+        warehouse = Warehouse(warehouse_name="Warehouse", location_id=location.id)
+        db.session.add(warehouse)
+        db.session.flush()
+        line = ScanLine(line_code="LINE", location_id=location.id, warehouse_id=warehouse.id,
+                        target_count=rows, counter_1_id=counter.id, team_leader_user_id=tl.id)
+        db.session.add(line)
+        db.session.flush()
+
+        # Core bulk insert: fast, and the export doesn't need the rollups
+        now = datetime.utcnow()
+        batch = []
+        for i in range(rows):
+            batch.append({
+                "scan_line_id": line.id, "location_id": location.id, "warehouse_id": warehouse.id,
+                "counter_user_id": counter.id, "barcode_1": f"MST{i:010d}", "barcode_2": f"EAN{i:013d}",
+                "barcode_3": f"SN-{i:08d}", "created_on": now,
+            })
+            if len(batch) == 10000:
+                db.session.execute(ScanRecord.__table__.insert(), batch)
+                batch = []
+        if batch:
+            db.session.execute(ScanRecord.__table__.insert(), batch)
+        db.session.commit()
+    return app
+
+
+def _measure(app, export_format):
+    from app import db, export_jobs
+    from app.models import ExportJob
+    from app.utils.storage import get_storage
+
+    client = app.test_client()
+    client.post("/login", data={"username": "tl", "password": "x"})
+    job_id = client.post("/teamleader/export_custom", data={"format": export_format}).json["job"]["id"]
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    export_jobs.run_pending()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    with app.app_context():
+        job = db.session.get(ExportJob, job_id)
+        size = os.path.getsize(get_storage(app).path(job.artifact_key))
+    return size, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as workdir:
+            app = _build_app(workdir, rows)
+            for export_format in ("xlsx", "csv"):
+                size, elapsed, peak = _measure(app, export_format)
+                print(
+                    f"rows={rows:<8} {export_format:<5} size={size / 1e6:7.1f} MB  "
+                    f"time={elapsed:6.2f} s  peak={peak / 1e6:6.1f} MB"
+                )
+            from app import db
+            with app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
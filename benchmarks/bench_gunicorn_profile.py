@@ -0,0 +1,146 @@
+"""
+Memory per worker and scan-save throughput of plain `gunicorn run:app`
+(each worker builds the app, then starts its background work) against the
+production profile in gunicorn.conf.py (preloaded app and heavy imports,
+threads), with the same worker count.
+
+Memory is read from /proc/<pid>/smaps_rollup once the server is up and
+again after the load: PSS splits shared pages between the processes that
+map them, so pages a preloaded master shares copy-on-write count once
+across the workers; USS is what a worker holds alone. Decode pool
+processes (DECODE_POOL_SIZE per worker) are fresh interpreters either way
+and are reported on their own. Linux only.
+
+The load is benchmarks/load_scan_save.py's: one logged-in counter per
+client saving unique barcodes, on a throwaway SQLite database unless
+--database-url is given.
+
+Usage:
+    python benchmarks/bench_gunicorn_profile.py [--workers 2] [--clients 20]
+        [--duration 10] [--db-latency-ms 0] [--database-url URL]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import load_scan_save as load
+
+ROOT = load.ROOT
+
+
+def _children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def _memory(pid):
+    """(pss, uss) of one process, in MB."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return fields["Pss"] / 1024, (fields["Private_Clean"] + fields["Private_Dirty"]) / 1024
+
+
+def _is_decoder(pid):
+    with open(f"/proc/{pid}/cmdline", "rb") as f:
+        return b"resource_tracker" not in f.read()  # multiprocessing's helper, not a decoder
+
+
+def _snapshot(master):
+    workers = _children(master)
+    helpers = [pid for worker in workers for pid in _children(worker)]
+    decoders = [pid for pid in helpers if _is_decoder(pid)]
+    usage = {pid: _memory(pid) for pid in [master, *workers, *helpers]}
+
+    def average(pids, i):
+        return sum(usage[pid][i] for pid in pids) / len(pids) if pids else 0
+
+    return {
+        "master": usage[master][0],
+        "worker_pss": average(workers, 0),
+        "worker_uss": average(workers, 1),
+        "decoder_pss": average(decoders, 0),
+        "decoders": len(decoders),
+        "total": sum(pss for pss, _ in usage.values()),
+    }
+
+
+_PLAIN_CONFIG = """
+def post_fork(server, worker):
+    from app import start_workers
+    start_workers(server.app.wsgi())
+"""
+
+
+def _start(setup, port, args, env, workdir):
+    if setup == "profile":
+        config = os.path.join(ROOT, "gunicorn.conf.py")
+    else:
+        # Not gunicorn.conf.py: no preload, just each worker starting its background work
+        config = os.path.join(workdir, "plain.conf.py")
+        with open(config, "w") as f:
+            f.write(_PLAIN_CONFIG)
+    command = [sys.executable, "-c", load._SERVER, str(args.db_latency_ms), "gunicorn", "run:app",
+               "--config", config, "-b", f"127.0.0.1:{port}", "-w", str(args.workers)]
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    load._wait_for(server, port, " ".join(command))
+
+    # Every worker up, with its decode pool
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        workers = _children(server.pid)
+        if len(workers) == args.workers and all(sum(map(_is_decoder, _children(w))) >= args.decode_pool for w in workers):
+            break
+        time.sleep(0.5)
+    time.sleep(2)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--db-latency-ms", type=float, default=0)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+    args.decode_pool = int(os.environ.get("DECODE_POOL_SIZE", 2))
+    load_args = SimpleNamespace(duration=args.duration, slow_upload_ms=0)
+
+    for setup in ("default", "profile"):
+        with tempfile.TemporaryDirectory() as workdir:
+            env = load._environment(workdir, args.database_url)
+            usernames, line_ids = load._build_fixture(env, args.clients)
+            env["DECODE_WARMUP"] = "1"  # as deployed: decode pools up before the first request
+            port = load._free_port()
+            server = _start(setup, port, args, env, workdir)
+            try:
+                idle = _snapshot(server.pid)
+                outcomes, latencies, elapsed = load._run_load(port, usernames, line_ids, load_args, None)
+                loaded = _snapshot(server.pid)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+        latencies.sort()
+        print(f"{setup}: {args.workers} workers, {outcomes.get(200, 0) / elapsed:.1f} saves/s, "
+              f"p50={latencies[len(latencies) // 2]:.1f} ms, p95={latencies[int(len(latencies) * 0.95)]:.1f} ms, "
+              f"responses={dict(outcomes)}")
+        for label, mem in (("idle", idle), ("after load", loaded)):
+            print(f"  {label:<10} master PSS={mem['master']:5.0f} MB  worker PSS={mem['worker_pss']:5.0f} MB "
+                  f"USS={mem['worker_uss']:5.0f} MB  decoder PSS={mem['decoder_pss']:5.0f} MB x {mem['decoders']}  "
+                  f"total PSS={mem['total']:6.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
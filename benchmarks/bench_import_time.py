@@ -0,0 +1,133 @@
+"""
+Cold start of `from app import create_app; create_app()`, measured with
+`python -X importtime` in fresh processes, and a guard against regressions.
+
+Prints the wall time of import + create_app() (median of --runs), the
+import time and the slowest imports (top level, and one level down). Fails (exit 1) when one of
+the heavy libraries below is imported while booting, naming the import
+chain that pulled it in, or when the median is over --max-ms. They are
+meant to load on first use: cv2/numpy/pyzbar when decoding, PIL for the
+decode cache, openpyxl for XLSX exports, boto3 on the first S3 call.
+
+Boots on an empty throwaway SQLite file, two ways:
+  - app:    create_app() alone, as every CLI command, script and test, and
+            the preloading gunicorn master, get it
+  - serve:  create_app() + start_workers(), as run.py, each gunicorn worker
+            (post_fork) and the ASGI lifespan do; the decode pool's processes
+            spawn and build their decoders in the background
+For "serve" it also prints how long the decode pool took to be ready, which
+start_workers() doesn't wait for.
+
+Usage:
+    python benchmarks/bench_import_time.py [--mode both|app|serve]
+        [--runs 5] [--max-ms N] [--top 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+HEAVY = ("cv2", "numpy", "PIL", "pyzbar", "openpyxl", "boto3", "botocore", "pandas")
+
+_BOOT = """
+import sys, time
+sys._xoptions.pop("importtime", None)  # decoder processes would log their imports to the same stderr
+started = time.perf_counter()
+from app import create_app, start_workers, decode_engine
+app = create_app()
+if sys.argv[1] == "serve":
+    start_workers(app)
+booted = time.perf_counter()
+if sys.argv[1] == "serve":
+    decode_engine.warm_up()
+print((booted - started) * 1000, (time.perf_counter() - started) * 1000)
+"""
+
+
+def _boot(workdir, mode):
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'boot.db')}",
+        "STORAGE_SPOOL_DIR": os.path.join(workdir, "spool"),
+        "LOCAL_STORAGE_DIR": os.path.join(workdir, "storage"),
+        "UPLOAD_STAGING_DIR": os.path.join(workdir, "staging"),
+    }
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", _BOOT, mode],
+                         cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    boot_ms, ready_ms = map(float, out.stdout.strip().splitlines()[-1].split())
+    return boot_ms, ready_ms, _parse(out.stderr)
+
+
+def _parse(stderr):
+    """[(depth, module, self_us, cumulative_us)] in -X importtime's order (children first)."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((depth, name.strip(), int(self_us), int(cumulative)))
+    return imports
+
+
+def _chain(imports, i):
+    """Module names from the top-level import down to imports[i]."""
+    chain = [imports[i][1]]
+    depth = imports[i][0]
+    for d, name, _, _ in imports[i + 1:]:  # a parent follows its children, one level up
+        if d < depth:
+            chain.append(name)
+            depth = d
+    return " -> ".join(reversed(chain))
+
+
+def _report(mode, boots, args):
+    """Print one mode's timings and slowest imports; returns the failure messages."""
+    wall = statistics.median(ms for ms, _, _ in boots)
+    imports = boots[-1][2]
+
+    top_level = [(name, cumulative) for depth, name, _, cumulative in imports if depth == 0]
+    label = "import + create_app()" + (" + start_workers()" if mode == "serve" else "")
+    print(f"{mode}: {label}: median {wall:.0f} ms over {len(boots)} runs "
+          f"(imports {sum(c for _, c in top_level) / 1000:.0f} ms in the last run)")
+    if mode == "serve":
+        print(f"  decode pool ready after median {statistics.median(ms for _, ms, _ in boots):.0f} ms")
+    slowest = [(name, cumulative) for depth, name, _, cumulative in imports if depth <= 1]
+    for name, cumulative in sorted(slowest, key=lambda item: -item[1])[:args.top]:
+        print(f"  {cumulative / 1000:7.1f} ms  {name}")
+
+    heavy = {}
+    for i, (_, name, _, _) in enumerate(imports):
+        if name in HEAVY:
+            heavy[name] = _chain(imports, i)
+    failures = [f"{mode}: {root} is imported at boot: {chain}" for root, chain in heavy.items()]
+    if args.max_ms is not None and wall > args.max_ms:
+        failures.append(f"{mode}: boot took {wall:.0f} ms, over --max-ms {args.max_ms:.0f}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("both", "app", "serve"), default="both")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, help="fail when the median boot takes longer")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    failures = []
+    for mode in ("app", "serve") if args.mode == "both" else (args.mode,):
+        with tempfile.TemporaryDirectory() as workdir:
+            boots = [_boot(workdir, mode) for _ in range(args.runs)]
+        failures += _report(mode, boots, args)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK: no heavy imports at boot")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
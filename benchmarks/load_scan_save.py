@@ -0,0 +1,287 @@
+"""
+Concurrent scan-save throughput of the WSGI setup (gunicorn with
+gunicorn.conf.py, as in the Procfile) against the ASGI entry point
+(uvicorn asgi:app; gunicorn with uvicorn workers when --workers > 1).
+
+Each client is a counter on its own line, logged in once, saving scans with
+unique barcodes through POST /counter/save_scan_record as fast as the server
+answers. --db-latency-ms makes every SQL statement wait that long first, as
+with a database across the network: a sync worker idles through each wait,
+the ASGI server runs other requests' views meanwhile. --slow-upload-ms
+spreads every request body over that many milliseconds, like a phone on a
+weak signal. --image attaches a photo to every save (stored through the
+storage queue).
+
+The server runs as a subprocess on a throwaway SQLite database by default.
+SQLite takes one writer at a time, which caps the ASGI numbers and can fail
+a few saves with "database is locked"; pass --database-url to run against
+PostgreSQL (rows are left behind).
+
+Usage:
+    python benchmarks/load_scan_save.py [--mode sync|asgi|both] [--clients 50]
+        [--duration 15] [--workers 1] [--db-latency-ms 0] [--slow-upload-ms 0]
+        [--image PATH] [--database-url URL]
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+
+def _environment(workdir, database_url):
+    return {
+        **os.environ,
+        "DATABASE_URL": database_url or f"sqlite:///{os.path.join(workdir, 'load.db')}",
+        "STORAGE_BACKEND": "local",
+        "STORAGE_SPOOL_DIR": os.path.join(workdir, "spool"),
+        "LOCAL_STORAGE_DIR": os.path.join(workdir, "storage"),
+        "UPLOAD_STAGING_DIR": os.path.join(workdir, "staging"),
+        "EXPORT_WORKER_ENABLED": "0",
+        "DECODE_WARMUP": "0",
+    }
+
+
+def _build_fixture(env, clients):
+    """One counter and one line per client; returns (usernames, line ids)."""
+    os.environ.update(env)
+    import config
+    from importlib import reload
+    reload(config)  # Config reads the environment at import time
+
+    from sqlalchemy import create_engine
+    from werkzeug.security import generate_password_hash
+    from app import create_app, db
+    from app.models import User, Location, Warehouse, ScanLine
+
+    # The schema is in place before the app boots, as after `flask db upgrade`
+    engine = create_engine(os.environ["DATABASE_URL"])
+    db.metadata.create_all(engine)
+    engine.dispose()
+
+    app = create_app()
+    tag = uuid.uuid4().hex[:8]
+    password = generate_password_hash("x")
+    with app.app_context():
+        location = Location(name=f"Load {tag}")
+        db.session.add(location)
+        db.session.flush()
+        warehouse = Warehouse(warehouse_name=f"Load {tag}", location_id=location.id)
+        counters = [
+            User(username=f"load-{tag}-{i}", password_hash=password, role="Counter", is_active=True)
+            for i in range(clients)
+        ]
+        db.session.add_all(counters + [warehouse])
+        db.session.flush()
+        lines = [
+            ScanLine(line_code=f"LOAD-{tag}-{i}", location_id=location.id, warehouse_id=warehouse.id,
+                     target_count=10_000_000, current_count=0, counter_1_id=counter.id)
+            for i, counter in enumerate(counters)
+        ]
+        db.session.add_all(lines)
+        db.session.commit()
+        fixture = [u.username for u in counters], [line.id for line in lines]
+        db.session.remove()
+        db.engine.dispose()
+    return fixture
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# Runs gunicorn or uvicorn in-process, after making every SQL statement wait
+# `latency` ms first, as it would for a database across the network.
+_SERVER = """
+import sys, time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+latency = float(sys.argv.pop(1)) / 1000
+if latency:
+    event.listen(Engine, "before_cursor_execute", lambda *args: time.sleep(latency))
+if sys.argv[1] == "gunicorn":
+    from gunicorn.app.wsgiapp import run
+else:
+    from uvicorn.main import main as run
+sys.argv = sys.argv[1:]
+run()
+"""
+
+
+def _start_server(mode, port, workers, db_latency_ms, env):
+    if mode == "sync":
+        command = ["gunicorn", "run:app", "--config", "gunicorn.conf.py", "-b", f"127.0.0.1:{port}", "-w", str(workers)]
+    elif workers > 1:
+        command = ["gunicorn", "asgi:app", "--config", "gunicorn.conf.py", "-b", f"127.0.0.1:{port}",
+                   "-w", str(workers), "-k", "uvicorn.workers.UvicornWorker"]
+    else:
+        command = ["uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    server = subprocess.Popen(
+        [sys.executable, "-c", _SERVER, str(db_latency_ms), *command],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    _wait_for(server, port, " ".join(command))
+    return server
+
+
+def _wait_for(server, port, label):
+    """Wait until `server` answers on `port`."""
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/login")
+            conn.getresponse().read()
+            return
+        except OSError:
+            if server.poll() is not None:
+                break
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"{label} did not start")
+
+
+def _multipart(fields, image):
+    boundary = uuid.uuid4().hex
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    ]
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="scan.jpg"\r\n'
+        f"Content-Type: image/jpeg\r\n\r\n".encode() + image + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+class _Client:
+    def __init__(self, port, username):
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        self.cookies = SimpleCookie()
+        self.post("/login", *self.form({"username": username, "password": "x"}))
+
+    @staticmethod
+    def form(fields):
+        return urlencode(fields).encode(), "application/x-www-form-urlencoded"
+
+    def post(self, path, body, content_type, slow_ms=0):
+        headers = {"Content-Type": content_type, "Content-Length": str(len(body))}
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v.value}" for k, v in self.cookies.items())
+        self.conn.putrequest("POST", path)
+        for name, value in headers.items():
+            self.conn.putheader(name, value)
+        self.conn.endheaders()
+        pieces = 8 if slow_ms else 1
+        step = -(-len(body) // pieces)
+        for i in range(pieces):
+            if slow_ms:
+                time.sleep(slow_ms / 1000 / pieces)
+            self.conn.send(body[i * step:(i + 1) * step])
+        response = self.conn.getresponse()
+        response.read()
+        for header in response.headers.get_all("Set-Cookie") or []:
+            self.cookies.load(header)
+        return response.status
+
+
+def _run_load(port, usernames, line_ids, args, image):
+    outcomes = Counter()
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(usernames) + 1)
+    stop_at = []
+
+    def run(n):
+        local, times = Counter(), []
+        try:
+            client = _Client(port, usernames[n])
+        except OSError as e:
+            local[type(e).__name__] += 1
+            client = None
+        barrier.wait()
+        i = 0
+        while client is not None and time.perf_counter() < stop_at[0]:
+            fields = {"line_id": line_ids[n], "barcode_1": f"{usernames[n]}-{i}"}
+            body, content_type = _multipart(fields, image) if image else client.form(fields)
+            start = time.perf_counter()
+            try:
+                local[client.post("/counter/save_scan_record", body, content_type, args.slow_upload_ms)] += 1
+            except OSError as e:
+                local[type(e).__name__] += 1
+                client = _Client(port, usernames[n])
+            times.append((time.perf_counter() - start) * 1000)
+            i += 1
+        with lock:
+            outcomes.update(local)
+            latencies.extend(times)
+
+    threads = [threading.Thread(target=run, args=(n,), daemon=True) for n in range(len(usernames))]
+    for thread in threads:
+        thread.start()
+    stop_at.append(time.perf_counter() + args.duration + 30)  # provisional, until everyone has logged in
+    barrier.wait()
+    start = time.perf_counter()
+    stop_at[0] = start + args.duration
+    for thread in threads:
+        thread.join()
+    return outcomes, latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("sync", "asgi", "both"), default="both")
+    parser.add_argument("--clients", type=int, default=50, help="concurrent counters")
+    parser.add_argument("--duration", type=float, default=15, help="seconds of load per mode")
+    parser.add_argument("--workers", type=int, default=1, help="server processes")
+    parser.add_argument("--db-latency-ms", type=float, default=0, help="added before every SQL statement")
+    parser.add_argument("--slow-upload-ms", type=int, default=0, help="time each request body takes to arrive")
+    parser.add_argument("--image", help="photo attached to every save")
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    image = None
+    if args.image:
+        with open(args.image, "rb") as f:
+            image = f.read()
+
+    modes = ("sync", "asgi") if args.mode == "both" else (args.mode,)
+    for mode in modes:
+        with tempfile.TemporaryDirectory() as workdir:
+            env = _environment(workdir, args.database_url)
+            usernames, line_ids = _build_fixture(env, args.clients)
+            port = _free_port()
+            server = _start_server(mode, port, args.workers, args.db_latency_ms, env)
+            try:
+                outcomes, latencies, elapsed = _run_load(port, usernames, line_ids, args, image)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+        saved = outcomes.get(200, 0)
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+        print(
+            f"{mode:<5} {args.clients} clients x {args.workers} worker(s): {saved / elapsed:7.1f} saves/s  "
+            f"p50={statistics.median(latencies) if latencies else 0:7.1f} ms  p95={p95:7.1f} ms  "
+            f"responses={dict(outcomes)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Concurrency stress test for the scan save path: many threads saving scans on
+one line at once, through /counter/save_scan_record and
+/counter/save_scan_records, as both of the line's counters.
+
+Afterwards the line's current_count must equal the number of scan records,
+the scan_rollups total and the number of successful saves, exactly. A second
+round has every thread race to save the same barcodes: exactly one save per
+barcode may win, the others must get the duplicate error (400), never a 500.
+
+Uses a throwaway SQLite database by default; pass --database-url to run it
+against PostgreSQL (the tables are created and the line's data is left behind).
+
+Usage:
+    python benchmarks/stress_scan_line.py [--threads 16] [--saves 200] [--database-url URL]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+
+def _build_app(workdir, database_url):
+    os.environ.update(
+        DATABASE_URL=database_url or f"sqlite:///{os.path.join(workdir, 'stress.db')}",
+        STORAGE_SPOOL_DIR=os.path.join(workdir, "spool"),
+        STORAGE_WORKER_ENABLED="0",
+        LOCAL_STORAGE_DIR=os.path.join(workdir, "storage"),
+        EXPORT_WORKER_ENABLED="0",
+        DECODE_POOL_SIZE="0",
+        DECODE_WARMUP="0",
+    )
+    import config
+    from importlib import reload
+    reload(config)  # Config reads the environment at import time
+
+    from sqlalchemy import create_engine
+    from werkzeug.security import generate_password_hash
+    from app import create_app, db
+    from app.models import User, Location, Warehouse, ScanLine
+
+    # The schema is in place before the app boots, as after `flask db upgrade`
+    engine = create_engine(os.environ["DATABASE_URL"])
+    db.metadata.create_all(engine)
+    engine.dispose()
+
+    app = create_app()
+    tag = str(int(time.time()))
+    with app.app_context():
+        counters = [
+            User(username=f"stress-c{i}-{tag}", password_hash=generate_password_hash("x"), role="Counter", is_active=True)
+            for i in (1, 2)
+        ]
+        location = Location(name=f"Stress {tag}")
+        db.session.add_all(counters + [location])
+        db.session.flush()
+        warehouse = Warehouse(warehouse_name=f"Stress {tag}", location_id=location.id)
+        db.session.add(warehouse)
+        db.session.flush()
+        line = ScanLine(line_code=f"STRESS-{tag}", location_id=location.id, warehouse_id=warehouse.id,
+                        target_count=100000, current_count=0,
+                        counter_1_id=counters[0].id, counter_2_id=counters[1].id)
+        db.session.add(line)
+        db.session.commit()
+        return app, line.id, [u.username for u in counters], tag
+
+
+def _hammer(app, usernames, threads, work):
+    """Run work(client, thread_no, outcomes) in `threads` threads at once; returns the outcome Counter."""
+    outcomes = Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def run(n):
+        client = app.test_client()
+        client.post("/login", data={"username": usernames[n % 2], "password": "x"})
+        local = Counter()
+        barrier.wait()
+        work(client, n, local)
+        with lock:
+            outcomes.update(local)
+
+    workers = [threading.Thread(target=run, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--saves", type=int, default=200, help="single saves per thread")
+    parser.add_argument("--batch", type=int, default=50, help="records per bulk save (one per thread)")
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app, line_id, usernames, tag = _build_app(workdir, args.database_url)
+        from app import db
+        from app.models import ScanLine, ScanRecord
+        from app.utils.rollups import line_scan_count
+
+        def save_unique(client, n, outcomes):
+            for i in range(args.saves):
+                response = client.post("/counter/save_scan_record", data={
+                    "line_id": line_id, "barcode_1": f"{tag}-T{n}-{i}", "barcode_2": f"{tag}-T{n}-{i}-SN",
+                })
+                outcomes[response.status_code] += 1
+            response = client.post("/counter/save_scan_records", json={"line_id": line_id, "records": [
+                {"client_id": f"{tag}-T{n}-B{i}", "barcode_1": f"{tag}-T{n}-B{i}"} for i in range(args.batch)
+            ]})
+            outcomes[response.status_code] += 1
+            if response.status_code == 200:
+                outcomes["bulk_accepted"] += response.json["accepted"]
+
+        def save_same(client, n, outcomes):
+            for i in range(20):
+                response = client.post("/counter/save_scan_record", data={
+                    "line_id": line_id, "barcode_1": f"{tag}-SAME-{i}",
+                })
+                outcomes[response.status_code] += 1
+
+        start = time.perf_counter()
+        unique = _hammer(app, usernames, args.threads, save_unique)
+        elapsed = time.perf_counter() - start
+        same = _hammer(app, usernames, args.threads, save_same)
+
+        with app.app_context():
+            current_count = db.session.get(ScanLine, line_id).current_count
+            records = ScanRecord.query.filter_by(scan_line_id=line_id).count()
+            rollup = line_scan_count(line_id)
+            db.session.remove()
+            db.engine.dispose()
+
+        saved = unique[200] - args.threads + unique["bulk_accepted"] + same[200]
+        total = args.threads * (args.saves + 1)
+        print(f"unique barcodes: {dict(unique)}  ({total / elapsed:.0f} requests/s over {args.threads} threads)")
+        print(f"same barcodes:   {dict(same)}")
+        print(f"current_count={current_count} records={records} rollup={rollup} successful saves={saved}")
+
+        ok = (
+            current_count == records == rollup == saved
+            and unique[200] == total
+            and same[200] == 20
+            and same[400] == 20 * (args.threads - 1)
+        )
+        print("OK" if ok else "MISMATCH")
+        sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
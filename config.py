@@ -17,4 +17,83 @@ class Config:
     AWS_ACCESS_KEY_ID = os.environ.get("AWS_ACCESS_KEY_ID")
     AWS_SECRET_ACCESS_KEY = os.environ.get("AWS_SECRET_ACCESS_KEY")
     AWS_REGION = os.environ.get("AWS_REGION", "us-east-1")
-    S3_BUCKET_NAME = os.environ.get("S3_BUCKET_NAME")
\ No newline at end of file
+    S3_BUCKET_NAME = os.environ.get("S3_BUCKET_NAME")
+
+    # Object storage backend: "s3", or "local" (filesystem, for on-prem sites and tests)
+    STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "s3" if S3_BUCKET_NAME else "local")
+    LOCAL_STORAGE_DIR = os.environ.get("LOCAL_STORAGE_DIR")                      # default: <instance>/storage
+    S3_MAX_POOL_CONNECTIONS = int(os.environ.get("S3_MAX_POOL_CONNECTIONS", 20))
+    S3_MAX_ATTEMPTS = int(os.environ.get("S3_MAX_ATTEMPTS", 5))
+    S3_CONNECT_TIMEOUT = float(os.environ.get("S3_CONNECT_TIMEOUT", 5))
+    S3_READ_TIMEOUT = float(os.environ.get("S3_READ_TIMEOUT", 30))
+    S3_MULTIPART_THRESHOLD = int(os.environ.get("S3_MULTIPART_THRESHOLD", 8 * 1024 * 1024))
+    S3_MULTIPART_CHUNKSIZE = int(os.environ.get("S3_MULTIPART_CHUNKSIZE", 8 * 1024 * 1024))
+
+    # Signed image URLs: "eager" signs every record on page render, "lazy" signs
+    # thumbnails in batches as they scroll into view (POST /storage/sign)
+    PRESIGNED_URL_MODE = os.environ.get("PRESIGNED_URL_MODE", "lazy")
+    PRESIGNED_URL_EXPIRES = int(os.environ.get("PRESIGNED_URL_EXPIRES", 3600))
+    PRESIGNED_URL_MIN_REMAINING = int(os.environ.get("PRESIGNED_URL_MIN_REMAINING", 900))  # reuse only while this much is left
+    PRESIGNED_URL_CACHE_SIZE = int(os.environ.get("PRESIGNED_URL_CACHE_SIZE", 5000))
+    PRESIGNED_URL_BATCH_MAX = int(os.environ.get("PRESIGNED_URL_BATCH_MAX", 100))
+
+    # Scan line pages: records load in keyset-paginated pages (infinite scroll)
+    SCAN_RECORDS_PAGE_SIZE = int(os.environ.get("SCAN_RECORDS_PAGE_SIZE", 50))
+    SCAN_RECORDS_PAGE_MAX = int(os.environ.get("SCAN_RECORDS_PAGE_MAX", 200))
+    DASHBOARD_LINES_PER_PAGE = int(os.environ.get("DASHBOARD_LINES_PER_PAGE", 25))  # team leader dashboard tables
+    EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))                # rows per cursor fetch
+
+    # Background exports (export_jobs table; artifacts on the storage backend under exports/)
+    EXPORT_WORKER_ENABLED = os.environ.get("EXPORT_WORKER_ENABLED", "1") == "1"  # 0 = run `flask exports work` instead
+    EXPORT_WORKER_THREADS = int(os.environ.get("EXPORT_WORKER_THREADS", 1))       # per web process
+    EXPORT_CACHE_TTL = int(os.environ.get("EXPORT_CACHE_TTL", 300))               # reuse a user's identical exports this long
+    EXPORT_RETENTION = int(os.environ.get("EXPORT_RETENTION", 86400))             # then delete job + artifact
+    EXPORT_POLL_INTERVAL = float(os.environ.get("EXPORT_POLL_INTERVAL", 5))
+    EXPORT_CLAIM_TIMEOUT = int(os.environ.get("EXPORT_CLAIM_TIMEOUT", 600))       # requeue a job silent this long
+
+    # Background storage queue (uploads/deletes off the request path)
+    STORAGE_WORKER_ENABLED = os.environ.get("STORAGE_WORKER_ENABLED", "1") == "1"
+    STORAGE_SPOOL_DIR = os.environ.get("STORAGE_SPOOL_DIR")                    # default: <instance>/spool
+    STORAGE_MAX_ATTEMPTS = int(os.environ.get("STORAGE_MAX_ATTEMPTS", 8))
+    STORAGE_BACKOFF_BASE = float(os.environ.get("STORAGE_BACKOFF_BASE", 2))    # seconds, doubled per attempt
+    STORAGE_BACKOFF_MAX = float(os.environ.get("STORAGE_BACKOFF_MAX", 300))
+    STORAGE_POLL_INTERVAL = float(os.environ.get("STORAGE_POLL_INTERVAL", 5))
+    STORAGE_CONCURRENCY = int(os.environ.get("STORAGE_CONCURRENCY", 4))        # transfers in flight per process
+    STORAGE_CLAIM_TIMEOUT = int(os.environ.get("STORAGE_CLAIM_TIMEOUT", 600))  # seconds before a claimed job is requeued
+
+    # ASGI serving (asgi.py)
+    ASGI_THREADS = int(os.environ.get("ASGI_THREADS", 32))                     # threads running Flask views
+    ASGI_BODY_SPOOL = int(os.environ.get("ASGI_BODY_SPOOL", 1024 * 1024))      # bytes of a request body kept in memory
+
+    # Barcode decoding engine (process pool)
+    DECODE_POOL_SIZE = int(os.environ.get("DECODE_POOL_SIZE", 2))     # 0 = decode in the request thread
+    DECODE_QUEUE_SIZE = int(os.environ.get("DECODE_QUEUE_SIZE", 8))   # waiting jobs before HTTP 503
+    DECODE_TIMEOUT = float(os.environ.get("DECODE_TIMEOUT", 20))      # seconds a request waits (per batch); under GUNICORN_TIMEOUT
+    DECODE_BATCH_MAX = int(os.environ.get("DECODE_BATCH_MAX", 10))    # images per process_barcode_batch call
+    DECODE_STAGES = os.environ.get("DECODE_STAGES")                   # e.g. "opencv,zbar,roi:500,rotate"; None = all
+    DECODE_WARMUP = os.environ.get("DECODE_WARMUP", "1") == "1"       # build decoders in start_workers()
+
+    # Decode results of recently repeated photos by sha256; perceptual hash for near-duplicate warnings (per process)
+    DECODE_CACHE_ENABLED = os.environ.get("DECODE_CACHE_ENABLED", "1") == "1"
+    DECODE_CACHE_SIZE = int(os.environ.get("DECODE_CACHE_SIZE", 1000))              # photos kept
+    DECODE_CACHE_TTL = int(os.environ.get("DECODE_CACHE_TTL", 600))                 # seconds
+    DECODE_CACHE_MAX_DISTANCE = int(os.environ.get("DECODE_CACHE_MAX_DISTANCE", 24))  # of 256 bits, for the near-duplicate warning only; 0 = off
+
+    # Images staged by process_barcode for save_scan_record (upload tokens)
+    UPLOAD_STAGING_DIR = os.environ.get("UPLOAD_STAGING_DIR")                # default: <instance>/staging
+    UPLOAD_TOKEN_TTL = int(os.environ.get("UPLOAD_TOKEN_TTL", 900))          # seconds a token stays valid
+    UPLOAD_SWEEP_INTERVAL = int(os.environ.get("UPLOAD_SWEEP_INTERVAL", 60)) # min seconds between sweeps
+
+    # Bulk ingest of scans collected offline (POST /counter/save_scan_records)
+    INGEST_BATCH_MAX = int(os.environ.get("INGEST_BATCH_MAX", 500))          # records per request
+
+    # Barcode duplicate index (per-process Bloom filter in front of barcode_entry)
+    BARCODE_INDEX_ENABLED = os.environ.get("BARCODE_INDEX_ENABLED", "1") == "1"
+    BARCODE_INDEX_CAPACITY = int(os.environ.get("BARCODE_INDEX_CAPACITY", 1_000_000))    # barcodes before a rebuild
+    BARCODE_INDEX_ERROR_RATE = float(os.environ.get("BARCODE_INDEX_ERROR_RATE", 0.01))   # false positive rate
+
+    # Photo capture / upload size limits
+    CAPTURE_MAX_DIMENSION = int(os.environ.get("CAPTURE_MAX_DIMENSION", 1280))          # px, on-device downscale
+    CAPTURE_JPEG_QUALITY = float(os.environ.get("CAPTURE_JPEG_QUALITY", 0.85))          # on-device re-encode
+    MAX_IMAGE_UPLOAD_BYTES = int(os.environ.get("MAX_IMAGE_UPLOAD_BYTES", 8 * 1024 * 1024))
+    MAX_CONTENT_LENGTH = MAX_IMAGE_UPLOAD_BYTES * DECODE_BATCH_MAX                      # Flask-wide hard cap
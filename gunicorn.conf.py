@@ -0,0 +1,73 @@
+"""
+Production gunicorn profile (the Procfile runs `gunicorn run:app --config gunicorn.conf.py`).
+
+The app and its heavy libraries are loaded once in the master and forked
+into the workers, so their pages are shared copy-on-write instead of
+loaded per worker. Everything that must not cross a fork — database
+connections, background threads, the decode process pool — is started in
+each worker by post_fork.
+
+Settings read from the environment:
+  - WEB_CONCURRENCY:         worker processes (default: one per core, at least 2)
+  - GUNICORN_THREADS:        request threads per worker (default 4)
+  - GUNICORN_MAX_REQUESTS:   requests before a worker is recycled (default 1000, 0 = never)
+  - GUNICORN_TIMEOUT:        seconds a silent worker lives (default 30)
+  - PORT:                    listen port (default 8000)
+"""
+import os
+
+# A worker's views mostly wait: on the database, on storage, on the decode
+# pool (DECODE_POOL_SIZE processes per worker). One worker per core keeps
+# the cores busy; the threads overlap the waits.
+try:
+    cores = len(os.sched_getaffinity(0))
+except AttributeError:
+    cores = os.cpu_count() or 1
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", max(2, cores)))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = max_requests // 10  # workers don't all restart at once
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+preload_app = True
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"  # heartbeat file off the (possibly slow) disk
+
+# Imported in the master, next to the app: decoding, exports, storage
+HEAVY_IMPORTS = ("cv2", "numpy", "PIL.Image", "openpyxl", "boto3")
+
+
+def _flask_app(server):
+    app = server.app.wsgi()
+    return getattr(app, "flask_app", app)  # asgi:app wraps the Flask app
+
+
+def on_starting(server):
+    import importlib
+
+    for name in HEAVY_IMPORTS:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            server.log.warning(f"Not preloading {name}: {e}")
+
+
+def when_ready(server):
+    from app import db
+
+    # The master only forks: close the connections it opened while building the app
+    if server.cfg.preload_app:
+        with _flask_app(server).app_context():
+            db.engine.dispose()
+
+
+def post_fork(server, worker):
+    from app import db, start_workers
+
+    app = _flask_app(server)
+    with app.app_context():
+        # Drop the master's pooled connections without closing them under it
+        db.engine.dispose(close=False)
+    start_workers(app, wait=True)
+    server.log.info(f"Worker {worker.pid} ready")
@@ -0,0 +1,38 @@
+"""add scan_records.image_status
+
+Revision ID: 3f1c2a9d7e10
+Revises: 
+Create Date: 2026-10-17 09:12:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7e10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _columns(table):
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    # Databases built by db.create_all() may already have the column
+    if 'image_status' not in _columns('scan_records'):
+        with op.batch_alter_table('scan_records', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('image_status', sa.String(length=20), nullable=True))
+
+    # Existing images were uploaded synchronously, so they are already stored
+    op.execute(
+        "UPDATE scan_records SET image_status = 'Stored' "
+        "WHERE image_path IS NOT NULL AND image_path != '' AND image_status IS NULL"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('scan_records', schema=None) as batch_op:
+        batch_op.drop_column('image_status')
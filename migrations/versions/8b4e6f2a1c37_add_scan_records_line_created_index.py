@@ -0,0 +1,32 @@
+"""add scan_records (scan_line_id, created_on, id) index
+
+Revision ID: 8b4e6f2a1c37
+Revises: 3f1c2a9d7e10
+Create Date: 2026-10-17 14:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4e6f2a1c37'
+down_revision = '3f1c2a9d7e10'
+branch_labels = None
+depends_on = None
+
+INDEX = 'ix_scan_records_line_created'
+
+
+def _indexes(table):
+    return {i['name'] for i in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    # Databases built by db.create_all() may already have the index
+    if INDEX not in _indexes('scan_records'):
+        op.create_index(INDEX, 'scan_records', ['scan_line_id', 'created_on', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(INDEX, table_name='scan_records')
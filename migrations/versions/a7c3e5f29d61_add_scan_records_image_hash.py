@@ -0,0 +1,42 @@
+"""add scan_records.image_hash
+
+Revision ID: a7c3e5f29d61
+Revises: f1a6d3b8c274
+Create Date: 2026-10-17 22:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e5f29d61'
+down_revision = 'f1a6d3b8c274'
+branch_labels = None
+depends_on = None
+
+INDEX = 'ix_scan_records_image_hash'
+
+
+def _columns(table):
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _indexes(table):
+    return {i['name'] for i in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    # Databases built by db.create_all() may already have the column and index
+    if 'image_hash' not in _columns('scan_records'):
+        with op.batch_alter_table('scan_records', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('image_hash', sa.String(length=64), nullable=True))
+
+    if INDEX not in _indexes('scan_records'):
+        op.create_index(INDEX, 'scan_records', ['image_hash'], unique=False)
+
+
+def downgrade():
+    op.drop_index(INDEX, table_name='scan_records')
+    with op.batch_alter_table('scan_records', schema=None) as batch_op:
+        batch_op.drop_column('image_hash')
@@ -0,0 +1,65 @@
+"""add scan_rollups
+
+Revision ID: c5d2e9a4b816
+Revises: 8b4e6f2a1c37
+Create Date: 2026-10-17 16:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d2e9a4b816'
+down_revision = '8b4e6f2a1c37'
+branch_labels = None
+depends_on = None
+
+# Hour bucket of scan_records.created_on, matching app.utils.rollups.hour_bucket
+HOUR_SQL = {
+    'sqlite': "strftime('%Y-%m-%d %H:00:00.000000', created_on)",
+    'postgresql': "date_trunc('hour', created_on)",
+}
+
+
+def _tables():
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def upgrade():
+    # Databases built by db.create_all() may already have the table
+    if 'scan_rollups' not in _tables():
+        op.create_table(
+            'scan_rollups',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('scan_line_id', sa.Integer(), nullable=False),
+            sa.Column('warehouse_id', sa.Integer(), nullable=False),
+            sa.Column('location_id', sa.Integer(), nullable=False),
+            sa.Column('counter_user_id', sa.Integer(), nullable=False),
+            sa.Column('hour', sa.DateTime(), nullable=False),
+            sa.Column('scans', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('scan_line_id', 'warehouse_id', 'location_id', 'counter_user_id', 'hour',
+                                name='uq_scan_rollups_key'),
+        )
+        op.create_index('ix_scan_rollups_warehouse', 'scan_rollups', ['warehouse_id'], unique=False)
+        op.create_index('ix_scan_rollups_counter', 'scan_rollups', ['counter_user_id'], unique=False)
+
+    # Backfill from existing records (elsewhere: `flask rollups reconcile --fix`)
+    bind = op.get_bind()
+    hour = HOUR_SQL.get(bind.dialect.name)
+    if hour and not bind.execute(sa.text("SELECT 1 FROM scan_rollups LIMIT 1")).first():
+        op.execute(
+            "INSERT INTO scan_rollups (scan_line_id, warehouse_id, location_id, counter_user_id, hour, scans) "
+            "SELECT COALESCE(scan_line_id, 0), COALESCE(warehouse_id, 0), COALESCE(location_id, 0), "
+            f"COALESCE(counter_user_id, 0), {hour}, COUNT(*) "
+            "FROM scan_records WHERE created_on IS NOT NULL "
+            f"GROUP BY COALESCE(scan_line_id, 0), COALESCE(warehouse_id, 0), COALESCE(location_id, 0), "
+            f"COALESCE(counter_user_id, 0), {hour}"
+        )
+
+
+def downgrade():
+    op.drop_index('ix_scan_rollups_counter', table_name='scan_rollups')
+    op.drop_index('ix_scan_rollups_warehouse', table_name='scan_rollups')
+    op.drop_table('scan_rollups')
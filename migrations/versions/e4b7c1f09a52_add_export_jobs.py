@@ -0,0 +1,49 @@
+"""add export_jobs
+
+Revision ID: e4b7c1f09a52
+Revises: c5d2e9a4b816
+Create Date: 2026-10-17 19:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7c1f09a52'
+down_revision = 'c5d2e9a4b816'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases built by db.create_all() may already have the table
+    if 'export_jobs' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table(
+        'export_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('fingerprint', sa.String(length=64), nullable=False),
+        sa.Column('export_format', sa.String(length=10), nullable=False),
+        sa.Column('filters', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('rows_total', sa.Integer(), nullable=True),
+        sa.Column('rows_done', sa.Integer(), nullable=False),
+        sa.Column('artifact_key', sa.String(length=255), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('requested_by_id', sa.Integer(), nullable=True),
+        sa.Column('created_on', sa.DateTime(), nullable=True),
+        sa.Column('updated_on', sa.DateTime(), nullable=True),
+        sa.Column('finished_on', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['requested_by_id'], ['users.id'], name='fk_exportjob_requested_by_id'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_export_jobs_fingerprint', 'export_jobs', ['fingerprint', 'created_on'], unique=False)
+    op.create_index('ix_export_jobs_status', 'export_jobs', ['status'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_export_jobs_status', table_name='export_jobs')
+    op.drop_index('ix_export_jobs_fingerprint', table_name='export_jobs')
+    op.drop_table('export_jobs')
@@ -0,0 +1,42 @@
+"""add scan_records.client_id
+
+Revision ID: f1a6d3b8c274
+Revises: e4b7c1f09a52
+Create Date: 2026-10-17 20:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a6d3b8c274'
+down_revision = 'e4b7c1f09a52'
+branch_labels = None
+depends_on = None
+
+INDEX = 'ix_scan_records_client_id'
+
+
+def _columns(table):
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _indexes(table):
+    return {i['name'] for i in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    # Databases built by db.create_all() may already have the column and index
+    if 'client_id' not in _columns('scan_records'):
+        with op.batch_alter_table('scan_records', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('client_id', sa.String(length=64), nullable=True))
+
+    if INDEX not in _indexes('scan_records'):
+        op.create_index(INDEX, 'scan_records', ['client_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index(INDEX, table_name='scan_records')
+    with op.batch_alter_table('scan_records', schema=None) as batch_op:
+        batch_op.drop_column('client_id')
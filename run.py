@@ -2,10 +2,12 @@ from app.libzbar_preload import preload_zbar_for_heroku
 preload_zbar_for_heroku()
 
 import os
-from app import create_app, db
+from app import create_app, init_db, start_workers
 app = create_app()
 
 if __name__ == "__main__":
     with app.app_context():
-        db.create_all()
-    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 8000)), debug=os.environ.get("FLASK_DEBUG", True))
\ No newline at end of file
+        init_db()
+    # Here, not at import: spawned decoder processes re-import this module
+    start_workers(app)
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 8000)), debug=os.environ.get("FLASK_DEBUG") == "1")
\ No newline at end of file